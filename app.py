@@ -5,16 +5,28 @@ A user-friendly Streamlit application for Excel data transformation and processi
 
 import streamlit as st
 import pandas as pd
-import io
 from datetime import datetime
 import json
+import os
+import time
 from typing import Dict, List, Any
-import traceback
 
 # Import custom modules
 from utils.file_handler import FileHandler
-from utils.data_transformer import DataTransformer
 from utils.template_manager import TemplateManager
+from utils.memory import format_bytes
+from utils.query_planner import QueryPlanner, describe_operation
+from utils.workbook_cache import WorkbookCache
+from utils.result_cache import OperationCache
+from utils.lazy_workbook import LazySheet
+from utils.sampling import sample_frame, preview_sheet
+from utils.executor import resolve_sources
+from utils.merge_engine import JOIN_TYPES, MERGE_OPERATIONS
+from utils.aggregation_engine import AGGREGATIONS
+from utils.text_engine import TEXT_OPERATIONS, pattern_group
+from utils.formula_engine import FUNCTIONS, FormulaError, column_kinds, compile_formulas, formula_pairs
+from utils.job_manager import JobManager
+from utils.profiler import OperationMetrics
 
 # Page configuration
 st.set_page_config(
@@ -56,6 +68,20 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Parsed-workbook cache settings (shared by all sessions of this server)
+WORKBOOK_CACHE_MAX_BYTES = int(os.environ.get('WORKBOOK_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+WORKBOOK_CACHE_DIR = os.environ.get('WORKBOOK_CACHE_DIR')
+OPERATION_CACHE_MAX_BYTES = int(os.environ.get('OPERATION_CACHE_MAX_BYTES', 1024 ** 3))
+
+# Background jobs: how many executions may run at once across all sessions
+MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', 2))
+# Finished jobs whose session never collected them are dropped after this long
+FINISHED_JOB_TTL_SECONDS = float(os.environ.get('FINISHED_JOB_TTL_SECONDS', 3600))
+JOB_POLL_SECONDS = 0.5
+
+# Optional file to keep OpenMetrics counters of profiled runs in (e.g. for a textfile collector)
+OPENMETRICS_FILE = os.environ.get('OPENMETRICS_FILE')
+
 # Initialize session state
 if 'uploaded_files' not in st.session_state:
     st.session_state.uploaded_files = []
@@ -65,6 +91,44 @@ if 'operations' not in st.session_state:
     st.session_state.operations = []
 if 'processed_data' not in st.session_state:
     st.session_state.processed_data = None
+if 'run_stats' not in st.session_state:
+    st.session_state.run_stats = {}
+if 'export_cache' not in st.session_state:
+    st.session_state.export_cache = {}
+if 'file_hashes' not in st.session_state:
+    st.session_state.file_hashes = {}
+if 'preview_results' not in st.session_state:
+    st.session_state.preview_results = {}
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+if 'job_report' not in st.session_state:
+    st.session_state.job_report = None
+if 'sheet_metadata' not in st.session_state:
+    st.session_state.sheet_metadata = {}
+
+
+@st.cache_resource
+def get_workbook_cache() -> WorkbookCache:
+    """Return the server-wide cache of parsed workbooks."""
+    return WorkbookCache(max_bytes=WORKBOOK_CACHE_MAX_BYTES, spill_dir=WORKBOOK_CACHE_DIR)
+
+
+@st.cache_resource
+def get_operation_cache() -> OperationCache:
+    """Return the server-wide cache of intermediate operation results."""
+    return OperationCache(max_bytes=OPERATION_CACHE_MAX_BYTES)
+
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """Return the server-wide background job manager."""
+    return JobManager(max_concurrent_jobs=MAX_CONCURRENT_JOBS, finished_job_ttl=FINISHED_JOB_TTL_SECONDS)
+
+
+@st.cache_resource
+def get_operation_metrics() -> OperationMetrics:
+    """Return the server-wide counters of profiled operations."""
+    return OperationMetrics()
 
 
 def main():
@@ -126,31 +190,63 @@ def step_1_upload_files():
         help="You can upload multiple Excel files"
     )
     
+    optimize_dtypes = st.checkbox(
+        "Optimize memory usage",
+        value=False,
+        help="Store repetitive text as categories, other text as Arrow strings and "
+             "numbers in the smallest type that fits"
+    )
+    
     if uploaded_files:
         file_handler = FileHandler()
+        workbook_cache = get_workbook_cache()
+        
+        def loader(file):
+            return file_handler.open_excel(file, optimize_dtypes=optimize_dtypes)
         
         for uploaded_file in uploaded_files:
             try:
-                # Validate and load file
-                df_dict = file_handler.load_excel(uploaded_file)
+                # Validate and open file (sheets are parsed only when they are used)
+                digest, workbook = workbook_cache.load(uploaded_file, loader,
+                                                       variant='optimized' if optimize_dtypes else '')
                 
-                if df_dict:
-                    st.session_state.dataframes[uploaded_file.name] = df_dict
+                if workbook:
+                    # Probe headers and a sample once per file content, for the configuration screens
+                    if (st.session_state.file_hashes.get(uploaded_file.name) != digest
+                            or uploaded_file.name not in st.session_state.sheet_metadata):
+                        uploaded_file.seek(0)
+                        st.session_state.sheet_metadata[uploaded_file.name] = file_handler.probe_excel(uploaded_file)
+                    st.session_state.dataframes[uploaded_file.name] = workbook
+                    st.session_state.file_hashes[uploaded_file.name] = digest
                     
                     st.success(f"✅ Successfully loaded: {uploaded_file.name}")
                     
-                    # Display file info
+                    # Display file info from the probe; memory is known once a sheet is loaded
                     with st.expander(f"📄 Preview: {uploaded_file.name}"):
-                        for sheet_name, df in df_dict.items():
+                        metadata = st.session_state.sheet_metadata[uploaded_file.name]
+                        for sheet_name, meta in metadata.items():
                             st.write(f"**Sheet: {sheet_name}**")
-                            st.write(f"Rows: {len(df)}, Columns: {len(df.columns)}")
-                            st.dataframe(df.head(10), use_container_width=True)
+                            rows = meta['rows'] if meta['rows'] is not None else "unknown"
+                            st.write(f"Rows: {rows}, Columns: {meta['columns']}")
+                            if workbook.is_loaded(sheet_name):
+                                sheet_info = file_handler.get_file_info(
+                                    {sheet_name: workbook[sheet_name]})['sheets'][sheet_name]
+                                if sheet_info['memory_bytes_before'] is not None:
+                                    st.write(f"Memory: {format_bytes(sheet_info['memory_bytes_before'])} → "
+                                             f"{format_bytes(sheet_info['memory_bytes'])}")
+                                else:
+                                    st.write(f"Memory: {format_bytes(sheet_info['memory_bytes'])}")
+                            st.dataframe(meta['sample'].head(10), use_container_width=True)
                             
             except Exception as e:
                 st.error(f"❌ Error loading {uploaded_file.name}: {str(e)}")
     
     if st.session_state.dataframes:
         st.info(f"📊 Total files loaded: {len(st.session_state.dataframes)}")
+        workbook_cache = get_workbook_cache()
+        st.caption(f"Workbook cache: {format_bytes(workbook_cache.current_bytes)} of "
+                   f"{format_bytes(workbook_cache.max_bytes)} used, "
+                   f"{workbook_cache.hits} hit(s), {workbook_cache.misses} miss(es)")
 
 
 def step_2_configure_operations():
@@ -168,30 +264,36 @@ def step_2_configure_operations():
     with col2:
         selected_sheet = st.selectbox("Select Sheet:", list(st.session_state.dataframes[selected_file].keys()))
     
-    df = st.session_state.dataframes[selected_file][selected_sheet]
+    # Column pickers only need the probed headers; the sheet itself is parsed at execution
+    meta = st.session_state.sheet_metadata[selected_file][selected_sheet]
     
     # Operation categories
     st.markdown("### Select Operation Type")
     operation_type = st.selectbox(
         "Operation Category:",
-        ["Data Cleaning", "Filtering", "Column Operations", "Mathematical Operations", "Text Operations", "Date Operations"]
+        ["Data Cleaning", "Filtering", "Column Operations", "Mathematical Operations", "Text Operations", "Date Operations",
+         "Merge Operations", "Aggregation"]
     )
     
     # Configure operation based on type
     operation_config = {}
     
     if operation_type == "Data Cleaning":
-        operation_config = configure_data_cleaning(df)
+        operation_config = configure_data_cleaning(meta)
     elif operation_type == "Filtering":
-        operation_config = configure_filtering(df)
+        operation_config = configure_filtering(meta)
     elif operation_type == "Column Operations":
-        operation_config = configure_column_operations(df)
+        operation_config = configure_column_operations(meta)
     elif operation_type == "Mathematical Operations":
-        operation_config = configure_mathematical_operations(df)
+        operation_config = configure_mathematical_operations(meta)
     elif operation_type == "Text Operations":
-        operation_config = configure_text_operations(df)
+        operation_config = configure_text_operations(meta)
     elif operation_type == "Date Operations":
-        operation_config = configure_date_operations(df)
+        operation_config = configure_date_operations(meta)
+    elif operation_type == "Merge Operations":
+        operation_config = configure_merge_operations(meta, selected_file, selected_sheet)
+    elif operation_type == "Aggregation":
+        operation_config = configure_aggregation(meta)
     
     # Add operation
     if st.button("➕ Add Operation", type="primary"):
@@ -214,7 +316,7 @@ def step_2_configure_operations():
                     st.rerun()
 
 
-def configure_data_cleaning(df: pd.DataFrame) -> Dict[str, Any]:
+def configure_data_cleaning(meta: Dict[str, Any]) -> Dict[str, Any]:
     """Configure data cleaning operations."""
     operation = st.selectbox(
         "Cleaning Operation:",
@@ -224,12 +326,17 @@ def configure_data_cleaning(df: pd.DataFrame) -> Dict[str, Any]:
     config = {'operation': operation}
     
     if operation == "Remove Duplicates":
-        columns = st.multiselect("Select columns to check for duplicates:", df.columns.tolist())
+        columns = st.multiselect("Select columns to check for duplicates:", meta['column_names'])
         config['columns'] = columns
         config['keep'] = st.selectbox("Keep:", ["first", "last", False])
+        if len(st.session_state.dataframes) > 1:
+            config['across_files'] = st.checkbox(
+                "Also across files",
+                help="After all operations, also remove rows that duplicate a row of the same sheet "
+                     "in another uploaded file (in upload order)")
     
     elif operation == "Fill Missing Values":
-        column = st.selectbox("Select column:", df.columns.tolist())
+        column = st.selectbox("Select column:", meta['column_names'])
         method = st.selectbox("Fill method:", ["Forward Fill", "Backward Fill", "Mean", "Median", "Mode", "Custom Value"])
         config['column'] = column
         config['method'] = method
@@ -239,21 +346,37 @@ def configure_data_cleaning(df: pd.DataFrame) -> Dict[str, Any]:
     return config
 
 
-def configure_filtering(df: pd.DataFrame) -> Dict[str, Any]:
+def configure_filtering(meta: Dict[str, Any]) -> Dict[str, Any]:
     """Configure filtering operations."""
-    column = st.selectbox("Select column to filter:", df.columns.tolist())
-    operator = st.selectbox("Operator:", ["==", "!=", ">", "<", ">=", "<=", "contains", "not contains"])
-    value = st.text_input("Value:")
+    condition_count = st.number_input("Number of conditions:", min_value=1, max_value=10, value=1)
+    logic = "AND"
+    if condition_count > 1:
+        logic = st.radio("Keep rows matching:", ["AND", "OR"], horizontal=True,
+                         format_func=lambda x: "all conditions (AND)" if x == "AND" else "any condition (OR)")
+    
+    conditions = []
+    for idx in range(int(condition_count)):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            column = st.selectbox("Select column to filter:", meta['column_names'], key=f"filter_col_{idx}")
+        with col2:
+            operator = st.selectbox("Operator:", ["==", "!=", ">", "<", ">=", "<=", "contains", "not contains"],
+                                    key=f"filter_op_{idx}")
+        with col3:
+            value = st.text_input("Value:", key=f"filter_value_{idx}")
+        conditions.append({'column': column, 'operator': operator, 'value': value})
+    
+    if len(conditions) == 1:
+        return {'operation': 'Filter Rows', **conditions[0]}
     
     return {
         'operation': 'Filter Rows',
-        'column': column,
-        'operator': operator,
-        'value': value
+        'conditions': conditions,
+        'logic': logic
     }
 
 
-def configure_column_operations(df: pd.DataFrame) -> Dict[str, Any]:
+def configure_column_operations(meta: Dict[str, Any]) -> Dict[str, Any]:
     """Configure column operations."""
     operation = st.selectbox(
         "Column Operation:",
@@ -263,42 +386,45 @@ def configure_column_operations(df: pd.DataFrame) -> Dict[str, Any]:
     config = {'operation': operation}
     
     if operation == "Merge Columns":
-        columns = st.multiselect("Select columns to merge:", df.columns.tolist())
+        columns = st.multiselect("Select columns to merge:", meta['column_names'])
         separator = st.text_input("Separator:", value=" ")
         new_column = st.text_input("New column name:")
         config.update({'columns': columns, 'separator': separator, 'new_column': new_column})
     
     elif operation == "Split Column":
-        column = st.selectbox("Select column:", df.columns.tolist())
+        column = st.selectbox("Select column:", meta['column_names'])
         separator = st.text_input("Separator:", value=",")
         new_columns = st.text_input("New column names (comma-separated):")
         config.update({'column': column, 'separator': separator, 'new_columns': new_columns.split(',')})
     
     elif operation == "Rename Column":
-        old_name = st.selectbox("Select column:", df.columns.tolist())
+        old_name = st.selectbox("Select column:", meta['column_names'])
         new_name = st.text_input("New name:")
         config.update({'old_name': old_name, 'new_name': new_name})
     
     elif operation == "Delete Column":
-        columns = st.multiselect("Select columns to delete:", df.columns.tolist())
+        columns = st.multiselect("Select columns to delete:", meta['column_names'])
         config['columns'] = columns
     
     return config
 
 
-def configure_mathematical_operations(df: pd.DataFrame) -> Dict[str, Any]:
+def configure_mathematical_operations(meta: Dict[str, Any]) -> Dict[str, Any]:
     """Configure mathematical operations."""
-    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+    numeric_cols = meta['numeric_columns']
     
     operation = st.selectbox(
         "Mathematical Operation:",
         ["Add Columns", "Subtract Columns", "Multiply Columns", "Divide Columns", 
          "Percentage Change", "Weighted Average", "Sum", "Mean", "Median", "Min", "Max",
-         "Conditional Calculation"]
+         "Conditional Calculation", "Formula"]
     )
     
     config = {'operation': operation}
     
+    if operation == "Formula":
+        return configure_formula(meta, config)
+    
     if operation in ["Add Columns", "Subtract Columns", "Multiply Columns", "Divide Columns"]:
         col1 = st.selectbox("First column:", numeric_cols, key="math_col1")
         col2 = st.selectbox("Second column:", numeric_cols, key="math_col2")
@@ -311,7 +437,7 @@ def configure_mathematical_operations(df: pd.DataFrame) -> Dict[str, Any]:
         config.update({'columns': columns, 'result_column': result_col})
     
     elif operation == "Conditional Calculation":
-        condition_col = st.selectbox("Condition column:", df.columns.tolist())
+        condition_col = st.selectbox("Condition column:", meta['column_names'])
         operator = st.selectbox("Operator:", [">", "<", ">=", "<=", "==", "!="])
         threshold = st.number_input("Threshold value:")
         true_value = st.text_input("Value if true:")
@@ -329,14 +455,40 @@ def configure_mathematical_operations(df: pd.DataFrame) -> Dict[str, Any]:
     return config
 
 
-def configure_text_operations(df: pd.DataFrame) -> Dict[str, Any]:
+def configure_formula(meta: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Configure formulas, checking them against the sheet's columns before they are added."""
+    st.caption("Example: `(Sales - Cost) / Sales * 100` or `if(Qty > 10, \"Bulk\", \"Single\")`. "
+               "Write names with spaces as `[Unit Price]`. Functions: " + ", ".join(FUNCTIONS) +
+               ". Later formulas can use the columns of earlier ones.")
+    formula_count = st.number_input("Number of formulas:", min_value=1, max_value=10, value=1)
+    
+    formulas = []
+    for i in range(int(formula_count)):
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            column = st.text_input("Result column:", key=f"formula_column_{i}")
+        with col2:
+            expression = st.text_input("Formula:", key=f"formula_expression_{i}")
+        if column and expression:
+            formulas.append({'column': column, 'expression': expression})
+    
+    if not formulas:
+        return {}
+    config['formulas'] = formulas
+    
+    try:
+        compile_formulas(formula_pairs(config)).validate(column_kinds(meta['dtypes']))
+    except FormulaError as e:
+        st.error(f"❌ {e}")
+        return {}
+    return config
+
+
+def configure_text_operations(meta: Dict[str, Any]) -> Dict[str, Any]:
     """Configure text operations."""
-    text_cols = df.select_dtypes(include=['object']).columns.tolist()
+    text_cols = meta['text_columns']
     
-    operation = st.selectbox(
-        "Text Operation:",
-        ["Lowercase", "Uppercase", "Title Case", "Trim Spaces", "Replace Text", "Extract Pattern"]
-    )
+    operation = st.selectbox("Text Operation:", TEXT_OPERATIONS)
     
     config = {'operation': operation}
     
@@ -348,17 +500,35 @@ def configure_text_operations(df: pd.DataFrame) -> Dict[str, Any]:
         new_text = st.text_input("Replace with:")
         config.update({'old_text': old_text, 'new_text': new_text})
     
+    elif operation == "Extract Pattern":
+        pattern = st.text_input("Regular expression:", help=r"e.g. `(\d{4})` keeps the first group, "
+                                                             r"`[A-Z]+-\d+` the whole match")
+        group = st.text_input("Group to keep (number or name, optional):")
+        result_column = st.text_input("Result column (leave empty to replace the column):")
+        if not pattern:
+            return {}
+        config['pattern'] = pattern
+        if group.strip():
+            config['group'] = group.strip()
+        if result_column.strip():
+            config['result_column'] = result_column.strip()
+        try:
+            pattern_group(config)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return {}
+    
     return config
 
 
-def configure_date_operations(df: pd.DataFrame) -> Dict[str, Any]:
+def configure_date_operations(meta: Dict[str, Any]) -> Dict[str, Any]:
     """Configure date operations."""
     operation = st.selectbox(
         "Date Operation:",
         ["Convert to Date", "Extract Year", "Extract Month", "Extract Day", "Format Date"]
     )
     
-    column = st.selectbox("Select column:", df.columns.tolist())
+    column = st.selectbox("Select column:", meta['column_names'])
     
     config = {'operation': operation, 'column': column}
     
@@ -370,6 +540,93 @@ def configure_date_operations(df: pd.DataFrame) -> Dict[str, Any]:
         output_format = st.text_input("Output format:", value="%Y-%m-%d")
         config['output_format'] = output_format
     
+    result_column = st.text_input("Result column (leave empty to replace the column):",
+                                  help="Text dates are parsed once per column, so several operations "
+                                       "reading the same column into new columns parse it only once")
+    if result_column.strip():
+        config['result_column'] = result_column.strip()
+    
+    return config
+
+
+def configure_merge_operations(meta: Dict[str, Any], selected_file: str, selected_sheet: str) -> Dict[str, Any]:
+    """Configure operations that read another uploaded sheet."""
+    operation = st.selectbox("Merge Operation:", MERGE_OPERATIONS)
+    
+    config = {'operation': operation}
+    
+    # Any other uploaded sheet can be a source, including sheets of the same file
+    sources = [(file_name, sheet_name)
+               for file_name, sheets in st.session_state.sheet_metadata.items()
+               for sheet_name in sheets
+               if (file_name, sheet_name) != (selected_file, selected_sheet)]
+    if not sources:
+        st.info("Upload another file or sheet to merge with.")
+        return {}
+    labels = {f"{file_name} / {sheet_name}": (file_name, sheet_name) for file_name, sheet_name in sources}
+    
+    if operation == "Stack Sheets":
+        selected = st.multiselect("Sheets to append below this one:", list(labels))
+        config['sources'] = [{'file': labels[label][0], 'sheet': labels[label][1]} for label in selected]
+        config['source_column'] = st.text_input("Source column name (optional):", value="Source File")
+        return config
+    
+    file_name, sheet_name = labels[st.selectbox("Source sheet:", list(labels))]
+    source_columns = st.session_state.sheet_metadata[file_name][sheet_name]['column_names']
+    config['source'] = {'file': file_name, 'sheet': sheet_name}
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        config['left_on'] = st.multiselect("Key columns (this sheet):", meta['column_names'])
+    with col2:
+        config['right_on'] = st.multiselect("Key columns (source sheet):", source_columns,
+                                            help="In the same order as the keys of this sheet")
+    
+    if operation == "Lookup Values":
+        config['columns'] = st.multiselect(
+            "Columns to look up:", [col for col in source_columns if col not in config['right_on']],
+            help="The first matching source row is used; leave empty for all non-key columns")
+    else:
+        config['how'] = st.selectbox("Join type:", JOIN_TYPES)
+        config['suffix'] = st.text_input("Suffix for clashing column names:", value="_right")
+    
+    return config
+
+
+def configure_aggregation(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Configure group-by and pivot table operations."""
+    operation = st.selectbox("Aggregation:", ["Group By", "Pivot Table"])
+    
+    config = {'operation': operation}
+    
+    if operation == "Group By":
+        config['keys'] = st.multiselect("Group by columns:", meta['column_names'],
+                                        help="Leave empty to aggregate all rows into one")
+    else:
+        config['index'] = st.multiselect("Row columns:", meta['column_names'])
+        config['pivot_column'] = st.selectbox(
+            "Column whose values become columns:",
+            [col for col in meta['column_names'] if col not in config['index']])
+        if st.checkbox("Fill empty cells with 0"):
+            config['fill_value'] = 0
+    
+    aggregation_count = st.number_input("Number of aggregations:", min_value=1, max_value=10, value=1)
+    aggregations = []
+    for i in range(int(aggregation_count)):
+        col1, col2 = st.columns(2)
+        with col1:
+            function = st.selectbox("Function:", AGGREGATIONS, key=f"agg_function_{i}",
+                                    help="'rows' counts the rows of each group")
+        if function == "rows":
+            aggregations.append({'function': function})
+            continue
+        numeric = function in ("sum", "mean", "std")
+        with col2:
+            column = st.selectbox("Column:", meta['numeric_columns'] if numeric else meta['column_names'],
+                                  key=f"agg_column_{i}")
+        aggregations.append({'column': column, 'function': function})
+    config['aggregations'] = aggregations
+    
     return config
 
 
@@ -388,35 +645,66 @@ def step_3_preview_execute():
     
     st.markdown("---")
     
-    # Execute button
-    if st.button("▶️ Execute All Operations", type="primary"):
-        with st.spinner("Processing..."):
-            try:
-                transformer = DataTransformer()
-                processed_data = {}
-                
-                # Process each file
-                for file_name, sheets in st.session_state.dataframes.items():
-                    processed_data[file_name] = {}
-                    
-                    for sheet_name, df in sheets.items():
-                        # Get operations for this file/sheet
-                        relevant_ops = [op for op in st.session_state.operations 
-                                      if op['file'] == file_name and op['sheet'] == sheet_name]
-                        
-                        # Apply operations
-                        result_df = df.copy()
-                        for op in relevant_ops:
-                            result_df = transformer.apply_operation(result_df, op)
-                        
-                        processed_data[file_name][sheet_name] = result_df
-                
-                st.session_state.processed_data = processed_data
-                st.success("✅ All operations executed successfully!")
-                
-            except Exception as e:
-                st.error(f"❌ Error during execution: {str(e)}")
-                st.code(traceback.format_exc())
+    track_memory = st.checkbox("Report peak memory per sheet", value=False,
+                               help="Measures memory with tracemalloc; adds some overhead")
+    optimize = st.checkbox("Optimize execution plan", value=True,
+                           help="Runs filters early, fuses adjacent filters and skips work whose result is deleted")
+    profile = st.checkbox("Profile each operation", value=False,
+                          help="Records time, rows, peak memory and output size per operation; adds some overhead")
+    
+    planner = QueryPlanner()
+    
+    # Dry run: show the plan without executing anything
+    if st.button("🔍 Show Execution Plan"):
+        for (file_name, sheet_name), ops in group_operations_by_sheet(st.session_state.operations).items():
+            st.write(f"**{file_name} / {sheet_name}**")
+            if optimize:
+                st.code(planner.explain(ops))
+            else:
+                st.code("\n".join(f"{idx + 1}. {describe_operation(op)}" for idx, op in enumerate(ops)))
+    
+    # Sampled preview: run the chain on a sample before committing to the full run
+    st.markdown("### 👁️ Preview on a Sample")
+    preview_on_sample(optimize)
+    
+    st.markdown("---")
+    st.markdown("### ▶️ Full Execution")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        max_workers = st.number_input("Parallel workers:", min_value=1, max_value=os.cpu_count() or 1,
+                                      value=min(4, os.cpu_count() or 1))
+    with col2:
+        use_processes = st.checkbox("Use separate processes", value=False,
+                                    help="True parallelism for CPU-heavy chains, at the cost of copying each sheet to a worker")
+        reuse_results = st.checkbox("Reuse results of unchanged operations", value=True,
+                                    help="Only re-runs operations after the first one that changed (threads only)")
+    
+    # Execute button: the run is queued as a background job, so reruns do not restart it
+    job_manager = get_job_manager()
+    job = job_manager.get(st.session_state.job_id) if st.session_state.job_id else None
+    running = job is not None and not job.is_finished
+    
+    if st.button("▶️ Execute All Operations", type="primary", disabled=running):
+        input_keys = {(file_name, sheet_name): f"{digest}:{sheet_name}"
+                      for file_name, digest in st.session_state.file_hashes.items()
+                      for sheet_name in st.session_state.dataframes.get(file_name, {})}
+        job = job_manager.submit(dict(st.session_state.dataframes), list(st.session_state.operations),
+                                 input_keys=input_keys, max_workers=int(max_workers),
+                                 use_processes=use_processes, optimize=optimize, track_memory=track_memory,
+                                 cache=get_operation_cache() if reuse_results else None, profile=profile)
+        st.session_state.job_id = job.job_id
+        running = not job.is_finished
+    
+    if running:
+        show_job_progress(job, job_manager)
+    elif job is not None:
+        collect_job_results(job)
+        job_manager.forget(job.job_id)
+        st.session_state.job_id = None
+    
+    if st.session_state.job_report:
+        show_job_report(st.session_state.job_report)
     
     # Preview results
     if st.session_state.processed_data:
@@ -427,8 +715,185 @@ def step_3_preview_execute():
             with st.expander(f"📄 {file_name}"):
                 for sheet_name, df in sheets.items():
                     st.write(f"**Sheet: {sheet_name}**")
+                    if isinstance(df, LazySheet):
+                        st.write("No operations, exported unchanged")
+                        continue
                     st.write(f"Rows: {len(df)}, Columns: {len(df.columns)}")
+                    stats = st.session_state.run_stats.get((file_name, sheet_name))
+                    if stats and stats.get('duplicates_removed'):
+                        st.write(f"Duplicate rows removed: {stats['duplicates_removed']}")
+                    if stats and stats['cached_operations']:
+                        st.write(f"Reused cached results of {stats['cached_operations']} "
+                                 f"of {stats['operations']} operation(s)")
+                    if stats and stats['peak_memory_bytes'] is not None:
+                        st.write(f"Peak memory: {format_bytes(stats['peak_memory_bytes'])}, "
+                                 f"copies made: {stats['copies']}")
                     st.dataframe(df.head(20), use_container_width=True)
+        
+        show_run_report()
+
+
+def show_run_report():
+    """Show the per-operation profile of the last run, with JSON and OpenMetrics downloads."""
+    rows = [{'file': file_name, 'sheet': sheet_name, **record}
+            for (file_name, sheet_name), stats in st.session_state.run_stats.items()
+            if stats and stats.get('profile')
+            for record in stats['profile']]
+    if not rows:
+        return
+    
+    st.markdown("### ⏱️ Run Report")
+    report = pd.DataFrame(rows)
+    st.dataframe(report, use_container_width=True)
+    
+    slowest = report.loc[report['seconds'].fillna(0).idxmax()]
+    st.write(f"Slowest operation: **{slowest['type']} - {slowest['operation']}** on "
+             f"{slowest['file']} / {slowest['sheet']} ({slowest['seconds']:.3f}s)")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📄 Download report (JSON)", data=json.dumps(rows, indent=2, default=str),
+                           file_name="run_report.json", mime="application/json")
+    with col2:
+        st.download_button("📈 Download metrics (OpenMetrics)", data=get_operation_metrics().render(),
+                           file_name="metrics.txt",
+                           mime="application/openmetrics-text; version=1.0.0; charset=utf-8")
+
+
+def show_job_progress(job, job_manager: JobManager):
+    """Show per-sheet progress of a running job and poll until it has finished."""
+    progress = job.progress()
+    if job.status == 'queued':
+        position = job_manager.queue_position(job.job_id)
+        st.info(f"⏳ Waiting for a free slot ({position} job(s) ahead, "
+                f"{job_manager.max_concurrent_jobs} run at a time)")
+    st.progress(progress['fraction'], text=f"Processing... {progress['fraction']:.0%}")
+    for (file_name, sheet_name), sheet in progress['sheets'].items():
+        st.caption(f"{file_name} / {sheet_name}: {sheet['completed']}/{sheet['total']} "
+                   f"operation(s), {sheet['status']}")
+    
+    if job.is_cancelled:
+        st.warning("Cancelling...")
+    elif st.button("⏹️ Cancel"):
+        job_manager.cancel(job.job_id)
+    
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
+
+def show_job_report(report: Dict[str, Any]):
+    """Show the outcome of the last finished job."""
+    if report['status'] == 'failed':
+        st.error(f"❌ Error during execution: {report['error']}")
+        st.code(report['traceback'])
+    elif report['status'] == 'cancelled':
+        st.warning("⏹️ Execution cancelled; results of the previous run were kept.")
+    elif report['failures']:
+        st.warning(f"⚠️ {len(report['failures'])} sheet(s) failed; the other sheets were processed.")
+        for result in report['failures']:
+            st.error(f"❌ {result['file']} / {result['sheet']}: {result['error']}")
+            with st.expander("Details"):
+                st.code(result['traceback'])
+    else:
+        st.success("✅ All operations executed successfully!")
+
+
+def collect_job_results(job):
+    """Store the results of a finished job as the session's processed data."""
+    report = {'status': job.status, 'error': job.error, 'traceback': job.traceback, 'failures': []}
+    
+    if job.status == 'done':
+        processed_data = {}
+        run_stats = {}
+        
+        # Keep the uploaded file/sheet order; failed sheets are left out
+        for file_name, sheets in st.session_state.dataframes.items():
+            processed_data[file_name] = {}
+            for sheet_name in sheets:
+                result = job.results.get((file_name, sheet_name))
+                if result is None:
+                    continue
+                if result['status'] == 'done':
+                    processed_data[file_name][sheet_name] = result['dataframe']
+                    run_stats[(file_name, sheet_name)] = result['stats']
+                    if result['stats'] and result['stats'].get('profile'):
+                        get_operation_metrics().record(result['stats']['profile'])
+                else:
+                    report['failures'].append(result)
+        
+        if OPENMETRICS_FILE:
+            get_operation_metrics().write(OPENMETRICS_FILE)
+        
+        st.session_state.processed_data = processed_data
+        st.session_state.run_stats = run_stats
+        clear_export_cache()
+    
+    st.session_state.job_report = report
+
+
+def preview_on_sample(optimize: bool):
+    """Run the queued operations on a sample of each sheet and estimate the full run."""
+    grouped = group_operations_by_sheet(st.session_state.operations)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sample_rows = st.number_input("Sample rows:", min_value=10, max_value=1000000, value=1000, step=100)
+    with col2:
+        methods = {"First rows": "head", "Random rows": "random", "Stratified by column": "stratified"}
+        method = methods[st.selectbox("Sample:", list(methods))]
+    stratify_column = None
+    if method == "stratified":
+        columns = []
+        for file_name, sheet_name in grouped:
+            columns.extend(st.session_state.sheet_metadata.get(file_name, {})
+                           .get(sheet_name, {}).get('column_names', []))
+        with col3:
+            stratify_column = st.selectbox("Stratify by:", list(dict.fromkeys(columns)))
+    
+    if st.button("👁️ Preview on Sample"):
+        previews = {}
+        for (file_name, sheet_name), ops in grouped.items():
+            try:
+                workbook = st.session_state.dataframes[file_name]
+                if method == "head":
+                    # Only the first rows are parsed unless the sheet is already loaded
+                    sample = workbook.head(sheet_name, int(sample_rows))
+                    total_rows = (len(workbook[sheet_name]) if workbook.is_loaded(sheet_name)
+                                  else st.session_state.sheet_metadata[file_name][sheet_name]['rows'])
+                else:
+                    df = workbook[sheet_name]
+                    sheet_method = method if method == "random" or stratify_column in df.columns else "random"
+                    sample = sample_frame(df, int(sample_rows), sheet_method, stratify_column)
+                    total_rows = len(df)
+                previews[(file_name, sheet_name)] = preview_sheet(
+                    sample, ops, total_rows, optimize=optimize,
+                    sources=resolve_sources(st.session_state.dataframes, ops))
+            except Exception as e:
+                previews[(file_name, sheet_name)] = {'error': str(e)}
+        st.session_state.preview_results = previews
+    
+    for (file_name, sheet_name), preview in st.session_state.preview_results.items():
+        st.write(f"**{file_name} / {sheet_name}**")
+        if 'error' in preview:
+            st.error(f"❌ {preview['error']}")
+            continue
+        
+        estimate = preview['estimate']
+        total_rows = preview['total_rows'] if preview['total_rows'] is not None else "unknown"
+        st.write(f"Sample: {preview['sample_rows']} of {total_rows} rows → "
+                 f"{len(preview['dataframe'])} rows in {preview['seconds']:.3f}s")
+        if estimate is not None:
+            st.write(f"Estimated full run: {estimate['seconds']:.1f}s, about {estimate['rows']} rows, "
+                     f"{format_bytes(estimate['bytes'])}")
+        st.dataframe(preview['dataframe'].head(20), use_container_width=True)
+
+
+def group_operations_by_sheet(operations: List[Dict[str, Any]]) -> Dict[tuple, List[Dict[str, Any]]]:
+    """Group queued operations by (file, sheet), keeping their order."""
+    grouped = {}
+    for op in operations:
+        grouped.setdefault((op['file'], op['sheet']), []).append(op)
+    return grouped
 
 
 def step_4_download_results():
@@ -441,28 +906,37 @@ def step_4_download_results():
     
     st.markdown("### 📥 Download Processed Files")
     
+    file_handler = FileHandler()
+    export_cache = st.session_state.export_cache
+    
     for file_name, sheets in st.session_state.processed_data.items():
-        # Create Excel file in memory
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            for sheet_name, df in sheets.items():
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        # Build each workbook once per execution; reruns reuse the cached bytes.
+        # st.download_button needs bytes, so the spooled file is read once here
+        if file_name not in export_cache:
+            with st.spinner(f"Writing {file_name}..."):
+                with file_handler.export_excel(sheets) as output:
+                    data = output.read()
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            download_name = f"processed_{file_name.replace('.xlsx', '')}_{timestamp}.xlsx"
+            export_cache[file_name] = {'data': data, 'download_name': download_name}
         
-        output.seek(0)
+        cached = export_cache[file_name]
         
         # Generate download button
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        download_name = f"processed_{file_name.replace('.xlsx', '')}_{timestamp}.xlsx"
-        
         st.download_button(
             label=f"📥 Download {file_name}",
-            data=output,
-            file_name=download_name,
+            data=cached['data'],
+            file_name=cached['download_name'],
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     
     st.success("✅ Files ready for download!")
 
 
+def clear_export_cache():
+    """Forget exported workbooks from a previous execution."""
+    st.session_state.export_cache = {}
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,3 @@
+"""
+Benchmarks for Excel Data Massaging Tool
+"""
@@ -0,0 +1,106 @@
+"""
+Benchmark for row filtering.
+
+Compares FilterEngine (type-stable literals, dictionary-encoded 'contains')
+with the previous _apply_filtering implementation.
+
+Usage:
+    python -m benchmarks.bench_filtering --rows 1000000
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.filter_engine import FilterEngine
+
+
+def legacy_mask(df: pd.DataFrame, column: str, operator: str, value):
+    """Previous filter implementation: float() guess and astype(str) per call."""
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        pass
+
+    if operator == "==":
+        return df[column] == value
+    elif operator == "!=":
+        return df[column] != value
+    elif operator == ">":
+        return df[column] > value
+    elif operator == "<":
+        return df[column] < value
+    elif operator == "contains":
+        return df[column].astype(str).str.contains(str(value), na=False)
+    elif operator == "not contains":
+        return ~df[column].astype(str).str.contains(str(value), na=False)
+
+
+def build_frame(rows: int) -> pd.DataFrame:
+    """Build a frame with numeric, low-cardinality and high-cardinality text columns."""
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'Sales': rng.integers(100, 1000, rows),
+        'Region': rng.choice(['North', 'South', 'East', 'West'], rows),
+        'Product': rng.choice([f'Product {i}' for i in range(50)], rows),
+        'Customer': [f'Customer {i}' for i in rng.integers(0, rows, rows)]
+    })
+
+
+def best_time(func, repeat: int) -> float:
+    """Return the best wall time of func over several runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark row filtering")
+    parser.add_argument('--rows', type=int, default=1000000, help="Rows in the test frame")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    logging.getLogger('utils').setLevel(logging.WARNING)
+    df = build_frame(args.rows)
+    engine = FilterEngine()
+
+    cases = [
+        ('Sales', '>', '500'),
+        ('Region', '==', 'North'),
+        ('Product', 'contains', 'uct 1'),
+        ('Customer', 'contains', '99'),
+    ]
+
+    print(f"{'condition':<32} {'legacy (s)':>11} {'engine (s)':>11} {'speedup':>9}")
+    for column, operator, value in cases:
+        old = best_time(lambda: legacy_mask(df, column, operator, value), args.repeat)
+        new = best_time(lambda: engine.condition_mask(df[column], operator, value), args.repeat)
+        label = f"{column} {operator} {value!r}"
+        print(f"{label:<32} {old:>11.4f} {new:>11.4f} {old / new:>8.1f}x")
+
+    # Compound predicate: three filters in a row vs. one OR/AND group
+    group = {'conditions': [
+        {'column': 'Sales', 'operator': '>', 'value': '500'},
+        {'conditions': [{'column': 'Region', 'operator': '==', 'value': 'North'},
+                        {'column': 'Product', 'operator': 'contains', 'value': 'uct 1'}],
+         'logic': 'OR'}
+    ], 'logic': 'AND'}
+
+    def legacy_compound():
+        mask = legacy_mask(df, 'Sales', '>', '500')
+        mask &= legacy_mask(df, 'Region', '==', 'North') | legacy_mask(df, 'Product', 'contains', 'uct 1')
+        return mask
+
+    old = best_time(legacy_compound, args.repeat)
+    new = best_time(lambda: engine.mask(df, group), args.repeat)
+    print(f"{'compound AND/OR':<32} {old:>11.4f} {new:>11.4f} {old / new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark for FileHandler.load_excel.
+
+Compares the single-pass loader with the previous per-sheet path, which
+re-parsed the whole workbook once for every sheet.
+
+Usage:
+    python -m benchmarks.bench_load_excel --sheets 1 5 10 30 --rows 2000
+"""
+
+import argparse
+import io
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.file_handler import FileHandler
+
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory file with a name, like Streamlit's UploadedFile."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def build_workbook(sheet_count: int, rows: int) -> bytes:
+    """Build an .xlsx workbook with the given number of identical sheets."""
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        'Product': rng.choice(['Product A', 'Product B', 'Product C'], rows),
+        'Region': rng.choice(['North', 'South', 'East', 'West'], rows),
+        'Sales': rng.integers(100, 1000, rows),
+        'Cost': rng.integers(50, 500, rows),
+        'Quantity': rng.integers(1, 50, rows)
+    })
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        for idx in range(sheet_count):
+            df.to_excel(writer, sheet_name=f"Sheet{idx + 1}", index=False)
+    return output.getvalue()
+
+
+def load_per_sheet(file):
+    """Previous loader: one full workbook parse per sheet."""
+    excel_file = pd.ExcelFile(file)
+    return {sheet_name: pd.read_excel(file, sheet_name=sheet_name)
+            for sheet_name in excel_file.sheet_names}
+
+
+def time_call(func, data: bytes, repeat: int) -> float:
+    """Return the best wall time of func over several runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        file = NamedBytesIO(data, 'benchmark.xlsx')
+        start = time.perf_counter()
+        func(file)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Excel loading")
+    parser.add_argument('--sheets', type=int, nargs='+', default=[1, 5, 10, 30],
+                        help="Sheet counts to benchmark")
+    parser.add_argument('--rows', type=int, default=2000, help="Rows per sheet")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is kept)")
+    args = parser.parse_args()
+
+    logging.getLogger('utils').setLevel(logging.WARNING)
+    handler = FileHandler()
+
+    print(f"{'sheets':>8} {'per-sheet (s)':>15} {'single-pass (s)':>17} {'speedup':>9}")
+    for sheet_count in args.sheets:
+        data = build_workbook(sheet_count, args.rows)
+        old = time_call(load_per_sheet, data, args.repeat)
+        new = time_call(handler.load_excel, data, args.repeat)
+        print(f"{sheet_count:>8} {old:>15.3f} {new:>17.3f} {old / new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Benchmark suite for transformer operations and workbook I/O.
+
+Times every DataTransformer operation family, a planned step 3 chain and
+the FileHandler load, probe, stream and export paths (export is what
+step 4 runs) on synthetic Sales Data sheets from create_sample_data.py.
+Results are written as JSON; a stored baseline can be compared against
+to flag regressions.
+
+Usage:
+    python -m benchmarks.bench_suite run --sizes 10k 1m --output results.json
+    python -m benchmarks.bench_suite run --sizes 10k --save-baseline
+    python -m benchmarks.bench_suite compare results.json --threshold 0.15
+
+Workbooks are cached in --data-dir, since writing them takes much longer
+than reading them. Sheets hold at most 1,048,575 data rows (the .xlsx
+limit), so larger sizes are split over several sheets.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_load_excel import NamedBytesIO
+from create_sample_data import generate_sales_data
+from utils.data_transformer import DataTransformer
+from utils.executor import run_sheet
+from utils.file_handler import EXCEL_MAX_ROWS, FileHandler
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SIZES = {'10k': 10000, '1m': 1000000, '10m': 10000000}
+
+# One representative operation per family, named '<family>/<operation>'
+OPERATION_CASES = {
+    'cleaning/remove_duplicates': {'type': 'Data Cleaning', 'operation': 'Remove Duplicates'},
+    'cleaning/remove_empty_rows': {'type': 'Data Cleaning', 'operation': 'Remove Empty Rows'},
+    'cleaning/fill_mean': {'type': 'Data Cleaning', 'operation': 'Fill Missing Values',
+                           'column': 'Sales', 'method': 'Mean'},
+    'cleaning/fill_mode': {'type': 'Data Cleaning', 'operation': 'Fill Missing Values',
+                           'column': 'Region', 'method': 'Mode'},
+    'filtering/numeric': {'type': 'Filtering', 'operation': 'Filter Rows',
+                          'column': 'Sales', 'operator': '>', 'value': '500'},
+    'filtering/contains': {'type': 'Filtering', 'operation': 'Filter Rows',
+                           'column': 'Customer', 'operator': 'contains', 'value': '99'},
+    'filtering/group': {'type': 'Filtering', 'operation': 'Filter Rows', 'logic': 'AND', 'conditions': [
+        {'column': 'Sales', 'operator': '>', 'value': '500'},
+        {'column': 'Region', 'operator': '==', 'value': 'North'}]},
+    'column/merge': {'type': 'Column Operations', 'operation': 'Merge Columns',
+                     'columns': ['Product', 'Region'], 'separator': ' - ', 'new_column': 'Product Region'},
+    'column/split': {'type': 'Column Operations', 'operation': 'Split Column',
+                     'column': 'Customer', 'separator': ' ', 'new_columns': ['Prefix', 'Number']},
+    'column/rename': {'type': 'Column Operations', 'operation': 'Rename Column',
+                      'old_name': 'Cost', 'new_name': 'Unit Cost'},
+    'math/subtract': {'type': 'Mathematical Operations', 'operation': 'Subtract Columns',
+                      'col1': 'Sales', 'col2': 'Cost', 'result_column': 'Profit'},
+    'math/row_sum': {'type': 'Mathematical Operations', 'operation': 'Sum',
+                     'columns': ['Sales', 'Cost', 'Quantity'], 'result_column': 'Total'},
+    'math/conditional': {'type': 'Mathematical Operations', 'operation': 'Conditional Calculation',
+                         'condition_col': 'Quantity', 'operator': '>', 'threshold': 10,
+                         'true_value': 'Bulk', 'false_value': 'Single', 'result_column': 'Order Size'},
+    'text/uppercase': {'type': 'Text Operations', 'operation': 'Uppercase', 'column': 'Customer'},
+    'text/replace': {'type': 'Text Operations', 'operation': 'Replace Text', 'column': 'Product',
+                     'old_text': 'Product', 'new_text': 'Item'},
+    'date/convert': {'type': 'Date Operations', 'operation': 'Convert to Date', 'column': 'Date',
+                     'format': '%Y-%m-%d'},
+    'date/extract_year': {'type': 'Date Operations', 'operation': 'Extract Year', 'column': 'Date'},
+    'date/format': {'type': 'Date Operations', 'operation': 'Format Date', 'column': 'Date',
+                    'output_format': '%d/%m/%Y'},
+}
+
+# A typical step 3 queue, run through the query planner
+CHAIN = [
+    OPERATION_CASES['cleaning/remove_duplicates'],
+    OPERATION_CASES['cleaning/fill_mean'],
+    OPERATION_CASES['math/subtract'],
+    OPERATION_CASES['text/uppercase'],
+    OPERATION_CASES['filtering/numeric'],
+    OPERATION_CASES['date/extract_year'],
+]
+
+
+def parse_size(value: str) -> int:
+    """Parse a row count such as '10k', '1m' or '250000'."""
+    text = value.lower()
+    if text in SIZES:
+        return SIZES[text]
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    try:
+        return int(float(text.rstrip('km')) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size '{value}'")
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    """Return the best wall time of func over several runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def split_sheets(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Split a frame into sheets that fit the .xlsx row limit."""
+    return {f"Sales {idx // EXCEL_MAX_ROWS + 1}": df.iloc[idx:idx + EXCEL_MAX_ROWS]
+            for idx in range(0, max(len(df), 1), EXCEL_MAX_ROWS)}
+
+
+def workbook_bytes(df: pd.DataFrame, rows: int, data_dir: str) -> bytes:
+    """Return the synthetic workbook for a size, writing it to data_dir the first time."""
+    path = os.path.join(data_dir, f"sales_{rows}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        FileHandler().write_excel(split_sheets(df), path + '.tmp')
+        os.replace(path + '.tmp', path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def operation_cases(df: pd.DataFrame, selected: List[str]) -> Dict[str, Callable[[], Any]]:
+    """Build the operation benchmarks for one frame."""
+    # A new transformer per run, so parsed date columns are not reused between repeats
+    cases = {f"op/{name}": (lambda op=op: DataTransformer().apply_operations(df, [op]))
+             for name, op in OPERATION_CASES.items()}
+    cases['op/chain/planned'] = lambda: run_sheet(df, CHAIN, optimize=True)
+    return {name: func for name, func in cases.items() if selected_case(name, selected)}
+
+
+def io_cases(df: pd.DataFrame, data: bytes, selected: List[str]) -> Dict[str, Callable[[], Any]]:
+    """Build the load, probe, stream and export benchmarks for one workbook."""
+    handler = FileHandler()
+    sheets = split_sheets(df)
+    first_sheet = next(iter(sheets))
+
+    def open_file():
+        return NamedBytesIO(data, 'benchmark.xlsx')
+
+    def parse_lazy():
+        workbook = handler.open_excel(open_file())
+        return [workbook[name] for name in workbook.sheet_names]
+
+    def stream_chunks():
+        return sum(len(chunk) for chunk in handler.iter_excel_chunks(open_file(), first_sheet))
+
+    def export_passthrough():
+        workbook = handler.open_excel(open_file())
+        return handler.export_excel({name: workbook.sheet(name) for name in workbook.sheet_names})
+
+    cases = {
+        'io/load_excel': lambda: handler.load_excel(open_file()),
+        'io/open_excel_parse': parse_lazy,
+        'io/probe_excel': lambda: handler.probe_excel(open_file()),
+        'io/iter_excel_chunks': stream_chunks,
+        'io/export_excel': lambda: handler.export_excel(sheets),
+        'io/export_passthrough': export_passthrough,
+    }
+    return {name: func for name, func in cases.items() if selected_case(name, selected)}
+
+
+def selected_case(name: str, selected: List[str]) -> bool:
+    """Whether a case matches one of the --cases prefixes (all cases if none given)."""
+    return not selected or any(name.startswith(prefix) for prefix in selected)
+
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and library versions the results were taken on."""
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def run_suite(sizes: List[int], repeat: int, data_dir: str, selected: List[str],
+              skip_io: bool) -> Dict[str, Any]:
+    """Run every selected case at every size and return the results document."""
+    results = {}
+    print(f"{'case':<36} {'rows':>10} {'seconds':>10}")
+    for rows in sizes:
+        df = generate_sales_data(rows)
+        cases = operation_cases(df, selected)
+        if not skip_io and (not selected or any(prefix.startswith('io') for prefix in selected)):
+            cases.update(io_cases(df, workbook_bytes(df, rows, data_dir), selected))
+        for name, func in cases.items():
+            seconds = best_time(func, repeat)
+            results[f"{name}@{rows}"] = {'case': name, 'rows': rows, 'seconds': seconds}
+            print(f"{name:<36} {rows:>10} {seconds:>10.4f}")
+    return {'environment': environment(), 'repeat': repeat, 'results': results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare results with a baseline and print a report.
+
+    Args:
+        current: Results document from run_suite
+        baseline: Stored results document
+        threshold: Allowed slowdown as a fraction (0.15 = 15% slower)
+
+    Returns:
+        List of result keys that regressed beyond the threshold
+    """
+    if current.get('environment') != baseline.get('environment'):
+        print("Note: results were taken on a different environment than the baseline")
+
+    regressions = []
+    print(f"{'case':<36} {'rows':>10} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            print(f"{result['case']:<36} {result['rows']:>10} {'-':>10} {result['seconds']:>10.4f}      new")
+            continue
+        change = result['seconds'] / base['seconds'] - 1 if base['seconds'] else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"{result['case']:<36} {result['rows']:>10} {base['seconds']:>10.4f} "
+              f"{result['seconds']:>10.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    """Read a results document."""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(document: Dict[str, Any], path: str):
+    """Write a results document."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def check_regressions(current: Dict[str, Any], baseline_path: str, threshold: float) -> int:
+    """Compare with the baseline file, returning the process exit code."""
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, run with --save-baseline first")
+        return 2
+    regressions = compare(current, load_results(baseline_path), threshold)
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {threshold:.0%}")
+        return 1
+    print(f"No regressions above {threshold:.0%}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite for operations and workbook I/O")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the suite")
+    run_parser.add_argument('--sizes', type=parse_size, nargs='+', default=[SIZES['10k']],
+                            help="Rows per benchmark, e.g. 10k 1m 10m")
+    run_parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is kept)")
+    run_parser.add_argument('--cases', nargs='*', default=[],
+                            help="Only run cases starting with these prefixes, e.g. op/text io/")
+    run_parser.add_argument('--skip-io', action='store_true', help="Skip the workbook I/O cases")
+    run_parser.add_argument('--data-dir', default=DATA_DIR, help="Where generated workbooks are cached")
+    run_parser.add_argument('--output', help="Write the results to this JSON file")
+    run_parser.add_argument('--save-baseline', action='store_true',
+                            help="Store the results as the baseline")
+    run_parser.add_argument('--compare', action='store_true',
+                            help="Compare the results with the baseline afterwards")
+
+    compare_parser = commands.add_parser('compare', help="Compare results with the baseline")
+    compare_parser.add_argument('results', help="Results JSON file from 'run --output'")
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file")
+        sub.add_argument('--threshold', type=float, default=0.15,
+                         help="Allowed slowdown before a case is flagged (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    logging.getLogger('utils').setLevel(logging.WARNING)
+
+    if args.command == 'compare':
+        sys.exit(check_regressions(load_results(args.results), args.baseline, args.threshold))
+
+    document = run_suite(args.sizes, args.repeat, args.data_dir, args.cases, args.skip_io)
+    if args.output:
+        save_results(document, args.output)
+    if args.save_baseline:
+        save_results(document, args.baseline)
+    if args.compare:
+        sys.exit(check_regressions(document, args.baseline, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Excel Data Massaging Tool - Command Line Batch Runner
+Applies a saved template to many workbooks without the Streamlit UI.
+
+Usage:
+    python cli.py TEMPLATE INPUT [INPUT ...] [--output-dir DIR] [--workers N]
+                  [--processes] [--profile] [--json-report PATH]
+                  [--metrics-file PATH] [--source PATH ...] [--chunk-size N] [--dry-run]
+
+INPUT may be a file path or a glob such as "data/**/*.xlsx".
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.file_handler import FileHandler
+from utils.template_manager import TemplateManager
+from utils.executor import run_sheet, stream_sheet
+from utils.merge_engine import JoinIndexCache, source_refs
+from utils.query_planner import QueryPlanner
+from utils.memory import format_bytes
+from utils.profiler import OperationMetrics, format_profile
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Expand file paths and globs into a sorted list of unique Excel files."""
+    handler = FileHandler()
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            extension = os.path.splitext(path)[1].lower()
+            if os.path.isfile(path) and extension in handler.supported_formats and path not in paths:
+                paths.append(path)
+    return sorted(paths)
+
+
+def operations_for_sheet(operations: List[Dict[str, Any]], file_name: str, sheet_name: str,
+                         match_file: bool) -> List[Dict[str, Any]]:
+    """
+    Select the template operations that apply to one sheet.
+
+    Templates record the file name they were built on. In batch mode the
+    input names usually differ, so operations match on sheet name only
+    unless match_file is set.
+    """
+    return [op for op in operations
+            if op.get('sheet') == sheet_name and (not match_file or op.get('file') == file_name)]
+
+
+def resolve_cli_sources(sheet_ops: List[Dict[str, Any]], sheets,
+                        source_paths: Dict[str, str], opened: Dict[str, Any],
+                        optimize_dtypes: bool = False) -> Dict[Tuple[str, str], Any]:
+    """
+    Load the sheets read by merge operations of one input workbook.
+
+    A source recorded under the same file name as the operation is taken
+    from the input workbook itself, so a template that stacks or joins
+    sheets of one workbook works for every input. Other sources are found
+    by file name among source_paths and opened once per input.
+
+    Args:
+        sheet_ops: Operations of one sheet
+        sheets: The input workbook (LazyWorkbook)
+        source_paths: File name -> path of the --source workbooks and inputs
+        opened: Workbooks opened so far, by path (filled in here)
+        optimize_dtypes: Load source sheets with compact dtypes
+
+    Returns:
+        Dict mapping the recorded (file, sheet) to the source DataFrame
+    """
+    handler = FileHandler()
+    sources = {}
+    for op in sheet_ops:
+        for ref in source_refs(op):
+            source_file, source_sheet = ref
+            if source_file == op.get('file'):
+                workbook = sheets
+            elif source_file in source_paths:
+                path = source_paths[source_file]
+                if path not in opened:
+                    with open(path, 'rb') as f:
+                        opened[path] = handler.open_excel(f, optimize_dtypes=optimize_dtypes)
+                workbook = opened[path]
+            else:
+                raise ValueError(f"Source workbook '{source_file}' not found; pass it with --source")
+            if source_sheet not in workbook:
+                raise ValueError(f"Source sheet '{source_sheet}' not found in '{source_file}'")
+            sources[ref] = workbook[source_sheet]
+    return sources
+
+
+def source_path_map(paths: List[str], operations: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Map file names to the workbooks merge operations can read.
+
+    Names shared by several files are left out.
+
+    Raises:
+        ValueError: If an operation reads a source whose file name matches
+            several files
+    """
+    by_name = {}
+    for path in paths:
+        matches = by_name.setdefault(os.path.basename(path), [])
+        if all(os.path.abspath(path) != os.path.abspath(other) for other in matches):
+            matches.append(path)
+
+    referenced = {source_file for op in operations for source_file, _ in source_refs(op)
+                  if source_file != op.get('file')}
+    for name, matches in by_name.items():
+        if len(matches) > 1 and name in referenced:
+            raise ValueError(f"Source workbook '{name}' matches several files: {', '.join(matches)}")
+    return {name: matches[0] for name, matches in by_name.items() if len(matches) == 1}
+
+
+def output_path_for(path: str, output_dir: str, input_root: Optional[str] = None) -> str:
+    """Return where the processed copy of an input goes, mirroring its folder below input_root."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    folder = os.path.relpath(os.path.dirname(os.path.abspath(path)), input_root) if input_root else '.'
+    return os.path.normpath(os.path.join(output_dir, folder, f"processed_{stem}.xlsx"))
+
+
+def sheet_chunks(path: str, sheet_name: str, chunk_size: int):
+    """Return a function that streams one sheet from disk in row chunks, once per call."""
+    def open_chunks():
+        with open(path, 'rb') as f:
+            yield from FileHandler().iter_excel_chunks(f, sheet_name, chunk_size)
+    return open_chunks
+
+
+def process_workbook(path: str, operations: List[Dict[str, Any]], output_dir: str, optimize: bool,
+                     match_file: bool, track_memory: bool, optimize_dtypes: bool = False,
+                     profile: bool = False, source_paths: Optional[Dict[str, str]] = None,
+                     chunk_size: Optional[int] = None, input_root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load one workbook, apply the template and write the processed copy.
+
+    Merge operations read their sources with resolve_cli_sources; join
+    indexes are shared by the sheets of this workbook.
+
+    With chunk_size, sheets with operations are streamed from disk through
+    the chain chunk_size rows at a time and written out as they go, so a
+    sheet never has to fit in memory (memory and profile measurements are
+    not available then).
+
+    The output goes to output_path_for(path, output_dir, input_root), so
+    inputs with the same name in different folders do not overwrite each
+    other.
+
+    Defined at module level so it can run in a process pool.
+
+    Returns:
+        Dict with 'input', 'output', 'status', 'error', 'seconds' and per-sheet
+        'sheets' stats (with per-operation records in 'profile' if profile is set)
+    """
+    start = time.perf_counter()
+    file_name = os.path.basename(path)
+    summary = {'input': path, 'output': None, 'status': 'done', 'error': None, 'sheets': []}
+
+    try:
+        handler = FileHandler()
+        with open(path, 'rb') as f:
+            sheets = handler.open_excel(f, optimize_dtypes=optimize_dtypes)
+
+        processed = {}
+        opened = {}
+        index_cache = JoinIndexCache()
+        streamed = []
+        for sheet_name in sheets:
+            sheet_ops = operations_for_sheet(operations, file_name, sheet_name, match_file)
+            if not sheet_ops:
+                # Copied to the output without being parsed
+                processed[sheet_name] = sheets.sheet(sheet_name)
+                summary['sheets'].append({'sheet': sheet_name, 'operations': 0, 'seconds': 0.0,
+                                          'rows_in': None, 'rows_out': None, 'peak_memory_bytes': None,
+                                          'profile': None})
+                continue
+            sources = resolve_cli_sources(sheet_ops, sheets, source_paths or {}, opened,
+                                          optimize_dtypes)
+            if chunk_size:
+                processed[sheet_name], transformer = stream_sheet(
+                    sheet_chunks(path, sheet_name, chunk_size), sheet_ops, optimize=optimize,
+                    sources=sources, index_cache=index_cache)
+                streamed.append((transformer, {'sheet': sheet_name, 'operations': len(sheet_ops), 'seconds': 0.0,
+                                               'rows_in': None, 'rows_out': None, 'peak_memory_bytes': None,
+                                               'profile': None}))
+                summary['sheets'].append(streamed[-1][1])
+                continue
+            result = run_sheet(sheets[sheet_name], sheet_ops, optimize=optimize, track_memory=track_memory,
+                               profile=profile, sources=sources, index_cache=index_cache)
+            processed[sheet_name] = result['dataframe']
+            summary['sheets'].append({'sheet': sheet_name, 'operations': len(sheet_ops),
+                                      'seconds': result['seconds'], **result['stats']})
+
+        output_path = output_path_for(path, output_dir, input_root)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if chunk_size:
+            # Streamed sheets are transformed while they are written
+            handler.write_excel(processed, output_path)
+            for transformer, sheet_summary in streamed:
+                sheet_summary.update(transformer.last_run_stats, operations=sheet_summary['operations'])
+        else:
+            output = handler.export_excel(processed)
+            with open(output_path, 'wb') as f:
+                shutil.copyfileobj(output, f)
+            output.close()
+        summary['output'] = output_path
+
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['error'] = str(e)
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def print_dry_run(operations: List[Dict[str, Any]], paths: List[str], optimize: bool):
+    """Print the files that would be processed and the plan for every sheet."""
+    print(f"Would process {len(paths)} file(s):")
+    for path in paths:
+        print(f"  {path}")
+
+    planner = QueryPlanner()
+    sheet_names = list(dict.fromkeys(op.get('sheet') for op in operations))
+    for sheet_name in sheet_names:
+        sheet_ops = [op for op in operations if op.get('sheet') == sheet_name]
+        print(f"\nSheet '{sheet_name}':")
+        if optimize:
+            print(planner.explain(sheet_ops))
+        else:
+            for idx, op in enumerate(sheet_ops):
+                print(f"  {idx + 1}. {op.get('type')} - {op.get('operation', '')}")
+
+
+def print_profile(summaries: List[Dict[str, Any]], total_seconds: float):
+    """Print per-file and per-sheet timings and memory."""
+    print("\nProfile:")
+    for summary in summaries:
+        print(f"  {summary['input']}: {summary['seconds']:.3f}s ({summary['status']})")
+        for sheet in summary['sheets']:
+            if not sheet['operations']:
+                print(f"    {sheet['sheet']}: no operations, copied unchanged")
+                continue
+            duplicates = f", {sheet['duplicates_removed']} duplicate(s) removed" \
+                if sheet.get('duplicates_removed') else ""
+            print(f"    {sheet['sheet']}: {sheet['operations']} op(s), {sheet['seconds']:.3f}s, "
+                  f"{sheet['rows_in']} -> {sheet['rows_out']} rows{duplicates}, "
+                  f"peak memory {format_bytes(sheet['peak_memory_bytes'])}")
+            for line in format_profile(sheet['profile'] or []):
+                print(f"      {line}")
+    print(f"  Total wall time: {total_seconds:.3f}s")
+
+
+def main(argv: List[str] = None) -> int:
+    """Run the batch CLI and return the process exit code."""
+    parser = argparse.ArgumentParser(description="Apply a saved template to Excel workbooks")
+    parser.add_argument('template', help="Name of a template saved from the app")
+    parser.add_argument('inputs', nargs='+', help="Input .xlsx/.xls files or glob patterns")
+    parser.add_argument('--output-dir', default='processed', help="Directory for processed workbooks")
+    parser.add_argument('--templates-dir', default='templates', help="Directory containing saved templates")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of parallel workers")
+    parser.add_argument('--processes', action='store_true', help="Use worker processes instead of threads")
+    parser.add_argument('--match-file', action='store_true',
+                        help="Only apply operations whose recorded file name matches the input file")
+    parser.add_argument('--no-optimize', action='store_true', help="Run operations in template order")
+    parser.add_argument('--optimize-dtypes', action='store_true',
+                        help="Load sheets with compact dtypes to reduce memory")
+    parser.add_argument('--profile', action='store_true',
+                        help="Report timings and peak memory per sheet and per operation")
+    parser.add_argument('--json-report', metavar='PATH',
+                        help="Write a JSON run report with per-operation measurements")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="Write per-operation counters in the OpenMetrics text format")
+    parser.add_argument('--source', action='append', default=[], metavar='PATH',
+                        help="Workbook read by merge operations (matched by file name); repeatable")
+    parser.add_argument('--chunk-size', type=int, metavar='N',
+                        help="Stream sheets through the operations N rows at a time and write the output "
+                             "as it goes, for sheets larger than memory (.xlsx only)")
+    parser.add_argument('--dry-run', action='store_true', help="Print the execution plan without running it")
+    parser.add_argument('--verbose', action='store_true', help="Show log messages")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    template = TemplateManager(args.templates_dir).load_template(args.template)
+    if template is None:
+        print(f"❌ Template '{args.template}' not found in {args.templates_dir}")
+        return 1
+    operations = template.get('operations', [])
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("❌ No Excel files matched the given inputs")
+        return 1
+
+    if any(op.get('across_files') for op in operations):
+        print("⚠️ Files are processed independently here; 'across files' duplicate removal "
+              "only removes duplicates within each file")
+
+    # Sources are matched by file name; inputs can serve as sources too
+    try:
+        source_paths = source_path_map(paths + expand_inputs(args.source), operations)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    # Outputs mirror the input folders below the deepest folder they share
+    input_root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+
+    optimize = not args.no_optimize
+    if args.dry_run:
+        print_dry_run(operations, paths, optimize)
+        return 0
+
+    profile = args.profile or bool(args.json_report) or bool(args.metrics_file)
+    os.makedirs(args.output_dir, exist_ok=True)
+    pool_class = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    start = time.perf_counter()
+    summaries = []
+
+    with pool_class(max_workers=max(1, min(args.workers, len(paths)))) as pool:
+        futures = [pool.submit(process_workbook, path, operations, args.output_dir, optimize,
+                               args.match_file, profile, args.optimize_dtypes, profile, source_paths,
+                               args.chunk_size, input_root)
+                   for path in paths]
+        for completed, future in enumerate(as_completed(futures), start=1):
+            summary = future.result()
+            summaries.append(summary)
+            if summary['status'] == 'done':
+                print(f"✅ [{completed}/{len(paths)}] {summary['input']} -> {summary['output']}")
+            else:
+                print(f"❌ [{completed}/{len(paths)}] {summary['input']}: {summary['error']}")
+
+    total_seconds = time.perf_counter() - start
+    summaries.sort(key=lambda s: s['input'])
+    if args.profile:
+        print_profile(summaries, total_seconds)
+    if args.json_report:
+        with open(args.json_report, 'w', encoding='utf-8') as f:
+            json.dump({'template': args.template, 'seconds': total_seconds, 'files': summaries},
+                      f, indent=2, default=str)
+    if args.metrics_file:
+        metrics = OperationMetrics()
+        for summary in summaries:
+            for sheet in summary['sheets']:
+                metrics.record(sheet['profile'] or [])
+        metrics.write(args.metrics_file)
+
+    failed = sum(1 for summary in summaries if summary['status'] != 'done')
+    print(f"\nProcessed {len(paths) - failed}/{len(paths)} file(s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
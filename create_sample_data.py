@@ -1,72 +1,294 @@
 """
 Script to create sample Excel files for demonstration.
+
+Without arguments it writes the small files in sample_data/. With --rows
+it generates a synthetic workbook of any size for load and stress tests,
+e.g. three sheets of a million rows with 2% missing values:
+
+    python create_sample_data.py --rows 1000000 --sheets 3 --null-ratio 0.02 --output big.xlsx
+
+Rows are generated and written in chunks through openpyxl's write-only
+mode, so memory stays bounded by --chunk-rows however large the file gets.
 """
 
+import argparse
+from typing import Iterator, List, Sequence, Tuple
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 
-# Create sample input data
-np.random.seed(42)
-
-# Sample 1: Sales Data
-sales_data = {
-    'Date': [(datetime.now() - timedelta(days=x)).strftime('%Y-%m-%d') for x in range(20)],
-    'Product': ['Product A', 'Product B', 'Product C', 'Product A', 'Product B'] * 4,
-    'Region': ['North', 'South', 'East', 'West', 'North'] * 4,
-    'Sales': np.random.randint(100, 1000, 20),
-    'Cost': np.random.randint(50, 500, 20),
-    'Quantity': np.random.randint(1, 50, 20),
-    'Customer': [f'Customer {i}' for i in range(1, 21)]
-}
-
-# Add some duplicates and missing values
-sales_df = pd.DataFrame(sales_data)
-sales_df.loc[5, 'Sales'] = np.nan
-sales_df.loc[10, 'Cost'] = np.nan
-sales_df = pd.concat([sales_df, sales_df.iloc[[0, 1, 2]]], ignore_index=True)
-
-# Sample 2: Employee Data
-employee_data = {
-    'Employee ID': [f'EMP{str(i).zfill(3)}' for i in range(1, 16)],
-    'First Name': ['John', 'Jane', 'Bob', 'Alice', 'Charlie', 'Diana', 'Eve', 'Frank', 
-                   'Grace', 'Henry', 'Ivy', 'Jack', 'Kate', 'Leo', 'Mia'],
-    'Last Name': ['Doe', 'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 
-                  'Miller', 'Davis', 'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 
-                  'Gonzalez', 'Wilson'],
-    'Department': ['Sales', 'IT', 'HR', 'Sales', 'IT', 'HR', 'Sales', 'IT', 'HR', 
-                   'Sales', 'IT', 'HR', 'Sales', 'IT', 'HR'],
-    'Salary': np.random.randint(40000, 120000, 15),
-    'Hire Date': [(datetime.now() - timedelta(days=np.random.randint(365, 3650))).strftime('%Y-%m-%d') 
-                  for _ in range(15)],
-    'Performance Score': np.random.randint(1, 6, 15)
-}
-
-employee_df = pd.DataFrame(employee_data)
-
-# Create Excel file with multiple sheets
-with pd.ExcelWriter('sample_data/sample_input.xlsx', engine='openpyxl') as writer:
-    sales_df.to_excel(writer, sheet_name='Sales Data', index=False)
-    employee_df.to_excel(writer, sheet_name='Employee Data', index=False)
-
-print("✅ Sample input file created: sample_data/sample_input.xlsx")
-
-# Create a sample output file (with some transformations applied)
-sales_output = sales_df.copy()
-sales_output = sales_output.drop_duplicates()
-sales_output = sales_output.dropna()
-sales_output['Profit'] = sales_output['Sales'] - sales_output['Cost']
-sales_output['Profit Margin %'] = (sales_output['Profit'] / sales_output['Sales'] * 100).round(2)
-
-employee_output = employee_df.copy()
-employee_output['Full Name'] = employee_output['First Name'] + ' ' + employee_output['Last Name']
-employee_output['Years of Service'] = ((datetime.now() - pd.to_datetime(employee_output['Hire Date'])).dt.days / 365).round(1)
-
-with pd.ExcelWriter('sample_data/sample_output.xlsx', engine='openpyxl') as writer:
-    sales_output.to_excel(writer, sheet_name='Sales Data', index=False)
-    employee_output.to_excel(writer, sheet_name='Employee Data', index=False)
-
-print("✅ Sample output file created: sample_data/sample_output.xlsx")
-print("\n📊 Sample data summary:")
-print(f"Sales Data: {len(sales_df)} rows, {len(sales_df.columns)} columns")
-print(f"Employee Data: {len(employee_df)} rows, {len(employee_df.columns)} columns")
+from utils.file_handler import EXCEL_MAX_ROWS, FileHandler
+
+PRODUCTS = ['Product A', 'Product B', 'Product C', 'Product D', 'Product E']
+REGIONS = ['North', 'South', 'East', 'West']
+
+# Column kinds of the generator. 'category' draws from a fixed set of labels,
+# 'text' from about one distinct value per ten rows; 'date' gives datetime
+# cells and 'date_text' 'YYYY-MM-DD' strings.
+COLUMN_TYPES = ['int', 'float', 'bool', 'category', 'text', 'date', 'date_text']
+
+# Column specs are (name, kind) or (name, kind, options): the labels of a
+# category column or the (low, high) range of a numeric column
+SALES_COLUMNS = [
+    ('Date', 'date_text'),
+    ('Product', 'category', PRODUCTS),
+    ('Region', 'category', REGIONS),
+    ('Sales', 'float', (100, 1000)),
+    ('Cost', 'float', (50, 500)),
+    ('Quantity', 'int', (1, 50)),
+    ('Customer', 'text')
+]
+
+# Earlier rows kept around as sources for duplicates in later chunks
+DUPLICATE_POOL_ROWS = 10000
+
+
+def parse_columns(spec: str) -> List[Tuple[str, str]]:
+    """
+    Parse a column spec such as 'Date:date,Region:category,Sales:float'.
+
+    Raises:
+        ValueError: If an entry has no type or an unknown type
+    """
+    columns = []
+    for entry in spec.split(','):
+        name, _, kind = entry.strip().rpartition(':')
+        if not name or kind not in COLUMN_TYPES:
+            raise ValueError(f"Invalid column '{entry}', expected name:type with type in {COLUMN_TYPES}")
+        columns.append((name, kind))
+    return columns
+
+
+def _column_values(rng: np.random.Generator, column: Sequence, size: int, total_rows: int,
+                   cardinality: int) -> np.ndarray:
+    """Draw size values for one column spec."""
+    name, kind = column[0], column[1]
+    options = column[2] if len(column) > 2 else None
+
+    if kind == 'int':
+        low, high = options or (1, 1000)
+        return rng.integers(low, high, size)
+    if kind == 'float':
+        low, high = options or (0, 1000)
+        return np.round(rng.uniform(low, high, size), 2)
+    if kind == 'bool':
+        return rng.random(size) < 0.5
+    if kind == 'category':
+        labels = np.array(options or [f"{name} {idx + 1}" for idx in range(cardinality)], dtype=object)
+        return labels[rng.integers(0, len(labels), size)]
+    if kind == 'text':
+        ids = rng.integers(1, max(2, total_rows // 10), size)
+        return (f"{name} " + pd.Series(ids).astype(str)).to_numpy(dtype=object)
+    days = np.datetime64('2020-01-01') + rng.integers(0, 3650, size).astype('timedelta64[D]')
+    if kind == 'date':
+        return days.astype('datetime64[ns]')
+    return np.datetime_as_string(days, unit='D').astype(object)
+
+
+def _with_nulls(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Blank out the masked values, widening the array if it cannot hold a missing value."""
+    if not mask.any():
+        return values
+    if values.dtype.kind in 'ib':
+        values = values.astype(float if values.dtype.kind == 'i' else object)
+    if values.dtype.kind == 'M':
+        values[mask] = np.datetime64('NaT')
+    else:
+        values[mask] = np.nan if values.dtype.kind == 'f' else None
+    return values
+
+
+def generate_chunks(rows: int, columns: Sequence = SALES_COLUMNS, chunk_rows: int = 100000,
+                    seed: int = 42, null_ratio: float = 0.01, duplicate_ratio: float = 0.05,
+                    cardinality: int = 20) -> Iterator[pd.DataFrame]:
+    """
+    Generate a synthetic sheet as consecutive row chunks.
+
+    Only one chunk (plus a pool of at most DUPLICATE_POOL_ROWS earlier rows)
+    is in memory at a time. Values are drawn with vectorized numpy calls.
+
+    Args:
+        rows: Total number of rows
+        columns: Column specs, see SALES_COLUMNS and COLUMN_TYPES
+        chunk_rows: Rows per chunk
+        seed: Random seed, the same arguments always give the same rows
+        null_ratio: Share of missing values in every column
+        duplicate_ratio: Share of rows that repeat another row, also across chunks
+        cardinality: Number of labels of category columns without explicit labels
+
+    Yields:
+        pd.DataFrame: Chunks of at most chunk_rows rows with a continuous RangeIndex
+    """
+    rng = np.random.default_rng(seed)
+    pool = None
+    for start in range(0, rows, chunk_rows):
+        size = min(chunk_rows, rows - start)
+        chunk = pd.DataFrame({
+            column[0]: _with_nulls(_column_values(rng, column, size, rows, cardinality),
+                                   rng.random(size) < null_ratio)
+            for column in columns
+        }, index=pd.RangeIndex(start, start + size))
+
+        duplicates = rng.random(size) < duplicate_ratio
+        originals = chunk[~duplicates]
+        sources = originals if pool is None else pd.concat([pool, originals])
+        if duplicates.any() and len(sources):
+            picks = sources.take(rng.integers(0, len(sources), int(duplicates.sum())))
+            for name in chunk.columns:
+                values = chunk[name].to_numpy(copy=True)
+                values[duplicates] = picks[name].to_numpy()
+                chunk[name] = values
+        if len(sources) > DUPLICATE_POOL_ROWS:
+            sources = sources.take(rng.choice(len(sources), DUPLICATE_POOL_ROWS, replace=False))
+        pool = sources
+
+        yield chunk
+
+
+def generate_sales_data(rows: int, seed: int = 42, null_ratio: float = 0.01,
+                        duplicate_ratio: float = 0.05) -> pd.DataFrame:
+    """
+    Generate a Sales Data sheet with the columns of the sample file, in memory.
+
+    Args:
+        rows: Number of rows
+        seed: Random seed, the same arguments always give the same frame
+        null_ratio: Share of missing values in every column
+        duplicate_ratio: Share of rows that repeat another row
+
+    Returns:
+        pd.DataFrame: Date, Product, Region, Sales, Cost, Quantity and Customer
+    """
+    chunks = list(generate_chunks(rows, SALES_COLUMNS, seed=seed, null_ratio=null_ratio,
+                                  duplicate_ratio=duplicate_ratio))
+    if not chunks:
+        return pd.DataFrame(columns=[column[0] for column in SALES_COLUMNS])
+    return pd.concat(chunks)
+
+
+def generate_workbook(path: str, rows: int, sheets: int = 1, columns: Sequence = SALES_COLUMNS,
+                      chunk_rows: int = 100000, seed: int = 42, null_ratio: float = 0.01,
+                      duplicate_ratio: float = 0.05, cardinality: int = 20):
+    """
+    Write a synthetic workbook of identically shaped sheets to path.
+
+    Sheets are generated and written chunk by chunk (see generate_chunks and
+    FileHandler.write_excel), so multi-GB workbooks need no more memory than
+    one chunk. Each sheet uses its own seed, so sheets differ.
+
+    Args:
+        path: Output .xlsx path
+        rows: Rows per sheet
+        sheets: Number of sheets
+        (other arguments as in generate_chunks)
+
+    Raises:
+        ValueError: If rows does not fit on an .xlsx sheet
+    """
+    if rows > EXCEL_MAX_ROWS:
+        raise ValueError(f"A sheet holds at most {EXCEL_MAX_ROWS} rows, use more sheets instead")
+
+    FileHandler().write_excel({
+        f"Sheet{idx + 1}": generate_chunks(rows, columns, chunk_rows, seed + idx, null_ratio,
+                                           duplicate_ratio, cardinality)
+        for idx in range(sheets)
+    }, path)
+
+
+def create_sample_files():
+    """Write sample_data/sample_input.xlsx and sample_data/sample_output.xlsx."""
+    # Create sample input data
+    np.random.seed(42)
+
+    # Sample 1: Sales Data
+    sales_data = {
+        'Date': [(datetime.now() - timedelta(days=x)).strftime('%Y-%m-%d') for x in range(20)],
+        'Product': ['Product A', 'Product B', 'Product C', 'Product A', 'Product B'] * 4,
+        'Region': ['North', 'South', 'East', 'West', 'North'] * 4,
+        'Sales': np.random.randint(100, 1000, 20),
+        'Cost': np.random.randint(50, 500, 20),
+        'Quantity': np.random.randint(1, 50, 20),
+        'Customer': [f'Customer {i}' for i in range(1, 21)]
+    }
+
+    # Add some duplicates and missing values
+    sales_df = pd.DataFrame(sales_data)
+    sales_df.loc[5, 'Sales'] = np.nan
+    sales_df.loc[10, 'Cost'] = np.nan
+    sales_df = pd.concat([sales_df, sales_df.iloc[[0, 1, 2]]], ignore_index=True)
+
+    # Sample 2: Employee Data
+    employee_data = {
+        'Employee ID': [f'EMP{str(i).zfill(3)}' for i in range(1, 16)],
+        'First Name': ['John', 'Jane', 'Bob', 'Alice', 'Charlie', 'Diana', 'Eve', 'Frank', 
+                       'Grace', 'Henry', 'Ivy', 'Jack', 'Kate', 'Leo', 'Mia'],
+        'Last Name': ['Doe', 'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 
+                      'Miller', 'Davis', 'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 
+                      'Gonzalez', 'Wilson'],
+        'Department': ['Sales', 'IT', 'HR', 'Sales', 'IT', 'HR', 'Sales', 'IT', 'HR', 
+                       'Sales', 'IT', 'HR', 'Sales', 'IT', 'HR'],
+        'Salary': np.random.randint(40000, 120000, 15),
+        'Hire Date': [(datetime.now() - timedelta(days=np.random.randint(365, 3650))).strftime('%Y-%m-%d') 
+                      for _ in range(15)],
+        'Performance Score': np.random.randint(1, 6, 15)
+    }
+
+    employee_df = pd.DataFrame(employee_data)
+
+    # Create Excel file with multiple sheets
+    with pd.ExcelWriter('sample_data/sample_input.xlsx', engine='openpyxl') as writer:
+        sales_df.to_excel(writer, sheet_name='Sales Data', index=False)
+        employee_df.to_excel(writer, sheet_name='Employee Data', index=False)
+
+    print("✅ Sample input file created: sample_data/sample_input.xlsx")
+
+    # Create a sample output file (with some transformations applied)
+    sales_output = sales_df.copy()
+    sales_output = sales_output.drop_duplicates()
+    sales_output = sales_output.dropna()
+    sales_output['Profit'] = sales_output['Sales'] - sales_output['Cost']
+    sales_output['Profit Margin %'] = (sales_output['Profit'] / sales_output['Sales'] * 100).round(2)
+
+    employee_output = employee_df.copy()
+    employee_output['Full Name'] = employee_output['First Name'] + ' ' + employee_output['Last Name']
+    employee_output['Years of Service'] = ((datetime.now() - pd.to_datetime(employee_output['Hire Date'])).dt.days / 365).round(1)
+
+    with pd.ExcelWriter('sample_data/sample_output.xlsx', engine='openpyxl') as writer:
+        sales_output.to_excel(writer, sheet_name='Sales Data', index=False)
+        employee_output.to_excel(writer, sheet_name='Employee Data', index=False)
+
+    print("✅ Sample output file created: sample_data/sample_output.xlsx")
+    print("\n📊 Sample data summary:")
+    print(f"Sales Data: {len(sales_df)} rows, {len(sales_df.columns)} columns")
+    print(f"Employee Data: {len(employee_df)} rows, {len(employee_df.columns)} columns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create sample or synthetic Excel files")
+    parser.add_argument('--rows', type=int, help="Rows per sheet of a synthetic workbook "
+                        "(without it the sample_data/ files are written)")
+    parser.add_argument('--sheets', type=int, default=1, help="Number of sheets")
+    parser.add_argument('--columns', type=parse_columns,
+                        help=f"Columns as name:type pairs, types: {', '.join(COLUMN_TYPES)} "
+                             "(default: the Sales Data columns)")
+    parser.add_argument('--null-ratio', type=float, default=0.01, help="Share of missing values")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.05, help="Share of duplicate rows")
+    parser.add_argument('--cardinality', type=int, default=20, help="Labels per category column")
+    parser.add_argument('--chunk-rows', type=int, default=100000, help="Rows generated at a time")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed")
+    parser.add_argument('--output', default='sample_data/synthetic.xlsx', help="Output file")
+    args = parser.parse_args()
+
+    if args.rows is None:
+        create_sample_files()
+        return
+
+    generate_workbook(args.output, args.rows, sheets=args.sheets, columns=args.columns or SALES_COLUMNS,
+                      chunk_rows=args.chunk_rows, seed=args.seed, null_ratio=args.null_ratio,
+                      duplicate_ratio=args.duplicate_ratio, cardinality=args.cardinality)
+    print(f"✅ Synthetic workbook created: {args.output} ({args.sheets} sheet(s) of {args.rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
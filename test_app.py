@@ -3,11 +3,30 @@ Test script to verify all components work correctly.
 Run this before starting the application.
 """
 
+import io
+import os
 import sys
+import tempfile
+import threading
+import numpy as np
 import pandas as pd
-from utils.file_handler import FileHandler
+from utils.file_handler import EXCEL_MAX_ROWS, FileHandler
 from utils.data_transformer import DataTransformer
 from utils.template_manager import TemplateManager
+from utils.query_planner import QueryPlanner
+from utils.executor import ParallelExecutor, run_sheet, stream_sheet
+from utils.workbook_cache import WorkbookCache
+from utils.result_cache import OperationCache, frame_fingerprint
+from utils.lazy_workbook import LazySheet
+from utils.sampling import sample_frame, preview_sheet
+from utils.job_manager import Job, JobManager
+from utils.profiler import OperationMetrics
+from utils.memory import PeakMemoryTracker
+from utils.dedup_engine import DedupEngine
+from utils.dtype_optimizer import DtypeOptimizer
+from utils.merge_engine import JoinIndexCache
+from utils.formula_engine import FormulaError
+from create_sample_data import generate_chunks, generate_workbook, parse_columns
 
 def test_file_handler():
     """Test FileHandler functionality."""
@@ -36,7 +55,83 @@ def test_file_handler():
         
         for sheet_name, df in dataframes.items():
             print(f"  ✅ Sheet '{sheet_name}': {len(df)} rows, {len(df.columns)} columns")
-    
+
+        # Test streaming chunks match a full load
+        with open('sample_data/sample_input.xlsx', 'rb') as f:
+            chunks = list(handler.iter_excel_chunks(f, 'Sales Data', chunk_size=10))
+        assert [len(chunk) for chunk in chunks] == [10, 10, 3], "Incorrect chunk sizes"
+        pd.testing.assert_frame_equal(pd.concat(chunks), dataframes['Sales Data'])
+        print("  ✅ Streaming chunks work")
+
+        # Test streaming export round trip (whole frame and chunks)
+        sales_df = dataframes['Sales Data']
+        output = handler.export_excel({'Whole': sales_df, 'Chunked': iter(chunks)}, batch_size=7)
+        exported = pd.read_excel(output, sheet_name=None)
+        pd.testing.assert_frame_equal(exported['Whole'], sales_df)
+        pd.testing.assert_frame_equal(exported['Chunked'], sales_df)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            oversized = iter([sales_df.iloc[:1], pd.DataFrame({'A': np.zeros(EXCEL_MAX_ROWS, dtype=np.int8)})])
+            try:
+                handler.write_excel({'Big': oversized}, f"{tmp_dir}/big.xlsx")
+                raise AssertionError("Sheet beyond the Excel row limit was written")
+            except ValueError:
+                pass
+        print("  ✅ Streaming export works")
+
+        # Test dtype optimization on load
+        with open('sample_data/sample_input.xlsx', 'rb') as f:
+            optimized = handler.load_excel(f, optimize_dtypes=True)
+        sheet_info = handler.get_file_info(optimized)['sheets']['Sales Data']
+        assert sheet_info['memory_bytes'] < sheet_info['memory_bytes_before'], "No memory saved"
+        assert isinstance(optimized['Sales Data']['Region'].dtype, pd.CategoricalDtype), "Region not categorical"
+        pd.testing.assert_frame_equal(optimized['Sales Data'].astype(object).where(optimized['Sales Data'].notna()),
+                                      sales_df.astype(object).where(sales_df.notna()), check_dtype=False)
+        print(f"  ✅ Dtype optimization works ({sheet_info['memory_bytes_before']} -> "
+              f"{sheet_info['memory_bytes']} bytes)")
+
+        # Test lazy loading parses only the sheets that are used
+        class Upload(io.BytesIO):
+            name = 'sample_input.xlsx'
+
+        with open('sample_data/sample_input.xlsx', 'rb') as f:
+            workbook = handler.open_excel(Upload(f.read()))
+        assert list(workbook) == list(dataframes), "Sheet names differ"
+        assert workbook.loaded_sheets == [], "Sheets parsed on open"
+        pd.testing.assert_frame_equal(workbook['Sales Data'], sales_df)
+        assert workbook.loaded_sheets == ['Sales Data'], "Unused sheet was parsed"
+        output = handler.export_excel({'Employee Data': workbook.sheet('Employee Data')})
+        exported = pd.read_excel(output, sheet_name=None)
+        pd.testing.assert_frame_equal(exported['Employee Data'], dataframes['Employee Data'])
+        assert workbook.loaded_sheets == ['Sales Data'], "Untouched sheet was parsed on export"
+        print("  ✅ Lazy sheet loading works")
+
+        # Test the metadata probe matches a full load without parsing every row
+        with open('sample_data/sample_input.xlsx', 'rb') as f:
+            metadata = handler.probe_excel(Upload(f.read()), sample_rows=5)
+        sales_meta = metadata['Sales Data']
+        assert list(metadata) == list(dataframes), "Probed sheet names differ"
+        assert sales_meta['rows'] == len(sales_df) and len(sales_meta['sample']) == 5, "Incorrect probe dimensions"
+        assert sales_meta['column_names'] == sales_df.columns.tolist(), "Incorrect probed headers"
+        assert 'Quantity' in sales_meta['numeric_columns'] and 'Region' in sales_meta['text_columns'], \
+            "Incorrect probed dtypes"
+        print("  ✅ Metadata probe works")
+
+        # Test the synthetic generator writes chunked workbooks to disk
+        columns = parse_columns('Day:date,Region:category,Units:int,Note:text')
+        generated = pd.concat(generate_chunks(500, columns, chunk_rows=120, null_ratio=0.1,
+                                              duplicate_ratio=0.2, cardinality=3))
+        assert len(generated) == 500 and generated.index.is_monotonic_increasing, "Incorrect generated rows"
+        assert generated['Region'].nunique() == 3, "Cardinality not respected"
+        assert 0 < generated['Units'].isna().mean() < 0.25, "Null ratio not respected"
+        assert generated.duplicated().sum() > 50, "Too few duplicates"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = f"{tmp_dir}/synthetic.xlsx"
+            generate_workbook(path, 300, sheets=2, columns=columns, chunk_rows=100)
+            written = pd.read_excel(path, sheet_name=None)
+        assert list(written) == ['Sheet1', 'Sheet2'], "Incorrect generated sheets"
+        assert all(len(sheet) == 300 for sheet in written.values()), "Incorrect generated sheet size"
+        print("  ✅ Synthetic workbook generator works")
+
     except Exception as e:
         print(f"  ❌ Error: {str(e)}")
         return False
@@ -77,6 +172,20 @@ def test_data_transformer():
         }
         result = transformer.apply_operation(df, operation)
         assert result['C'].iloc[0] == 'A', "Text operation failed"
+        names = pd.DataFrame({'N': [' Ann-12 ', None, 7, ' Bob ']})
+        result = transformer.apply_operation(names, {'type': 'Text Operations', 'operation': 'Trim Spaces',
+                                                     'column': 'N'})
+        assert result['N'].tolist()[0] == 'Ann-12' and result['N'].isna().tolist() == [False, True, False, False], \
+            "Missing values must stay missing"
+        result = transformer.apply_operation(names, {'type': 'Text Operations', 'operation': 'Extract Pattern',
+                                                     'column': 'N', 'pattern': r'-(\d+)', 'result_column': 'Id'})
+        assert result['Id'].tolist()[0] == '12' and result['Id'].isna().sum() == 3, "Extract Pattern failed"
+        flagged = {'type': 'Text Operations', 'operation': 'Extract Pattern', 'column': 'N',
+                   'pattern': r'(?i)ann-\d+', 'result_column': 'Id'}
+        for column in (names['N'], names['N'].astype('string')):
+            result = transformer.apply_operation(pd.DataFrame({'N': column}), flagged)
+            assert result['Id'].tolist()[0] == 'Ann-12' and result['Id'].isna().sum() == 3, \
+                "Extract Pattern with inline flags failed"
         print("  ✅ Text operations work")
         
         # Test filtering
@@ -90,13 +199,541 @@ def test_data_transformer():
         result = transformer.apply_operation(df, operation)
         assert len(result) == 3, "Filtering failed"
         print("  ✅ Filtering works")
-        
+
+        # Test compound and type-stable filtering
+        operation = {
+            'type': 'Filtering',
+            'operation': 'Filter Rows',
+            'conditions': [
+                {'column': 'A', 'operator': '<', 'value': '2'},
+                {'column': 'C', 'operator': 'contains', 'value': '[de]'}
+            ],
+            'logic': 'OR'
+        }
+        result = transformer.apply_operation(df, operation)
+        assert result['A'].tolist() == [1, 4, 5], "Compound filtering failed"
+        mixed = pd.DataFrame({'V': ['North', 5, None, '5']})
+        result = transformer.apply_operation(mixed, {'type': 'Filtering', 'column': 'V', 'operator': '==', 'value': '5'})
+        assert result.index.tolist() == [1, 3], "Mixed-type filtering failed"
+        result = transformer.apply_operation(mixed, {'type': 'Filtering', 'column': 'V', 'operator': '!=', 'value': '5'})
+        assert result.index.tolist() == [0, 2], "Mixed-type != filtering failed"
+        categorical = pd.DataFrame({'V': pd.Categorical(['x', 'y', None, 'x'])})
+        result = transformer.apply_operation(categorical, {'type': 'Filtering', 'column': 'V', 'operator': '!=', 'value': 'x'})
+        assert result.index.tolist() == [1, 2], "Categorical filtering failed"
+        unique_text = pd.DataFrame({'V': pd.array([f'id {i}' for i in range(3000)] + [None], dtype='string')})
+        contains = {'type': 'Filtering', 'column': 'V', 'operator': 'contains', 'value': '99$'}
+        assert len(transformer.apply_operation(unique_text, contains)) == 30, "String column contains failed"
+        assert len(transformer.apply_operation(unique_text, {**contains, 'operator': 'not contains'})) == 2971, \
+            "String column not contains failed"
+        print("  ✅ Compound filtering works")
+
+        # Test operation chain (single copy, input untouched)
+        chain = [
+            {'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'A', 'operator': '>', 'value': '1'},
+            {'type': 'Text Operations', 'operation': 'Uppercase', 'column': 'C'},
+            {'type': 'Mathematical Operations', 'operation': 'Add Columns',
+             'col1': 'A', 'col2': 'B', 'result_column': 'Sum'}
+        ]
+        result = transformer.apply_operations(df, chain, track_memory=True)
+        assert len(result) == 4 and result['C'].iloc[0] == 'B', "Operation chain failed"
+        assert 'Sum' not in df.columns and df['C'].iloc[1] == 'b', "Operation chain modified its input"
+        assert transformer.last_run_stats['copies'] == 0, "Filtered chain should not copy"
+        assert transformer.last_run_stats['peak_memory_bytes'] is not None, "Peak memory not reported"
+        print("  ✅ Operation chains work")
+
+        # Test per-operation profiling
+        result = transformer.apply_operations(df, chain, track_memory=True, profile=True)
+        records = transformer.last_run_stats['profile']
+        assert [r['operation'] for r in records] == ['Filter Rows', 'Uppercase', 'Add Columns'], "Profile incomplete"
+        assert records[0]['rows_in'] == 5 and records[0]['rows_out'] == 4, "Rows not profiled"
+        assert all(r['seconds'] is not None and r['output_bytes'] > 0 for r in records), "Measurements missing"
+        assert transformer.last_run_stats['peak_memory_bytes'] >= max(r['peak_memory_bytes'] for r in records), \
+            "Nested memory tracking lost the run peak"
+        entered, second_entered, first_done = threading.Event(), threading.Event(), threading.Event()
+        def first_tracker():
+            with PeakMemoryTracker():
+                entered.set()
+                second_entered.wait()
+            first_done.set()
+        thread = threading.Thread(target=first_tracker)
+        thread.start()
+        entered.wait()
+        with PeakMemoryTracker() as second:
+            second_entered.set()
+            first_done.wait()
+            block = np.ones(20 * 1024 * 1024, dtype=np.uint8)
+            del block
+        thread.join()
+        assert second.peak_bytes >= 20 * 1024 * 1024, "Concurrent tracker stopped memory tracing"
+        metrics = OperationMetrics()
+        metrics.record(records)
+        rendered = metrics.render()
+        assert 'excel_tool_operation_runs_total{type="Filtering",operation="Filter Rows"} 1' in rendered, \
+            "OpenMetrics counters missing"
+        assert rendered.endswith("# EOF\n"), "OpenMetrics output not terminated"
+        print("  ✅ Per-operation profiling works")
+
+        # Test chunked execution matches a full run
+        dup_df = pd.concat([df, df], ignore_index=True)
+        chain = [
+            {'type': 'Data Cleaning', 'operation': 'Remove Duplicates', 'columns': ['A'], 'keep': 'first'},
+            {'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'B', 'operator': '>=', 'value': '20'}
+        ]
+        chunks = [dup_df.iloc[i:i + 3] for i in range(0, len(dup_df), 3)]
+        result = pd.concat(transformer.apply_operations_chunked(chunks, chain))
+        pd.testing.assert_frame_equal(result, transformer.apply_operations(dup_df, chain))
+        sorted_df = pd.DataFrame({'A': range(20), 'C': [f'r{i}' for i in range(20)]})
+        chain = [
+            {'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'A', 'operator': '>', 'value': '15'},
+            {'type': 'Column Operations', 'operation': 'Merge Columns', 'columns': ['A', 'C'],
+             'separator': ' ', 'new_column': 'M'}
+        ]
+        chunks = [sorted_df.iloc[i:i + 5] for i in range(0, len(sorted_df), 5)]
+        result = pd.concat(transformer.apply_operations_chunked(chunks, chain))
+        pd.testing.assert_frame_equal(result, transformer.apply_operations(sorted_df, chain))
+        print("  ✅ Chunked operations work")
+
+        # Test operations needing the whole column pre-scan a re-openable stream
+        gaps = pd.DataFrame({'A': [1.0, None, 3.0, 1.0, None, 8.0, None], 'K': list('xyxyxzz'), 'E': None})
+        chain = [
+            {'type': 'Data Cleaning', 'operation': 'Remove Duplicates', 'columns': ['K'], 'keep': 'last'},
+            {'type': 'Data Cleaning', 'operation': 'Fill Missing Values', 'column': 'A', 'method': 'Median'},
+            {'type': 'Data Cleaning', 'operation': 'Remove Empty Columns'}
+        ]
+        open_chunks = lambda: (gaps.iloc[i:i + 2] for i in range(0, len(gaps), 2))
+        result = pd.concat(transformer.apply_operations_chunked(open_chunks, chain))
+        assert transformer.last_run_stats['passes'] == 4, "Expected one pre-scan per global operation"
+        pd.testing.assert_frame_equal(result, transformer.apply_operations(gaps, chain))
+        backfill = {'type': 'Data Cleaning', 'operation': 'Fill Missing Values', 'column': 'A',
+                    'method': 'Backward Fill'}
+        result = pd.concat(transformer.apply_operations_chunked(open_chunks(), [backfill]))
+        assert result['A'].tolist()[:6] == [1.0, 3.0, 3.0, 1.0, 8.0, 8.0], "Backward fill across chunks failed"
+        try:
+            list(transformer.apply_operations_chunked(open_chunks(), chain))
+            raise AssertionError("A one-shot stream cannot be pre-scanned")
+        except ValueError:
+            pass
+        print("  ✅ Chunked global operations pre-scan the stream")
+
+        # Test date parsing: mixed text formats, Excel serials and one parse per column
+        dates = pd.DataFrame({'D': ['2024-01-05', '25/02/2024', '03/04/2024', None, 45000, 'n/a']})
+        date_ops = [{'type': 'Date Operations', 'operation': op, 'column': 'D', 'result_column': op[8:]}
+                    for op in ('Extract Year', 'Extract Month', 'Extract Day')]
+        result = transformer.apply_operations(dates, date_ops)
+        assert result['Month'].tolist()[:3] == [1, 2, 4], "Day-first dates misread"
+        assert result['Year'].tolist()[4] == 2023, "Excel serial date not converted"
+        assert result['Day'].isna().tolist() == [False, False, False, True, False, True], "Missing dates wrong"
+        assert len(transformer.date_parser.formats['D']) == 2, "Formats not cached per column"
+        formatted = transformer.apply_operation(dates, {'type': 'Date Operations', 'operation': 'Format Date',
+                                                        'column': 'D', 'output_format': '%d.%m.%Y'})
+        assert formatted['D'].tolist()[:2] == ['05.01.2024', '25.02.2024'], "Format Date failed"
+        result = pd.concat(transformer.apply_operations_chunked([dates.iloc[:3], dates.iloc[3:]], date_ops))
+        pd.testing.assert_frame_equal(result, transformer.apply_operations(dates, date_ops))
+        print("  ✅ Date parsing works")
+
+        # Test hash-based duplicate removal matches drop_duplicates and reports removed rows
+        mixed = pd.DataFrame({'K': [1, '1', 1.0, None, None, 'x', 'x'],
+                              'N': pd.array([1, 1, 1, None, None, 2, 2], dtype='Int64')})
+        for keep in ('first', 'last', False):
+            for columns in (None, ['K']):
+                op = {'type': 'Data Cleaning', 'operation': 'Remove Duplicates', 'columns': columns, 'keep': keep}
+                result = transformer.apply_operations(mixed, [op])
+                pd.testing.assert_frame_equal(result, mixed.drop_duplicates(subset=columns, keep=keep))
+                assert transformer.last_run_stats['duplicates_removed'] == len(mixed) - len(result), \
+                    "Removed duplicates not reported"
+        assert transformer.last_run_stats['copies'] == 0, "Duplicate removal should not copy"
+        engine = DedupEngine()
+        compact = mixed.astype({'K': 'category', 'N': 'float64'})
+        assert (engine.fingerprints(compact) == engine.fingerprints(mixed)).all(), "Dtype changed fingerprints"
+        large = pd.DataFrame({'B': [2 ** 53, 2 ** 53 + 1, 2 ** 53 + 1, 2 ** 63 - 1],
+                              'E': pd.Categorical([None] * 4)})
+        for columns in (['B'], ['E']):
+            op = {'type': 'Data Cleaning', 'operation': 'Remove Duplicates', 'columns': columns}
+            pd.testing.assert_frame_equal(transformer.apply_operations(large, [op]),
+                                          large.drop_duplicates(subset=columns))
+        frames, removed = engine.drop_duplicates_across([dup_df.iloc[:6], dup_df.iloc[6:]], ['A'])
+        assert removed == [1, 4] and len(frames[1]) == 0, "Cross-frame dedup failed"
+        print("  ✅ Hash-based duplicate removal works")
+
+        # Test incremental re-runs reuse the cached prefix of a chain
+        cache = OperationCache()
+        chain = [
+            {'type': 'Text Operations', 'operation': 'Uppercase', 'column': 'C'},
+            {'type': 'Mathematical Operations', 'operation': 'Add Columns',
+             'col1': 'A', 'col2': 'B', 'result_column': 'Sum'}
+        ]
+        key = frame_fingerprint(df)
+        first = transformer.apply_operations(df, chain, cache=cache, input_key=key)
+        chain.append({'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'Sum', 'operator': '>', 'value': '30'})
+        result = transformer.apply_operations(df, chain, cache=cache, input_key=key)
+        assert transformer.last_run_stats['cached_operations'] == 2, "Cached prefix not reused"
+        pd.testing.assert_frame_equal(result, transformer.apply_operations(df, chain))
+        assert len(first) == 5 and first['C'].iloc[0] == 'A', "Cached result was modified"
+        print("  ✅ Incremental re-runs work")
+
+        # Test operations on compact dtypes do not overflow or reject values
+        small = pd.DataFrame({'A': pd.Series([100, 120], dtype='int8'),
+                              'B': pd.Series([100, None], dtype='Int16'),
+                              'R': pd.Series(['x', None], dtype='category')})
+        chain = [
+            {'type': 'Mathematical Operations', 'operation': 'Multiply Columns',
+             'col1': 'A', 'col2': 'A', 'result_column': 'Square'},
+            {'type': 'Mathematical Operations', 'operation': 'Conditional Calculation',
+             'condition_col': 'B', 'operator': '>', 'threshold': 50,
+             'true_value': 'High', 'false_value': 'Low', 'result_column': 'Level'},
+            {'type': 'Data Cleaning', 'operation': 'Fill Missing Values', 'column': 'B', 'method': 'Mean'},
+            {'type': 'Data Cleaning', 'operation': 'Fill Missing Values', 'column': 'R',
+             'method': 'Custom Value', 'value': 'Unknown'}
+        ]
+        result = transformer.apply_operations(small, chain)
+        assert result['Square'].tolist() == [10000, 14400], "Downcast integers overflowed"
+        assert result['Level'].tolist() == ['High', 'Low'], "Missing values broke the condition"
+        assert result['R'].tolist() == ['x', 'Unknown'], "Categorical fill failed"
+        print("  ✅ Compact dtypes work")
+
+        # Test formulas: several outputs, later ones using earlier results
+        formula = {'type': 'Mathematical Operations', 'operation': 'Formula', 'formulas': [
+            {'column': 'Margin', 'expression': '(B - A) / B * 100'},
+            {'column': 'Level', 'expression': 'if(Margin >= 90 and C <> "e", "High", "Low")'},
+            {'column': 'Twice', 'expression': 'round([Margin] * 2, 1)'}
+        ]}
+        result = transformer.apply_operations(df, [formula])
+        assert result['Margin'].tolist() == [90.0] * 5, "Formula arithmetic wrong"
+        assert result['Level'].tolist() == ['High'] * 4 + ['Low'], "Formula condition wrong"
+        assert result['Twice'].tolist() == [180.0] * 5, "Formula could not use an earlier result"
+        for bad in ('Missing + 1', 'C * 2', 'foo(A)'):
+            try:
+                transformer.apply_operation(df, {**formula, 'formulas': [{'column': 'X', 'expression': bad}]})
+                assert False, f"Invalid formula '{bad}' accepted"
+            except FormulaError:
+                pass
+        print("  ✅ Formulas work")
+
+        # Test group-by and pivot, whole and streamed in chunks
+        sales = pd.DataFrame({'Region': pd.Categorical(['N', 'S', 'N', None, 'S', 'N']),
+                              'Product': ['a', 'b', 'a', 'a', 'b', 'c'],
+                              'Sales': [1.0, 2.0, 3.0, 4.0, None, 6.0]})
+        group_by = {'type': 'Aggregation', 'operation': 'Group By', 'keys': ['Region'],
+                    'aggregations': [{'column': 'Sales', 'function': 'sum'},
+                                     {'column': 'Sales', 'function': 'mean'}, {'function': 'rows'}]}
+        result = transformer.apply_operations(sales, [group_by])
+        assert result['Sum of Sales'].tolist() == [10.0, 2.0, 4.0], "Group sums wrong (missing key last)"
+        assert result['Rows'].tolist() == [3, 2, 1], "Group row counts wrong"
+        chunks = [sales.iloc[i:i + 2] for i in range(0, len(sales), 2)]
+        pd.testing.assert_frame_equal(pd.concat(transformer.apply_operations_chunked(chunks, [group_by])), result)
+        ids, _ = DtypeOptimizer().optimize(pd.DataFrame({'Id': [1.0, 2.0, None, 1.0], 'Sales': [1.0, 2.0, 3.0, 4.0]}))
+        result = transformer.apply_operations(ids, [{**group_by, 'keys': ['Id']}])
+        assert result['Sum of Sales'].tolist() == [5.0, 2.0, 3.0], "Nullable integer key with blanks not grouped"
+        pivot_op = {'type': 'Aggregation', 'operation': 'Pivot Table', 'index': ['Product'],
+                    'pivot_column': 'Region', 'aggregations': [{'column': 'Sales', 'function': 'sum'}],
+                    'fill_value': 0}
+        result = transformer.apply_operations(sales, [pivot_op])
+        assert list(result.columns) == ['Product', 'N', 'S', '(blank)'], "Pivot columns wrong"
+        assert result['N'].tolist() == [4.0, 0.0, 6.0], "Pivot values wrong"
+        print("  ✅ Group-by and pivot work")
+
+        # Test merge operations against other sheets
+        regions = pd.DataFrame({'Code': ['a', 'b', 'b', None], 'Region': ['North', 'South', 'West', 'East']})
+        index_cache = JoinIndexCache()
+        merger = DataTransformer(sources={('ref.xlsx', 'Regions'): regions}, index_cache=index_cache)
+        source = {'file': 'ref.xlsx', 'sheet': 'Regions'}
+        lookup = {'type': 'Merge Operations', 'operation': 'Lookup Values', 'source': source,
+                  'left_on': ['C'], 'right_on': ['Code'], 'columns': ['Region']}
+        result = merger.apply_operations(df, [lookup])
+        assert result['Region'].tolist()[:2] == ['North', 'South'], "Lookup did not use the first match"
+        assert result['Region'].iloc[2:].isna().all(), "Unmatched rows should be empty"
+        assert 'Region' not in df.columns, "Lookup modified its input"
+        join = {'type': 'Merge Operations', 'operation': 'Join Sheet', 'source': source,
+                'left_on': ['C'], 'right_on': ['Code'], 'how': 'inner'}
+        result = merger.apply_operations(df, [join])
+        assert result['C'].tolist() == ['a', 'b', 'b'], "Inner join rows wrong"
+        assert result['Region'].tolist() == ['North', 'South', 'West'], "One-to-many join lost rows"
+        assert len(merger.apply_operations(df, [{**join, 'how': 'left'}])) == 6, "Left join dropped rows"
+        assert index_cache.builds == 1, "Join index was not reused"
+        stack = {'type': 'Merge Operations', 'operation': 'Stack Sheets', 'file': 'in.xlsx', 'sheet': 'S',
+                 'sources': [{'file': 'ref.xlsx', 'sheet': 'Regions'}], 'source_column': 'From'}
+        result = merger.apply_operations(df, [stack])
+        assert len(result) == 9 and result['From'].tolist()[-1] == 'ref.xlsx', "Sheets not stacked"
+        print("  ✅ Lookup, join and stack across sheets work")
+
     except Exception as e:
         print(f"  ❌ Error: {str(e)}")
         return False
     
     return True
 
+def test_query_planner():
+    """Test QueryPlanner functionality."""
+    print("\nTesting QueryPlanner...")
+    planner = QueryPlanner()
+    transformer = DataTransformer()
+
+    df = pd.DataFrame({
+        'A': [1, 2, 3, 4, 5],
+        'B': [10, 20, 30, 40, 50],
+        'C': ['a', 'b', 'c', 'd', 'e']
+    })
+
+    try:
+        operations = [
+            {'type': 'Text Operations', 'operation': 'Uppercase', 'column': 'C'},
+            {'type': 'Mathematical Operations', 'operation': 'Multiply Columns',
+             'col1': 'A', 'col2': 'B', 'result_column': 'Tmp'},
+            {'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'A', 'operator': '>', 'value': '1'},
+            {'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'B', 'operator': '<', 'value': '50'},
+            {'type': 'Column Operations', 'operation': 'Delete Column', 'columns': ['Tmp']}
+        ]
+        plan = planner.plan(operations)
+        assert plan[0]['type'] == 'Filtering' and len(plan[0]['conditions']) == 2, "Filters not pushed down and fused"
+        assert all(op.get('result_column') != 'Tmp' for op in plan), "Dead column not removed"
+        print("  ✅ Plan rewriting works")
+
+        pd.testing.assert_frame_equal(transformer.apply_operations(df, plan),
+                                      transformer.apply_operations(df, operations))
+        print("  ✅ Optimized plan gives the same result")
+
+        assert "Execution plan:" in planner.explain(operations), "Dry run output missing"
+        print("  ✅ Dry run works")
+
+        text_ops = [
+            {'type': 'Text Operations', 'operation': 'Trim Spaces', 'column': 'C'},
+            {'type': 'Mathematical Operations', 'operation': 'Add Columns', 'col1': 'A', 'col2': 'B',
+             'result_column': 'Sum'},
+            {'type': 'Text Operations', 'operation': 'Uppercase', 'column': 'C'}
+        ]
+        plan = planner.plan(text_ops)
+        assert len(plan) == 2 and len(plan[0]['steps']) == 2, "Text operations on one column not fused"
+        pd.testing.assert_frame_equal(transformer.apply_operations(df, plan),
+                                      transformer.apply_operations(df, text_ops))
+        print("  ✅ Text operations on one column are fused")
+
+    except Exception as e:
+        print(f"  ❌ Error: {str(e)}")
+        return False
+
+    return True
+
+def test_parallel_executor():
+    """Test ParallelExecutor functionality."""
+    print("\nTesting ParallelExecutor...")
+
+    df = pd.DataFrame({
+        'A': [1, 2, 3, 4, 5],
+        'B': [10, 20, 30, 40, 50]
+    })
+    dataframes = {'one.xlsx': {'S1': df, 'S2': df}, 'two.xlsx': {'S1': df}}
+    operations = [
+        {'file': 'one.xlsx', 'sheet': 'S1', 'type': 'Filtering', 'operation': 'Filter Rows',
+         'column': 'A', 'operator': '>', 'value': '3'},
+        {'file': 'one.xlsx', 'sheet': 'S2', 'type': 'Mathematical Operations', 'operation': 'Add Columns',
+         'col1': 'A', 'col2': 'Missing', 'result_column': 'Sum'}
+    ]
+
+    try:
+        for use_processes in (False, True):
+            progress = []
+            executor = ParallelExecutor(max_workers=2, use_processes=use_processes)
+            results = executor.run(dataframes, operations,
+                                   progress_callback=lambda done, total, result: progress.append(done))
+            assert len(results[('one.xlsx', 'S1')]['dataframe']) == 2, "Sheet not processed"
+            assert results[('one.xlsx', 'S2')]['status'] == 'failed', "Failure not reported"
+            assert results[('two.xlsx', 'S1')]['dataframe'] is df, "Untouched sheet was copied"
+            assert progress == [1, 2], "Progress not reported per sheet"
+        print("  ✅ Parallel execution works (threads and processes)")
+
+        with open('sample_data/sample_input.xlsx', 'rb') as f:
+            upload = io.BytesIO(f.read())
+        upload.name = 'sample_input.xlsx'
+        workbook = FileHandler().open_excel(upload)
+        lazy_ops = [{'file': 'sample_input.xlsx', 'sheet': 'Sales Data', 'type': 'Filtering',
+                     'operation': 'Filter Rows', 'column': 'Sales', 'operator': '>', 'value': '500'}]
+        results = ParallelExecutor(max_workers=2).run({'sample_input.xlsx': workbook}, lazy_ops)
+        untouched = results[('sample_input.xlsx', 'Employee Data')]['dataframe']
+        assert isinstance(untouched, LazySheet) and not untouched.is_loaded, "Untouched lazy sheet was loaded"
+        assert workbook.loaded_sheets == ['Sales Data'], "Only sheets with operations should load"
+        print("  ✅ Lazy sheets without operations are not loaded")
+
+        # Out-of-core mode: the sheet is re-read from disk per pass and written as it streams
+        stream_ops = [{'type': 'Data Cleaning', 'operation': 'Fill Missing Values', 'column': 'Sales',
+                       'method': 'Mean'}] + lazy_ops
+        with tempfile.TemporaryDirectory() as tmp:
+            def open_chunks():
+                with open('sample_data/sample_input.xlsx', 'rb') as f:
+                    yield from FileHandler().iter_excel_chunks(f, 'Sales Data', chunk_size=7)
+            chunks, transformer = stream_sheet(open_chunks, stream_ops)
+            FileHandler().write_excel({'Sales Data': chunks}, os.path.join(tmp, 'out.xlsx'))
+            written = pd.read_excel(os.path.join(tmp, 'out.xlsx'))
+        expected = run_sheet(workbook['Sales Data'], stream_ops)['dataframe']
+        assert written['Sales'].tolist() == expected['Sales'].tolist(), "Streamed sheet differs"
+        assert transformer.last_run_stats['rows_out'] == len(expected), "Streaming stats missing"
+        print("  ✅ Sheets stream from disk through the chain")
+
+        dedup_ops = [{'file': file_name, 'sheet': 'S1', 'type': 'Data Cleaning', 'operation': 'Remove Duplicates',
+                      'columns': ['A'], 'keep': 'first', 'across_files': True}
+                     for file_name in ('one.xlsx', 'two.xlsx')]
+        overlap = {'one.xlsx': {'S1': df.iloc[:3]}, 'two.xlsx': {'S1': pd.concat([df, df.iloc[[4]]])}}
+        results = ParallelExecutor(max_workers=2).run(overlap, dedup_ops)
+        second = results[('two.xlsx', 'S1')]
+        assert second['dataframe']['A'].tolist() == [4, 5], "Rows of earlier files not removed"
+        assert second['stats']['duplicates_removed'] == 4, "Cross-file duplicates not counted"
+        assert len(results[('one.xlsx', 'S1')]['dataframe']) == 3, "First file lost rows"
+        print("  ✅ Duplicate removal across files works")
+
+        prices = pd.DataFrame({'A': [1, 2, 3], 'Price': [1.5, 2.5, 3.5]})
+        merge_ops = [{'file': file_name, 'sheet': 'S1', 'type': 'Merge Operations', 'operation': 'Lookup Values',
+                      'source': {'file': 'prices.xlsx', 'sheet': 'P'}, 'left_on': ['A'], 'columns': ['Price']}
+                     for file_name in ('one.xlsx', 'two.xlsx')]
+        results = ParallelExecutor(max_workers=2).run(
+            {'one.xlsx': {'S1': df}, 'two.xlsx': {'S1': df.iloc[::-1]}, 'prices.xlsx': {'P': prices}}, merge_ops)
+        assert results[('two.xlsx', 'S1')]['dataframe']['Price'].tolist()[-2:] == [2.5, 1.5], "Lookup failed"
+        assert results[('prices.xlsx', 'P')]['dataframe'] is prices, "Source sheet was changed"
+        print("  ✅ Merge operations read other uploaded files")
+        print("  ✅ Per-sheet failures are reported")
+
+    except Exception as e:
+        print(f"  ❌ Error: {str(e)}")
+        return False
+
+    return True
+
+def test_sampling():
+    """Test sampled previews."""
+    print("\nTesting Sampling...")
+
+    df = pd.DataFrame({'G': ['a'] * 90 + ['b'] * 9 + ['c'], 'V': range(100)})
+
+    try:
+        assert sample_frame(df, 10, 'head')['V'].tolist() == list(range(10)), "Head sample failed"
+        random_sample = sample_frame(df, 10, 'random')
+        assert len(random_sample) == 10 and random_sample.index.is_monotonic_increasing, "Random sample failed"
+        stratified = sample_frame(df, 10, 'stratified', 'G')
+        assert stratified['G'].value_counts().to_dict() == {'a': 9, 'b': 1, 'c': 1}, "Stratified sample failed"
+        print("  ✅ Head, random and stratified samples work")
+
+        operations = [{'type': 'Filtering', 'operation': 'Filter Rows', 'column': 'V', 'operator': '<', 'value': '5'}]
+        preview = preview_sheet(df.iloc[:10], operations, total_rows=100)
+        assert len(preview['dataframe']) == 5 and preview['estimate']['rows'] == 50, "Preview estimate failed"
+        print("  ✅ Sampled preview and full-run estimate work")
+
+    except Exception as e:
+        print(f"  ❌ Error: {str(e)}")
+        return False
+
+    return True
+
+def test_job_manager():
+    """Test background jobs."""
+    print("\nTesting JobManager...")
+
+    df = pd.DataFrame({'A': [1, 2, 3, 4, 5]})
+    dataframes = {'one.xlsx': {'S1': df, 'S2': df}}
+    operations = [
+        {'file': 'one.xlsx', 'sheet': 'S1', 'type': 'Filtering', 'operation': 'Filter Rows',
+         'column': 'A', 'operator': '>', 'value': '3'},
+        {'file': 'one.xlsx', 'sheet': 'S1', 'type': 'Text Operations', 'operation': 'Uppercase', 'column': 'A'}
+    ]
+
+    try:
+        manager = JobManager(max_concurrent_jobs=1)
+        job = manager.submit(dataframes, operations, max_workers=2)
+        manager.shutdown(cancel=False)
+        assert job.status == 'done' and len(job.results[('one.xlsx', 'S1')]['dataframe']) == 2, "Job failed"
+        progress = job.progress()
+        assert progress['fraction'] == 1.0 and progress['sheets'][('one.xlsx', 'S1')]['completed'] == 2, \
+            "Progress not reported per operation"
+        assert manager.get(job.job_id) is job, "Finished job dropped before its TTL"
+        manager.finished_job_ttl = 0
+        job.finished_at -= 1
+        assert manager.get(job.job_id) is None, "Uncollected finished job was kept past its TTL"
+        print("  ✅ Background jobs work")
+
+        queued = Job(dataframes, operations, {})
+        queued.cancel()
+        queued.run()
+        assert queued.status == 'cancelled' and queued.results is None, "Queued job was not cancelled"
+        cancel_event = threading.Event()
+        cancel_event.set()
+        results = ParallelExecutor(max_workers=1).run(dataframes, operations, cancel_event=cancel_event)
+        assert results[('one.xlsx', 'S1')]['status'] == 'cancelled', "Running sheet was not cancelled"
+        print("  ✅ Cancellation works")
+
+    except Exception as e:
+        print(f"  ❌ Error: {str(e)}")
+        return False
+
+    return True
+
+def test_workbook_cache():
+    """Test WorkbookCache functionality."""
+    print("\nTesting WorkbookCache...")
+    handler = FileHandler()
+
+    try:
+        with open('sample_data/sample_input.xlsx', 'rb') as f:
+            data = f.read()
+
+        class Upload(io.BytesIO):
+            name = 'sample_input.xlsx'
+
+        loads = []
+        def loader(file):
+            loads.append(file.name)
+            return handler.load_excel(file)
+
+        cache = WorkbookCache(max_bytes=10 * 1024 * 1024)
+        digest, sheets = cache.load(Upload(data), loader)
+        digest_again, sheets_again = cache.load(Upload(data), loader)
+        assert digest == digest_again and sheets_again is sheets, "Same content not served from cache"
+        assert len(loads) == 1 and cache.hits == 1, "Workbook parsed more than once"
+        print("  ✅ Content-addressed caching works")
+
+        cache.put('other', {'S': pd.DataFrame({'A': range(10)})})
+        cache.max_bytes = cache.current_bytes - 1
+        cache.put('newest', {'S': pd.DataFrame({'A': range(10)})})
+        assert cache.get(digest) is None and cache.get('newest') is not None, "LRU eviction failed"
+        print("  ✅ LRU eviction works")
+
+        loaded = handler.open_excel(Upload(data))
+        loaded['Sales Data']
+        lazy_cache = WorkbookCache(max_bytes=loaded.nbytes)
+        lazy_cache.put('small', {'S': pd.DataFrame({'A': range(10)})})
+        workbook = handler.open_excel(Upload(data))
+        lazy_cache.put('lazy', workbook)
+        assert lazy_cache.get('small') is not None, "Unloaded workbook should fit next to a small one"
+        workbook['Sales Data']
+        assert lazy_cache._sizes['lazy'] == workbook.nbytes, "Loaded sheet not counted against the budget"
+        assert lazy_cache.get('small') is None and lazy_cache.get('lazy') is workbook, "Lazy load did not evict"
+        print("  ✅ Lazily loaded sheets count against the budget")
+
+        with tempfile.TemporaryDirectory() as spill_dir:
+            spilling_cache = WorkbookCache(spill_dir=spill_dir)
+            if spilling_cache.spill_dir:  # Needs pyarrow
+                spilling_cache.put(digest, sheets)
+                restored = WorkbookCache(spill_dir=spill_dir).get(digest)
+                pd.testing.assert_frame_equal(restored['Sales Data'], sheets['Sales Data'])
+                print("  ✅ Parquet spill works")
+
+            # The app's path: lazily opened uploads, spilled sheet by sheet as they load
+            def open_lazily(file):
+                loads.append(file.name)
+                return handler.open_excel(file)
+
+            app_cache = WorkbookCache(spill_dir=spill_dir)
+            if app_cache.spill_dir:
+                lazy_digest, workbook = app_cache.load(Upload(data), open_lazily, variant='lazy')
+                workbook['Sales Data']
+                _, restarted = WorkbookCache(spill_dir=spill_dir).load(Upload(data), open_lazily, variant='lazy')
+                assert restarted is not workbook and restarted.loaded_sheets == ['Sales Data'], \
+                    "Loaded sheet not restored after a restart"
+                pd.testing.assert_frame_equal(restarted['Sales Data'], workbook['Sales Data'])
+                print("  ✅ Lazily loaded sheets are spilled and restored")
+
+    except Exception as e:
+        print(f"  ❌ Error: {str(e)}")
+        return False
+
+    return True
+
 def test_template_manager():
     """Test TemplateManager functionality."""
     print("\nTesting TemplateManager...")
@@ -167,6 +804,11 @@ def main():
         'Dependencies': test_dependencies(),
         'FileHandler': test_file_handler(),
         'DataTransformer': test_data_transformer(),
+        'QueryPlanner': test_query_planner(),
+        'ParallelExecutor': test_parallel_executor(),
+        'Sampling': test_sampling(),
+        'JobManager': test_job_manager(),
+        'WorkbookCache': test_workbook_cache(),
         'TemplateManager': test_template_manager()
     }
     
@@ -0,0 +1,385 @@
+"""
+Aggregation Engine Module
+Group-by and pivot aggregation over dense group ids, with partial results that can be merged.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_integer_dtype, is_numeric_dtype
+
+logger = logging.getLogger(__name__)
+
+AGGREGATIONS = ["sum", "mean", "count", "min", "max", "std", "first", "last", "rows"]
+
+# Per-group states each aggregation needs; every state merges exactly
+AGGREGATION_STATES = {
+    'sum': ('sum',),
+    'mean': ('count', 'sum'),
+    'count': ('count',),
+    'min': ('min',),
+    'max': ('max',),
+    'std': ('count', 'sum', 'm2'),
+    'first': ('first',),
+    'last': ('last',),
+    'rows': ('rows',),
+}
+
+NUMERIC_AGGREGATIONS = {'sum', 'mean', 'std'}
+
+# Label of missing key values in pivot column names
+BLANK_LABEL = "(blank)"
+
+# Above this many distinct key combinations, group ids are found by hashing instead of a lookup table
+DENSE_TABLE_LIMIT = 1 << 22
+
+
+def aggregation_name(spec: Dict[str, Any]) -> str:
+    """Return the output column name of an aggregation, e.g. 'Sum of Sales'."""
+    if spec.get('name'):
+        return spec['name']
+    if spec.get('function') == 'rows':
+        return "Rows"
+    return f"{str(spec.get('function')).title()} of {spec.get('column')}"
+
+
+def group_ids(keys: pd.DataFrame) -> Tuple[np.ndarray, int]:
+    """
+    Number the distinct key combinations of every row.
+
+    Each key column is turned into integer codes: categorical columns use
+    their codes as they are, integer columns with a small range are offset
+    by their minimum, other columns are factorized (hashed) once.
+    The codes are combined into one integer per row, which is mapped to
+    dense group ids through a lookup table when the key space is small and
+    by hashing otherwise. Missing key values form their own group.
+
+    Args:
+        keys: Key columns
+
+    Returns:
+        Tuple of the group id of every row (0 .. groups - 1) and the
+        number of groups
+    """
+    combined = np.zeros(len(keys), dtype=np.int64)
+    size = 1
+    for _, series in keys.items():
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy().astype(np.int64)
+            cardinality = len(series.cat.categories)
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iu' and len(series) and \
+                int(series.max()) - int(series.min()) < min(DENSE_TABLE_LIMIT, 2 * len(series)):
+            low = int(series.min())
+            codes = series.to_numpy().astype(np.int64) - low
+            cardinality = int(series.max()) - low + 1
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            codes = codes.astype(np.int64)
+            cardinality = len(uniques)
+        # Code 0 is the missing value
+        codes += 1
+        cardinality += 1
+        if size * cardinality >= 2 ** 62:
+            combined, uniques = pd.factorize(combined)
+            size = len(uniques)
+        combined = combined * cardinality + codes
+        size *= cardinality
+
+    if size <= max(DENSE_TABLE_LIMIT, 2 * len(keys)):
+        present = np.bincount(combined, minlength=size) > 0
+        lookup = np.cumsum(present) - 1
+        return lookup[combined], int(present.sum())
+    ids, uniques = pd.factorize(combined)
+    return ids.astype(np.int64), len(uniques)
+
+
+def _first_rows(ids: np.ndarray, groups: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the position of the first row of every group (among rows in mask; -1 if none)."""
+    rows = len(ids)
+    positions = np.arange(rows)
+    if mask is not None:
+        ids, positions = ids[mask], positions[mask]
+    first = np.full(groups, rows, dtype=np.int64)
+    np.minimum.at(first, ids, positions)
+    first[first == rows] = -1
+    return first
+
+
+def _last_rows(ids: np.ndarray, groups: int, mask: np.ndarray) -> np.ndarray:
+    """Return the position of the last row of every group among rows in mask (-1 if none)."""
+    positions = np.arange(len(ids))
+    last = np.full(groups, -1, dtype=np.int64)
+    np.maximum.at(last, ids[mask], positions[mask])
+    return last
+
+
+def _sum_by(ids: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+    """Sum values per group; integer sums stay exact integers."""
+    if values.dtype.kind in 'iub':
+        sums = np.bincount(ids, weights=values, minlength=groups)
+        if np.abs(values).sum(dtype=np.float64) < 2 ** 53:
+            return np.rint(sums).astype(np.int64)
+        return pd.Series(values).groupby(ids).sum().reindex(range(groups), fill_value=0).to_numpy()
+    return np.bincount(ids, weights=np.where(np.isnan(values), 0.0, values), minlength=groups)
+
+
+def _pick_by(ids: np.ndarray, values: Any, groups: int, how: str) -> np.ndarray:
+    """Min, max, first or last non-missing value per group (missing if the group has none)."""
+    values = values.to_numpy() if isinstance(values, pd.Series) else values
+    if how in ('first', 'last'):
+        present = ~pd.isna(values)
+        rows = _first_rows(ids, groups, present) if how == 'first' else _last_rows(ids, groups, present)
+        picked = pd.Series(values).take(np.maximum(rows, 0)).to_numpy()
+        if (rows < 0).any():
+            picked = pd.Series(picked).where(rows >= 0).to_numpy()
+        return picked
+    if values.dtype.kind in 'iu':
+        # Integer columns have no missing values, so every group gets one
+        limits = np.iinfo(values.dtype)
+        result = np.full(groups, limits.max if how == 'min' else limits.min, dtype=values.dtype)
+        (np.minimum if how == 'min' else np.maximum).at(result, ids, values)
+        return result
+    if values.dtype.kind == 'f':
+        # fmin/fmax skip NaN
+        result = np.full(groups, np.nan)
+        (np.fmin if how == 'min' else np.fmax).at(result, ids, values)
+        return result
+    picked = getattr(pd.Series(values).groupby(ids, sort=True), how)()
+    return picked.reindex(range(groups)).to_numpy()
+
+
+class PartialAggregate:
+    """
+    Aggregation states of a set of rows, one entry per group.
+
+    Partials of different chunks, files or workers combine with
+    GroupAggregator.merge into the partial of all their rows, so large
+    inputs never have to be in memory at once.
+
+    Attributes:
+        keys (pd.DataFrame): Key values of every group
+        states (dict): (column, state) -> array with one value per group
+    """
+
+    def __init__(self, keys: pd.DataFrame, states: Dict[Tuple[Optional[str], str], np.ndarray]):
+        self.keys = keys
+        self.states = states
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class GroupAggregator:
+    """
+    Computes group-by aggregations with mergeable partial results.
+
+    Rows are mapped to dense group ids (see group_ids) and every
+    aggregation is a single vectorized pass over those ids, mostly
+    np.bincount. Only states that merge exactly are kept per group: sums
+    and counts, min/max, first/last, and for std the sum of squared
+    deviations, combined with Chan's parallel formula.
+
+    Attributes:
+        keys (list): Key columns
+        aggregations (list): Dicts with 'column', 'function' (one of
+            AGGREGATIONS) and an optional output 'name'
+    """
+
+    def __init__(self, keys: Sequence[str], aggregations: Sequence[Dict[str, Any]]):
+        """
+        Initialize GroupAggregator.
+
+        Args:
+            keys: Key columns
+            aggregations: Aggregations to compute
+
+        Raises:
+            ValueError: If an aggregation function is unknown
+        """
+        self.keys = list(keys)
+        self.aggregations = list(aggregations)
+        if not self.aggregations:
+            raise ValueError("At least one aggregation is required")
+        self._states = []
+        for spec in self.aggregations:
+            function = spec.get('function')
+            if function not in AGGREGATION_STATES:
+                raise ValueError(f"Unknown aggregation '{function}'. Supported: {AGGREGATIONS}")
+            column = None if function == 'rows' else spec.get('column')
+            for state in AGGREGATION_STATES[function]:
+                if (column, state) not in self._states:
+                    self._states.append((column, state))
+
+    def partial(self, df: pd.DataFrame) -> PartialAggregate:
+        """
+        Aggregate the rows of one frame.
+
+        Args:
+            df: Rows to aggregate
+
+        Returns:
+            PartialAggregate of df
+
+        Raises:
+            ValueError: If a column is missing or a numeric aggregation
+                is applied to a non-numeric column
+        """
+        missing = [column for column in self.keys + [column for column, _ in self._states if column is not None]
+                   if column not in df.columns]
+        if missing:
+            raise ValueError(f"Columns not found: {', '.join(map(str, dict.fromkeys(missing)))}")
+        for spec in self.aggregations:
+            if spec.get('function') in NUMERIC_AGGREGATIONS:
+                dtype = df[spec.get('column')].dtype
+                if not is_numeric_dtype(dtype):
+                    raise ValueError(f"'{spec.get('function')}' needs a numeric column, "
+                                     f"'{spec.get('column')}' is {dtype}")
+
+        ids, groups = group_ids(df[self.keys])
+        keys = df[self.keys].take(_first_rows(ids, groups)).reset_index(drop=True)
+        states = {}
+        for column, state in self._states:
+            series = df[column] if column is not None else None
+            if state == 'rows':
+                states[(column, state)] = np.bincount(ids, minlength=groups)
+            elif state == 'count':
+                states[(column, state)] = np.bincount(ids[series.notna().to_numpy()], minlength=groups)
+            elif state == 'sum':
+                states[(column, state)] = _sum_by(ids, self._numbers(series), groups)
+            elif state == 'm2':
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+                mean = states[(column, 'sum')] / np.maximum(states[(column, 'count')], 1)
+                deviations = np.where(np.isnan(values), 0.0, values - mean[ids])
+                states[(column, state)] = np.bincount(ids, weights=deviations ** 2, minlength=groups)
+            else:
+                states[(column, state)] = _pick_by(ids, series, groups, state)
+        return PartialAggregate(keys, states)
+
+    @staticmethod
+    def _numbers(series: pd.Series) -> np.ndarray:
+        """Values of a numeric column as int64 (missing as 0) or float64 (missing as NaN)."""
+        if is_bool_dtype(series.dtype) or is_integer_dtype(series.dtype):
+            return series.to_numpy(dtype=np.int64, na_value=0)
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def merge(self, partials: Iterable[PartialAggregate]) -> PartialAggregate:
+        """
+        Combine partial aggregates into the partial of all their rows.
+
+        First and last follow the order of the partials.
+
+        Args:
+            partials: Partial aggregates of the same GroupAggregator
+
+        Returns:
+            PartialAggregate: Combined result
+        """
+        partials = [partial for partial in partials if partial is not None]
+        if len(partials) == 1:
+            return partials[0]
+        keys = pd.concat([partial.keys for partial in partials], ignore_index=True)
+        ids, groups = group_ids(keys)
+        states = {}
+        for column, state in self._states:
+            values = np.concatenate([partial.states[(column, state)] for partial in partials])
+            if state in ('rows', 'count', 'sum'):
+                states[(column, state)] = _sum_by(ids, values, groups)
+            elif state == 'm2':
+                # Chan et al.: M2 = sum of M2_i + n_i * (mean_i - mean)^2
+                counts = np.concatenate([partial.states[(column, 'count')] for partial in partials])
+                sums = np.concatenate([partial.states[(column, 'sum')] for partial in partials])
+                part_means = sums / np.maximum(counts, 1)
+                means = states[(column, 'sum')] / np.maximum(states[(column, 'count')], 1)
+                states[(column, state)] = np.bincount(
+                    ids, weights=values + counts * (part_means - means[ids]) ** 2, minlength=groups)
+            else:
+                states[(column, state)] = _pick_by(ids, values, groups, state)
+        return PartialAggregate(keys.take(_first_rows(ids, groups)).reset_index(drop=True), states)
+
+    def finalize(self, partial: PartialAggregate, sort: bool = True) -> pd.DataFrame:
+        """
+        Turn a partial aggregate into the result table.
+
+        Args:
+            partial: Partial aggregate of all rows
+            sort: Sort groups by their keys (missing keys last)
+
+        Returns:
+            pd.DataFrame: One row per group with the key columns followed
+            by one column per aggregation
+        """
+        result = partial.keys.copy()
+        for spec in self.aggregations:
+            function = spec['function']
+            column = None if function == 'rows' else spec.get('column')
+            states = {state: partial.states[(column, state)] for state in AGGREGATION_STATES[function]}
+            if function == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = np.where(states['count'] > 0, states['sum'] / states['count'], np.nan)
+            elif function == 'std':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = np.where(states['count'] > 1,
+                                      np.sqrt(states['m2'] / (states['count'] - 1)), np.nan)
+            else:
+                values = states[AGGREGATION_STATES[function][0]]
+            result[aggregation_name(spec)] = values
+        return sort_groups(result, self.keys) if sort else result
+
+    def aggregate(self, df: pd.DataFrame, sort: bool = True) -> pd.DataFrame:
+        """Group and aggregate one frame."""
+        return self.finalize(self.partial(df), sort)
+
+
+def sort_groups(result: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Sort result rows by their key columns, missing keys last; keys of mixed types stay unsorted."""
+    if keys:
+        try:
+            result = result.sort_values(keys, na_position='last', kind='stable')
+        except TypeError:
+            logger.info("Group keys of mixed types, leaving groups unsorted")
+    return result.reset_index(drop=True)
+
+
+def pivot(aggregated: pd.DataFrame, index: List[str], column: str, names: List[str],
+          fill_value: Any = None) -> pd.DataFrame:
+    """
+    Spread aggregated rows into one column per value of a key column.
+
+    Args:
+        aggregated: GroupAggregator result keyed by index + [column], one
+            row per combination
+        index: Row keys of the pivot table
+        column: Key column whose values become columns
+        names: Aggregation columns to spread
+        fill_value: Value for combinations without rows (missing by default)
+
+    Returns:
+        pd.DataFrame: Pivot table with the row keys as columns, sorted by
+        them. Columns are named after the key value, or
+        'aggregation - value' when there are several aggregations, and
+        sorted by name. Missing key values are labelled '(blank)'.
+    """
+    if index:
+        row_ids, rows = group_ids(aggregated[index])
+        result = aggregated[index].take(_first_rows(row_ids, rows)).reset_index(drop=True)
+    else:
+        row_ids, rows = np.zeros(len(aggregated), dtype=np.int64), 1
+        result = pd.DataFrame(index=range(1))
+
+    column_ids, column_count = group_ids(aggregated[[column]])
+    labels = [BLANK_LABEL if pd.isna(value) else str(value)
+              for value in aggregated[column].take(_first_rows(column_ids, column_count))]
+    order = sorted(range(column_count), key=lambda idx: (labels[idx] == BLANK_LABEL, labels[idx]))
+
+    columns = {}
+    for name in names:
+        values = aggregated[name].to_numpy()
+        numeric = values.dtype.kind in 'iufb' and (fill_value is None or isinstance(fill_value, (int, float)))
+        grid = np.full((rows, column_count), np.nan if fill_value is None else fill_value,
+                       dtype=np.float64 if numeric else object)
+        grid[row_ids, column_ids] = values
+        for idx in order:
+            columns[labels[idx] if len(names) == 1 else f"{name} - {labels[idx]}"] = grid[:, idx]
+    return sort_groups(pd.concat([result, pd.DataFrame(columns, index=result.index)], axis=1), index)
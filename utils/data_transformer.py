@@ -5,9 +5,23 @@ Handles all data transformation operations.
 
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import logging
 import re
+import time
+
+from pandas.api.types import is_numeric_dtype
+
+from utils.aggregation_engine import GroupAggregator, PartialAggregate, aggregation_name, pivot
+from utils.date_engine import DateParser
+from utils.dedup_engine import DedupEngine, DuplicateScan, StreamingDeduplicator
+from utils.filter_engine import FilterEngine
+from utils.formula_engine import compile_formulas, formula_pairs
+from utils.memory import PeakMemoryTracker
+from utils.merge_engine import JoinIndexCache, join_sheet, lookup_values, stack_labels, stack_sheets
+from utils.profiler import operation_record
+from utils.result_cache import OperationCache, chain_key
+from utils.text_engine import transform_text
 
 logger = logging.getLogger(__name__)
 
@@ -17,19 +31,37 @@ class DataTransformer:
     Applies various data transformation operations on DataFrames.
     
     Supports operations like cleaning, filtering, mathematical operations, etc.
+    Merge operations read other sheets from sources.
     """
     
-    def __init__(self):
-        """Initialize DataTransformer."""
-        pass
+    def __init__(self, sources: Optional[Dict[Tuple[str, str], pd.DataFrame]] = None,
+                 index_cache: Optional[JoinIndexCache] = None):
+        """
+        Initialize DataTransformer.
+        
+        Args:
+            sources: (file, sheet) -> DataFrame of the sheets merge operations
+                read from (see merge_engine.source_refs)
+            index_cache: JoinIndexCache to share join indexes with other
+                transformers of the same execution
+        """
+        self.filter_engine = FilterEngine()
+        self.dedup_engine = DedupEngine()
+        self.date_parser = DateParser()
+        self.sources = sources or {}
+        self.index_cache = index_cache or JoinIndexCache()
+        self.last_run_stats = None
     
-    def apply_operation(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
+    def apply_operation(self, df: pd.DataFrame, operation: Dict[str, Any],
+                        inplace: bool = False) -> pd.DataFrame:
         """
         Apply a single operation to the DataFrame.
         
         Args:
             df: Input DataFrame
             operation: Dictionary containing operation details
+            inplace: Modify df directly instead of working on a copy. Only
+                safe when the caller owns df (see apply_operations).
             
         Returns:
             pd.DataFrame: Transformed DataFrame
@@ -41,17 +73,21 @@ class DataTransformer:
             logger.info(f"Applying operation: {op_type} - {op_name}")
             
             if op_type == "Data Cleaning":
-                return self._apply_cleaning(df, operation)
+                return self._apply_cleaning(df, operation, inplace)
             elif op_type == "Filtering":
-                return self._apply_filtering(df, operation)
+                return self._apply_filtering(df, operation, inplace)
             elif op_type == "Column Operations":
-                return self._apply_column_operations(df, operation)
+                return self._apply_column_operations(df, operation, inplace)
             elif op_type == "Mathematical Operations":
-                return self._apply_mathematical(df, operation)
+                return self._apply_mathematical(df, operation, inplace)
             elif op_type == "Text Operations":
-                return self._apply_text_operations(df, operation)
+                return self._apply_text_operations(df, operation, inplace)
             elif op_type == "Date Operations":
-                return self._apply_date_operations(df, operation)
+                return self._apply_date_operations(df, operation, inplace)
+            elif op_type == "Merge Operations":
+                return self._apply_merge_operations(df, operation, inplace)
+            elif op_type == "Aggregation":
+                return self._apply_aggregation(df, operation)
             else:
                 logger.warning(f"Unknown operation type: {op_type}")
                 return df
@@ -60,24 +96,430 @@ class DataTransformer:
             logger.error(f"Error applying operation: {str(e)}")
             raise
     
-    def _apply_cleaning(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
+    def apply_operations(self, df: pd.DataFrame, operations: List[Dict[str, Any]],
+                         track_memory: bool = False, cache: Optional[OperationCache] = None,
+                         input_key: Optional[str] = None,
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         profile: bool = False) -> pd.DataFrame:
+        """
+        Apply a chain of operations, copying the input at most once.
+        
+        The input DataFrame is never modified. It is copied once, right before
+        the first operation that would modify it, and every operation after
+        that works in place on the copy. A leading filter, Remove Duplicates,
+        Stack Sheets or Join Sheet builds a new frame anyway, so in that case
+        no full copy is made at all.
+        
+        With a cache, the output of every operation is memoized under a key
+        built from input_key and the operations up to it. A re-run resumes
+        from the longest cached prefix and only recomputes the changed
+        suffix. Cached frames are shared, so in this mode each recomputed
+        operation works on its own copy instead of in place.
+        
+        Statistics about the run are stored in last_run_stats.
+        
+        progress_callback(completed, total) is called before every operation
+        that runs and once more at the end. It may raise to abort the chain
+        between operations (the input is still left untouched).
+        
+        With profile, every operation is timed and measured (rows in and out,
+        peak memory, output bytes) and the records are stored in
+        last_run_stats['profile']. Measuring memory and output size adds
+        overhead, so this is off by default.
+        
+        Args:
+            df: Input DataFrame
+            operations: List of operation dictionaries, applied in order
+            track_memory: Measure peak memory of the run with tracemalloc
+            cache: Optional OperationCache for incremental re-runs
+            input_key: Fingerprint of df, required to use the cache
+                (e.g. the file content hash plus sheet name, or frame_fingerprint)
+            progress_callback: Optional progress hook, see above
+            profile: Record per-operation measurements
+            
+        Returns:
+            pd.DataFrame: Transformed DataFrame
+        """
+        memoize = cache is not None and input_key is not None
+        keys = []
+        if memoize:
+            key = input_key
+            for operation in operations:
+                key = chain_key(key, operation)
+                keys.append(key)
+        
+        result_df = df
+        start = 0
+        copies = 0
+        duplicates_removed = 0
+        
+        with PeakMemoryTracker(enabled=track_memory) as tracker:
+            if memoize:
+                for idx in range(len(keys) - 1, -1, -1):
+                    cached = cache.get(keys[idx])
+                    if cached is not None:
+                        result_df = cached
+                        start = idx + 1
+                        break
+            
+            profile_records = [operation_record(idx, operations[idx], cached=True)
+                               for idx in range(start)] if profile else None
+            
+            for idx in range(start, len(operations)):
+                if progress_callback:
+                    progress_callback(idx, len(operations))
+                operation = operations[idx]
+                new_frame = self._returns_new_frame(operation)
+                rows_in = len(result_df)
+                
+                with PeakMemoryTracker(enabled=profile) as op_tracker:
+                    op_start = time.perf_counter()
+                    if memoize:
+                        result_df = self.apply_operation(result_df, operation)
+                        cache.put(keys[idx], result_df)
+                        if not new_frame:
+                            copies += 1
+                    else:
+                        if result_df is df and not new_frame:
+                            result_df = df.copy()
+                            copies += 1
+                        result_df = self.apply_operation(result_df, operation, inplace=True)
+                    seconds = time.perf_counter() - op_start
+                
+                if self._is_dedup(operation):
+                    duplicates_removed += rows_in - len(result_df)
+                if profile:
+                    profile_records.append(operation_record(idx, operation, seconds, rows_in, result_df,
+                                                            op_tracker.peak_bytes))
+        
+        if progress_callback:
+            progress_callback(len(operations), len(operations))
+        
+        if start:
+            logger.info(f"Reused cached results of {start} of {len(operations)} operation(s)")
+        
+        self.last_run_stats = {
+            'operations': len(operations),
+            'cached_operations': start,
+            'copies': copies,
+            'duplicates_removed': duplicates_removed,
+            'rows_in': len(df),
+            'rows_out': len(result_df),
+            'peak_memory_bytes': tracker.peak_bytes,
+            'profile': profile_records
+        }
+        
+        return result_df
+    
+    def apply_operations_chunked(self, chunks: Any,
+                                 operations: List[Dict[str, Any]]) -> Iterator[pd.DataFrame]:
+        """
+        Apply a chain of operations to a stream of row chunks.
+        
+        Meant for FileHandler.iter_excel_chunks: only one chunk is processed
+        at a time, so memory stays bounded by the chunk size. Operations that
+        need state across chunks keep it between calls (rows already seen for
+        Remove Duplicates, last valid value for Forward Fill, trailing gaps
+        waiting for a value for Backward Fill). Aggregations fold every chunk
+        into a partial aggregate and Stack Sheets holds back its sources;
+        both emit their rows, passed through the operations after them, when
+        the stream ends.
+        
+        Operations that depend on the whole column (Mean, Median and Mode
+        fill, Remove Duplicates keeping the last or no occurrence, Remove
+        Empty Columns, Split Column) are pre-scanned: the stream is read once
+        more, up to that operation, to collect what it needs. chunks must
+        then be a function that opens the stream again on every call. Date
+        formats are inferred from the first chunk and kept for the rest.
+        
+        last_run_stats is set once the stream is exhausted.
+        
+        Args:
+            chunks: Iterable of DataFrame chunks with the same columns, or a
+                function returning a new such iterable on every call
+            operations: List of operation dictionaries, applied in order
+            
+        Yields:
+            pd.DataFrame: Transformed chunks (possibly empty after filtering)
+            
+        Raises:
+            ValueError: If an operation needs a pre-scan while chunks can
+                only be read once
+        """
+        prescans = [idx for idx, operation in enumerate(operations) if self._needs_prescan(operation)]
+        if prescans and not callable(chunks):
+            raise ValueError(f"'{operations[prescans[0]].get('operation')}' needs a pre-scan of the sheet; "
+                             f"pass a function that opens the chunks again")
+        
+        start = time.perf_counter()
+        seeds = [{} for _ in operations]
+        for idx in prescans:
+            states = [dict(seed) for seed in seeds[:idx]]
+            seeds[idx] = self._prescan(operations[idx], self._stream(chunks(), operations[:idx], states))
+        
+        states = [dict(seed) for seed in seeds]
+        counts = {'chunks': 0, 'rows_in': 0, 'rows_out': 0}
+        seconds = 0.0
+        for result_df in self._stream(chunks() if callable(chunks) else chunks, operations, states, counts):
+            counts['rows_out'] += len(result_df)
+            seconds += time.perf_counter() - start
+            yield result_df
+            start = time.perf_counter()
+        
+        self.last_run_stats = {
+            'operations': len(operations),
+            'cached_operations': 0,
+            'copies': None,
+            'duplicates_removed': sum(state['dedup'].removed if 'dedup' in state else state.get('removed', 0)
+                                      for state in states),
+            **counts,
+            'passes': len(prescans) + 1,
+            'seconds': seconds + time.perf_counter() - start,
+            'peak_memory_bytes': None,
+            'profile': None
+        }
+    
+    def _stream(self, chunks: Iterable[pd.DataFrame], operations: List[Dict[str, Any]],
+                states: List[Dict[str, Any]], counts: Optional[Dict[str, int]] = None) -> Iterator[pd.DataFrame]:
+        """Run one pass over a stream, then emit the rows operations held back until its end."""
+        for chunk in chunks:
+            if counts is not None:
+                counts['chunks'] += 1
+                counts['rows_in'] += len(chunk)
+            result_df = self._run_chunk(chunk, operations, states, 0)
+            if result_df is not None:
+                yield result_df
+        
+        for idx, operation in enumerate(operations):
+            held_back = self._flush(operation, states[idx])
+            if held_back is not None:
+                result_df = self._run_chunk(held_back, operations, states, idx + 1)
+                if result_df is not None:
+                    yield result_df
+    
+    def _run_chunk(self, chunk: pd.DataFrame, operations: List[Dict[str, Any]],
+                   states: List[Dict[str, Any]], start: int) -> Optional[pd.DataFrame]:
+        """
+        Apply operations[start:] to one chunk.
+        
+        Returns:
+            The transformed chunk, or None if an operation held all of it back
+        """
+        result_df = chunk
+        for operation, state in zip(operations[start:], states[start:]):
+            if operation.get('type') == "Aggregation":
+                if 'aggregator' not in state:
+                    state['aggregator'] = self._aggregator(operation)
+                aggregator = state['aggregator']
+                partial = aggregator.partial(result_df)
+                state['partial'] = aggregator.merge([state['partial'], partial]) if 'partial' in state else partial
+                return None
+            if result_df is chunk and not self._returns_new_frame(operation):
+                result_df = chunk.copy()
+            result_df = self._apply_to_chunk(result_df, operation, state)
+            if result_df is None:
+                return None
+        return result_df
+    
+    @classmethod
+    def _needs_prescan(cls, operation: Dict[str, Any]) -> bool:
+        """Whether an operation needs a pass over the whole stream before it can run per chunk."""
+        op_type = operation.get('type')
+        op_name = operation.get('operation')
+        
+        if cls._is_dedup(operation):
+            return operation.get('keep', 'first') != 'first'
+        if op_type == "Data Cleaning":
+            return (op_name == "Remove Empty Columns"
+                    or (op_name == "Fill Missing Values" and operation.get('method') in ("Mean", "Median", "Mode")))
+        return op_type == "Column Operations" and op_name == "Split Column"
+    
+    def _prescan(self, operation: Dict[str, Any], chunks: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+        """
+        Collect what an operation needs to know about the whole stream.
+        
+        Args:
+            operation: Operation for which _needs_prescan is True
+            chunks: The stream as it reaches the operation
+            
+        Returns:
+            Initial streaming state of the operation for _apply_to_chunk
+        """
+        op_name = operation.get('operation')
+        column = operation.get('column')
+        
+        if self._is_dedup(operation):
+            scan = DuplicateScan(operation.get('columns'), self.dedup_engine)
+            for chunk in chunks:
+                scan.add(chunk)
+            return {'duplicates': scan}
+        
+        if op_name == "Remove Empty Columns":
+            columns, filled = None, set()
+            for chunk in chunks:
+                if columns is None:
+                    columns = list(chunk.columns)
+                filled.update(chunk.columns[chunk.notna().any().to_numpy()])
+            return {'empty_columns': [col for col in columns or [] if col not in filled]}
+        
+        if op_name == "Split Column":
+            parts = 0
+            separator = operation.get('separator', ',')
+            for chunk in chunks:
+                if len(chunk):
+                    parts = max(parts, int(chunk[column].astype(str).str.split(separator).str.len().max()))
+            return {'split_parts': parts}
+        
+        # Fill Missing Values: Mean from running sums, Median and Mode from value counts
+        method = operation.get('method')
+        total, count, value_counts = 0.0, 0, None
+        for chunk in chunks:
+            series = chunk[column]
+            if method != "Mode" and not is_numeric_dtype(series.dtype):
+                raise TypeError(f"Cannot compute the {method.lower()} of non-numeric column '{column}'")
+            if method == "Mean":
+                total += float(series.sum())
+                count += int(series.count())
+                continue
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.astype(object)
+            chunk_counts = series.value_counts()
+            if not len(chunk_counts):
+                continue
+            value_counts = chunk_counts if value_counts is None else \
+                pd.concat([value_counts, chunk_counts]).groupby(level=0, sort=False).sum()
+        
+        if method == "Mean":
+            return {'fill_value': total / count if count else np.nan}
+        if value_counts is None or not len(value_counts):
+            return {'fill_value': np.nan}
+        if method == "Median":
+            value_counts = value_counts.sort_index()
+            cumulative = np.cumsum(value_counts.to_numpy())
+            size = cumulative[-1]
+            lower = value_counts.index[np.searchsorted(cumulative, (size - 1) // 2, side='right')]
+            upper = value_counts.index[np.searchsorted(cumulative, size // 2, side='right')]
+            return {'fill_value': (lower + upper) / 2}
+        # Mode: the smallest of the most frequent values, like Series.mode()[0]
+        candidates = value_counts.index[value_counts.to_numpy() == value_counts.max()]
+        try:
+            candidates = candidates.sort_values()
+        except TypeError:
+            pass
+        return {'fill_value': candidates[0]}
+    
+    def _apply_to_chunk(self, df: pd.DataFrame, operation: Dict[str, Any],
+                        state: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """Apply one operation to an owned chunk, updating its streaming state."""
+        op_name = operation.get('operation')
+        column = operation.get('column')
+        
+        if self._is_dedup(operation):
+            if 'duplicates' in state:
+                start = state.get('rows', 0)
+                state['rows'] = start + len(df)
+                mask = state['duplicates'].keep_mask(df, start, operation.get('keep'))
+                state['removed'] = state.get('removed', 0) + len(df) - int(mask.sum())
+                return df.take(np.flatnonzero(mask))
+            if 'dedup' not in state:
+                state['dedup'] = StreamingDeduplicator(operation.get('columns'), self.dedup_engine)
+            return state['dedup'].process(df)
+        
+        if 'fill_value' in state:
+            df[column] = self._fill_missing(df[column], state['fill_value'])
+            return df
+        
+        if 'empty_columns' in state:
+            df.drop(columns=state['empty_columns'], inplace=True)
+            return df
+        
+        if 'split_parts' in state:
+            self._split_column(df, operation, state['split_parts'])
+            return df
+        
+        if operation.get('type') == "Data Cleaning" and op_name == "Fill Missing Values":
+            if operation.get('method') == "Forward Fill":
+                filled = df[column].ffill()
+                if 'last' in state:
+                    # Only leading gaps are left, fill them from the previous chunk
+                    filled = filled.fillna(state['last'])
+                last_valid = filled.last_valid_index()
+                if last_valid is not None:
+                    state['last'] = filled.loc[last_valid]
+                df[column] = filled
+                return df
+            
+            if operation.get('method') == "Backward Fill":
+                if 'pending' in state:
+                    df = pd.concat([state.pop('pending'), df])
+                df[column] = df[column].bfill()
+                valid = np.flatnonzero(df[column].notna().to_numpy())
+                kept = valid[-1] + 1 if len(valid) else 0
+                if kept < len(df):
+                    # Trailing gaps wait for the first value of a later chunk
+                    state['pending'] = df.take(np.arange(kept, len(df)))
+                    df = df.take(np.arange(kept))
+                return df if len(df) else None
+        
+        if operation.get('type') == "Merge Operations" and op_name == "Stack Sheets":
+            source_column = operation.get('source_column') or None
+            if 'parts' not in state:
+                own_ref = (operation.get('file'), operation.get('sheet'))
+                state['parts'] = [((source.get('file'), source.get('sheet')), self._source(source))
+                                  for source in operation.get('sources', [])]
+                state['labels'] = stack_labels([own_ref] + [ref for ref, _ in state['parts']])
+                state['columns'] = stack_sheets(df.head(0), [(ref, part.head(0)) for ref, part in state['parts']],
+                                                own_ref, source_column).columns
+            if source_column:
+                df = df.assign(**{source_column: state['labels'][0]})
+            return df.reindex(columns=state['columns'])
+        
+        return self.apply_operation(df, operation, inplace=True)
+    
+    def _flush(self, operation: Dict[str, Any], state: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """Return the rows an operation held back until the end of the stream, if any."""
+        if 'partial' in state:
+            return self._finish_aggregation(operation, state['aggregator'], state['partial'])
+        
+        if operation.get('type') == "Merge Operations" and state.get('parts'):
+            source_column = operation.get('source_column') or None
+            frames = [part.assign(**{source_column: label}) if source_column else part
+                      for (_, part), label in zip(state['parts'], state['labels'][1:])]
+            return pd.concat(frames, ignore_index=True).reindex(columns=state['columns'])
+        
+        return state.pop('pending', None)
+    
+    @staticmethod
+    def _is_dedup(operation: Dict[str, Any]) -> bool:
+        """Whether the operation is Remove Duplicates."""
+        return operation.get('type') == "Data Cleaning" and operation.get('operation') == "Remove Duplicates"
+    
+    @classmethod
+    def _returns_new_frame(cls, operation: Dict[str, Any]) -> bool:
+        """Whether the operation always builds a new frame instead of modifying its input."""
+        if operation.get('type') == "Merge Operations":
+            return operation.get('operation') in ("Stack Sheets", "Join Sheet")
+        return operation.get('type') in ("Filtering", "Aggregation") or cls._is_dedup(operation)
+    
+    def _apply_cleaning(self, df: pd.DataFrame, operation: Dict[str, Any],
+                        inplace: bool = False) -> pd.DataFrame:
         """Apply data cleaning operations."""
         op_name = operation.get('operation')
-        result_df = df.copy()
         
         if op_name == "Remove Duplicates":
-            columns = operation.get('columns')
-            keep = operation.get('keep', 'first')
-            if columns:
-                result_df = result_df.drop_duplicates(subset=columns, keep=keep)
-            else:
-                result_df = result_df.drop_duplicates(keep=keep)
+            # Row selection builds a new frame, so no defensive copy is needed
+            result_df, removed = self.dedup_engine.drop_duplicates(df, operation.get('columns'),
+                                                                   operation.get('keep', 'first'))
+            logger.info(f"Removed {removed} duplicate row(s)")
+            return result_df
         
-        elif op_name == "Remove Empty Rows":
-            result_df = result_df.dropna(how='all')
+        result_df = df if inplace else df.copy()
+        
+        if op_name == "Remove Empty Rows":
+            result_df.dropna(how='all', inplace=True)
         
         elif op_name == "Remove Empty Columns":
-            result_df = result_df.dropna(axis=1, how='all')
+            result_df.dropna(axis=1, how='all', inplace=True)
         
         elif op_name == "Fill Missing Values":
             column = operation.get('column')
@@ -88,54 +530,58 @@ class DataTransformer:
             elif method == "Backward Fill":
                 result_df[column] = result_df[column].fillna(method='bfill')
             elif method == "Mean":
-                result_df[column] = result_df[column].fillna(result_df[column].mean())
+                result_df[column] = self._fill_missing(result_df[column], result_df[column].mean())
             elif method == "Median":
-                result_df[column] = result_df[column].fillna(result_df[column].median())
+                result_df[column] = self._fill_missing(result_df[column], result_df[column].median())
             elif method == "Mode":
-                result_df[column] = result_df[column].fillna(result_df[column].mode()[0])
+                result_df[column] = self._fill_missing(result_df[column], result_df[column].mode()[0])
             elif method == "Custom Value":
                 value = operation.get('value')
-                result_df[column] = result_df[column].fillna(value)
+                result_df[column] = self._fill_missing(result_df[column], value)
         
         return result_df
     
-    def _apply_filtering(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
-        """Apply filtering operations."""
-        column = operation.get('column')
-        operator = operation.get('operator')
-        value = operation.get('value')
+    @staticmethod
+    def _fill_missing(series: pd.Series, value: Any) -> pd.Series:
+        """
+        Fill missing values, widening compact dtypes that cannot hold value.
         
-        result_df = df.copy()
+        Categoricals get value added as a category; nullable integers and
+        Arrow strings fall back to float64 or object.
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            if pd.notna(value) and value not in series.cat.categories:
+                series = series.cat.add_categories([value])
+            return series.fillna(value)
         
-        # Try to convert value to numeric if possible
         try:
-            value = float(value)
-        except (ValueError, TypeError):
-            pass
+            return series.fillna(value)
+        except TypeError:
+            numeric = is_numeric_dtype(series.dtype) and isinstance(value, (int, float, np.number))
+            return series.astype('float64' if numeric else object).fillna(value)
+    
+    def _apply_filtering(self, df: pd.DataFrame, operation: Dict[str, Any],
+                         inplace: bool = False) -> pd.DataFrame:
+        """
+        Apply filtering operations.
         
-        if operator == "==":
-            result_df = result_df[result_df[column] == value]
-        elif operator == "!=":
-            result_df = result_df[result_df[column] != value]
-        elif operator == ">":
-            result_df = result_df[result_df[column] > value]
-        elif operator == "<":
-            result_df = result_df[result_df[column] < value]
-        elif operator == ">=":
-            result_df = result_df[result_df[column] >= value]
-        elif operator == "<=":
-            result_df = result_df[result_df[column] <= value]
-        elif operator == "contains":
-            result_df = result_df[result_df[column].astype(str).str.contains(str(value), na=False)]
-        elif operator == "not contains":
-            result_df = result_df[~result_df[column].astype(str).str.contains(str(value), na=False)]
+        A filter is either a single column/operator/value condition or a
+        group of 'conditions' combined with 'logic' (AND/OR, nestable),
+        evaluated as one mask by FilterEngine.
+        """
+        group = operation if operation.get('conditions') else {'conditions': [operation]}
+        mask = self.filter_engine.mask(df, group)
         
-        return result_df
+        # Row selection always builds a new frame, so no defensive copy is needed.
+        # take() is used instead of df[mask] so the result is not flagged as a
+        # slice of df and can be modified in place by later operations.
+        return df.take(np.flatnonzero(mask))
     
-    def _apply_column_operations(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
+    def _apply_column_operations(self, df: pd.DataFrame, operation: Dict[str, Any],
+                                 inplace: bool = False) -> pd.DataFrame:
         """Apply column operations."""
         op_name = operation.get('operation')
-        result_df = df.copy()
+        result_df = df if inplace else df.copy()
         
         if op_name == "Merge Columns":
             columns = operation.get('columns', [])
@@ -143,60 +589,83 @@ class DataTransformer:
             new_column = operation.get('new_column')
             
             if columns and new_column:
-                result_df[new_column] = result_df[columns].astype(str).agg(separator.join, axis=1)
+                if len(result_df):
+                    result_df[new_column] = result_df[columns].astype(str).agg(separator.join, axis=1)
+                else:
+                    # agg(axis=1) on no rows returns a frame, not a column
+                    result_df[new_column] = pd.Series(index=result_df.index, dtype=object)
         
         elif op_name == "Split Column":
-            column = operation.get('column')
-            separator = operation.get('separator', ',')
-            new_columns = operation.get('new_columns', [])
-            
-            if column and new_columns:
-                split_data = result_df[column].astype(str).str.split(separator, expand=True)
-                for idx, new_col in enumerate(new_columns):
-                    if idx < len(split_data.columns):
-                        result_df[new_col.strip()] = split_data[idx]
+            self._split_column(result_df, operation)
         
         elif op_name == "Rename Column":
             old_name = operation.get('old_name')
             new_name = operation.get('new_name')
             
             if old_name and new_name:
-                result_df = result_df.rename(columns={old_name: new_name})
+                result_df.rename(columns={old_name: new_name}, inplace=True)
         
         elif op_name == "Delete Column":
             columns = operation.get('columns', [])
-            result_df = result_df.drop(columns=columns, errors='ignore')
+            result_df.drop(columns=columns, errors='ignore', inplace=True)
         
         return result_df
     
-    def _apply_mathematical(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
+    @staticmethod
+    def _split_column(df: pd.DataFrame, operation: Dict[str, Any], parts: Optional[int] = None):
+        """
+        Split a column into new columns of df, in place.
+        
+        The number of parts is that of the longest value unless parts is
+        given (chunks use the count of the whole stream).
+        """
+        column = operation.get('column')
+        separator = operation.get('separator', ',')
+        new_columns = operation.get('new_columns', [])
+        
+        if column and new_columns:
+            split_data = df[column].astype(str).str.split(separator, expand=True)
+            if parts is not None:
+                split_data = split_data.reindex(columns=range(parts))
+            for idx, new_col in enumerate(new_columns):
+                if idx < len(split_data.columns):
+                    df[new_col.strip()] = split_data[idx]
+    
+    def _apply_mathematical(self, df: pd.DataFrame, operation: Dict[str, Any],
+                            inplace: bool = False) -> pd.DataFrame:
         """Apply mathematical operations."""
         op_name = operation.get('operation')
-        result_df = df.copy()
+        result_df = df if inplace else df.copy()
+        
+        if op_name == "Formula":
+            # Compiled once per formula set; all outputs are computed before any is written
+            program = compile_formulas(formula_pairs(operation))
+            for column, values in program.evaluate(result_df).items():
+                result_df[column] = values
         
-        if op_name == "Add Columns":
+        elif op_name == "Add Columns":
             col1 = operation.get('col1')
             col2 = operation.get('col2')
             result_col = operation.get('result_column')
-            result_df[result_col] = result_df[col1] + result_df[col2]
+            result_df[result_col] = self._widen(result_df[col1]) + self._widen(result_df[col2])
         
         elif op_name == "Subtract Columns":
             col1 = operation.get('col1')
             col2 = operation.get('col2')
             result_col = operation.get('result_column')
-            result_df[result_col] = result_df[col1] - result_df[col2]
+            result_df[result_col] = self._widen(result_df[col1]) - self._widen(result_df[col2])
         
         elif op_name == "Multiply Columns":
             col1 = operation.get('col1')
             col2 = operation.get('col2')
             result_col = operation.get('result_column')
-            result_df[result_col] = result_df[col1] * result_df[col2]
+            result_df[result_col] = self._widen(result_df[col1]) * self._widen(result_df[col2])
         
         elif op_name == "Divide Columns":
             col1 = operation.get('col1')
             col2 = operation.get('col2')
             result_col = operation.get('result_column')
-            result_df[result_col] = result_df[col1] / result_df[col2]
+            result_df[result_col] = self._widen(result_df[col1]) / self._widen(result_df[col2])
         
         elif op_name == "Sum":
             columns = operation.get('columns', [])
@@ -227,7 +696,8 @@ class DataTransformer:
             col1 = operation.get('col1')
             col2 = operation.get('col2')
             result_col = operation.get('result_column')
-            result_df[result_col] = ((result_df[col2] - result_df[col1]) / result_df[col1]) * 100
+            base = self._widen(result_df[col1])
+            result_df[result_col] = ((self._widen(result_df[col2]) - base) / base) * 100
         
         elif op_name == "Conditional Calculation":
             condition_col = operation.get('condition_col')
@@ -253,56 +723,145 @@ class DataTransformer:
             else:
                 condition = pd.Series([False] * len(result_df))
             
+            if condition.dtype != bool:
+                # Nullable columns give <NA> for missing values, treat as False
+                condition = condition.fillna(False).astype(bool)
+            
             result_df[result_col] = np.where(condition, true_value, false_value)
         
         return result_df
     
-    def _apply_text_operations(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
-        """Apply text operations."""
-        op_name = operation.get('operation')
-        column = operation.get('column')
-        result_df = df.copy()
-        
-        if op_name == "Lowercase":
-            result_df[column] = result_df[column].astype(str).str.lower()
-        
-        elif op_name == "Uppercase":
-            result_df[column] = result_df[column].astype(str).str.upper()
+    @staticmethod
+    def _widen(series: pd.Series) -> pd.Series:
+        """
+        Upcast downcast numeric columns to 64 bits before arithmetic.
         
-        elif op_name == "Title Case":
-            result_df[column] = result_df[column].astype(str).str.title()
+        Columns shrunk by DtypeOptimizer (int8, float32, Int16, ...) would
+        otherwise overflow or lose precision in the result.
+        """
+        dtype = series.dtype
+        if dtype.kind not in 'iuf' or dtype.itemsize >= 8:
+            return series
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            return series.astype('Float64' if dtype.kind == 'f' else 'Int64')
+        return series.astype(np.float64 if dtype.kind == 'f' else np.int64)
+    
+    def _apply_text_operations(self, df: pd.DataFrame, operation: Dict[str, Any],
+                               inplace: bool = False) -> pd.DataFrame:
+        """
+        Apply text operations.
         
-        elif op_name == "Trim Spaces":
-            result_df[column] = result_df[column].astype(str).str.strip()
+        Missing values stay missing (see text_engine.transform_text). A chain
+        fused by QueryPlanner lists its operations in 'steps' and runs in one
+        pass over the column. Extract Pattern writes to 'result_column' if
+        given; a column nothing changes in is left as it is.
+        """
+        column = operation.get('column')
+        result_col = operation.get('result_column') or column
+        result_df = df if inplace else df.copy()
         
-        elif op_name == "Replace Text":
-            old_text = operation.get('old_text')
-            new_text = operation.get('new_text')
-            result_df[column] = result_df[column].astype(str).str.replace(old_text, new_text, regex=False)
+        source = result_df[column]
+        transformed = transform_text(source, operation.get('steps') or [operation])
+        if transformed is not source or result_col != column:
+            result_df[result_col] = transformed
         
         return result_df
     
-    def _apply_date_operations(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
-        """Apply date operations."""
+    def _apply_date_operations(self, df: pd.DataFrame, operation: Dict[str, Any],
+                               inplace: bool = False) -> pd.DataFrame:
+        """
+        Apply date operations.
+        
+        Columns are parsed by self.date_parser, which infers a format once
+        per column and keeps the parsed column for later operations. The
+        result replaces the column unless 'result_column' is given.
+        """
         op_name = operation.get('operation')
         column = operation.get('column')
-        result_df = df.copy()
+        result_col = operation.get('result_column') or column
+        result_df = df if inplace else df.copy()
         
         if op_name == "Convert to Date":
             date_format = operation.get('format', '%Y-%m-%d')
-            result_df[column] = pd.to_datetime(result_df[column], format=date_format, errors='coerce')
+            result_df[result_col] = pd.to_datetime(result_df[column], format=date_format, errors='coerce')
         
         elif op_name == "Extract Year":
-            result_df[column] = pd.to_datetime(result_df[column], errors='coerce').dt.year
+            result_df[result_col] = self.date_parser.parse(result_df[column]).dt.year
         
         elif op_name == "Extract Month":
-            result_df[column] = pd.to_datetime(result_df[column], errors='coerce').dt.month
+            result_df[result_col] = self.date_parser.parse(result_df[column]).dt.month
         
         elif op_name == "Extract Day":
-            result_df[column] = pd.to_datetime(result_df[column], errors='coerce').dt.day
+            result_df[result_col] = self.date_parser.parse(result_df[column]).dt.day
         
         elif op_name == "Format Date":
             output_format = operation.get('output_format', '%Y-%m-%d')
-            result_df[column] = pd.to_datetime(result_df[column], errors='coerce').dt.strftime(output_format)
+            result_df[result_col] = self.date_parser.format_dates(self.date_parser.parse(result_df[column]),
+                                                                  output_format)
         
         return result_df
+    
+    def _apply_merge_operations(self, df: pd.DataFrame, operation: Dict[str, Any],
+                                inplace: bool = False) -> pd.DataFrame:
+        """
+        Apply merge operations, reading other sheets from self.sources.
+        
+        Lookup Values and Join Sheet probe a JoinIndex of the source sheet
+        that is built once per source and key columns (see JoinIndexCache).
+        """
+        op_name = operation.get('operation')
+        
+        if op_name == "Stack Sheets":
+            parts = [((source.get('file'), source.get('sheet')), self._source(source))
+                     for source in operation.get('sources', [])]
+            return stack_sheets(df, parts, (operation.get('file'), operation.get('sheet')),
+                                operation.get('source_column') or None)
+        
+        if op_name in ("Lookup Values", "Join Sheet"):
+            source_ref = operation.get('source') or {}
+            source = self._source(source_ref)
+            left_on = operation.get('left_on', [])
+            right_on = operation.get('right_on') or left_on
+            if not left_on or len(left_on) != len(right_on):
+                raise ValueError("Key columns of both sheets must be given and match in number")
+            index = self.index_cache.get((source_ref.get('file'), source_ref.get('sheet')), source, right_on)
+            if op_name == "Lookup Values":
+                columns = operation.get('columns') or [col for col in source.columns if col not in right_on]
+                return lookup_values(df, source, index, left_on, columns, inplace)
+            return join_sheet(df, source, index, left_on, operation.get('how', 'left'),
+                              operation.get('suffix', '_right'))
+        
+        logger.warning(f"Unknown merge operation: {op_name}")
+        return df if inplace else df.copy()
+    
+    def _source(self, source: Dict[str, Any]) -> pd.DataFrame:
+        """Return a source sheet, raising ValueError if it was not provided."""
+        key = (source.get('file'), source.get('sheet'))
+        if key not in self.sources:
+            raise ValueError(f"Source sheet '{key[0]}/{key[1]}' is not available")
+        return self.sources[key]
+    
+    def _apply_aggregation(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
+        """Apply Group By and Pivot Table, returning the aggregated table."""
+        aggregator = self._aggregator(operation)
+        return self._finish_aggregation(operation, aggregator, aggregator.partial(df))
+    
+    @staticmethod
+    def _aggregator(operation: Dict[str, Any]) -> GroupAggregator:
+        """Build the GroupAggregator of an aggregation operation."""
+        if operation.get('operation') == "Pivot Table":
+            keys = list(operation.get('index', [])) + [operation.get('pivot_column')]
+        else:
+            keys = operation.get('keys', [])
+        return GroupAggregator(keys, operation.get('aggregations', []))
+    
+    @staticmethod
+    def _finish_aggregation(operation: Dict[str, Any], aggregator: GroupAggregator,
+                            partial: PartialAggregate) -> pd.DataFrame:
+        """Turn the partial aggregate of all rows into the operation's result table."""
+        result_df = aggregator.finalize(partial)
+        if operation.get('operation') == "Pivot Table":
+            names = [aggregation_name(spec) for spec in aggregator.aggregations]
+            result_df = pivot(result_df, list(operation.get('index', [])), operation.get('pivot_column'),
+                              names, operation.get('fill_value'))
+        return result_df
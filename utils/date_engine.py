@@ -0,0 +1,312 @@
+"""
+Date Engine Module
+Vectorized date parsing with cached format inference and Excel serial numbers.
+"""
+
+from typing import Any, Optional, Sequence, Tuple
+import logging
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+logger = logging.getLogger(__name__)
+
+# Day 0 of Excel's 1900 date system (serial 1 is 1900-01-01; correct from March 1900 on)
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+# Serial number of 9999-12-31, the last date Excel can show
+MAX_EXCEL_SERIAL = 2958465
+
+SAMPLE_SIZE = 1000     # Text values a format is inferred from
+GUESS_LIMIT = 20       # Distinct sample values format guesses are taken from
+MAX_FORMATS = 4        # Formats tried per column before falling back to per-value parsing
+PARSED_CACHE_SIZE = 4  # Parsed columns kept for later operations
+
+# Fixed-width numeric fields read by parse_fixed_width, with their widths
+FIXED_WIDTH_FIELDS = {'Y': 4, 'm': 2, 'd': 2, 'H': 2, 'M': 2, 'S': 2}
+
+
+def excel_serial_to_datetime(values: Any) -> pd.Series:
+    """
+    Convert Excel serial day numbers to datetimes.
+
+    Args:
+        values: Numbers of days since EXCEL_EPOCH, with the time of day as
+            the fraction
+
+    Returns:
+        pd.Series: datetime64 values rounded to the millisecond; NaT for
+            missing values and numbers outside Excel's date range
+    """
+    days = pd.Series(values, dtype='float64')
+    days = days.where((days >= 0) & (days <= MAX_EXCEL_SERIAL))
+    return pd.to_datetime(days, unit='D', origin=EXCEL_EPOCH).dt.round('ms')
+
+
+def _fixed_width_layout(date_format: str) -> Optional[Tuple[int, list, list]]:
+    """Split a format into (width, [(directive, start)], [(character, position)]), or None if not fixed-width."""
+    fields, literals = [], []
+    position = idx = 0
+    while idx < len(date_format):
+        if date_format[idx] == '%':
+            directive = date_format[idx + 1:idx + 2]
+            if directive not in FIXED_WIDTH_FIELDS or directive in (name for name, _ in fields):
+                return None
+            fields.append((directive, position))
+            position += FIXED_WIDTH_FIELDS[directive]
+            idx += 2
+        else:
+            literals.append((date_format[idx], position))
+            position += 1
+            idx += 1
+    return (position, fields, literals) if {'Y', 'm', 'd'} <= {name for name, _ in fields} else None
+
+
+def parse_fixed_width(values: np.ndarray, date_format: str) -> Optional[np.ndarray]:
+    """
+    Parse strings of a fixed-width, all-numeric format with array arithmetic.
+
+    Formats such as '%d/%m/%Y' or '%Y-%m-%d %H:%M:%S' are read by slicing
+    the digits out of a character array, which is much faster than
+    strptime. Values of the wrong length, with other characters or with
+    out-of-range fields are not read.
+
+    Args:
+        values: Date strings
+        date_format: strptime format made of %Y, %m, %d, %H, %M, %S and
+            literal characters
+
+    Returns:
+        datetime64[ns] array with NaT for unread values, or None if the
+        format is not fixed-width
+    """
+    layout = _fixed_width_layout(date_format)
+    if layout is None:
+        return None
+    width, fields, literals = layout
+
+    result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    # One extra character tells values of the right length (padded with NUL) from longer ones
+    chars = np.asarray(values, dtype=f'U{width + 1}').view(np.uint32).reshape(len(values), width + 1)
+
+    valid = (chars[:, width] == 0) & (chars[:, width - 1] != 0)
+    for character, position in literals:
+        valid &= chars[:, position] == ord(character)
+    parts = {}
+    for directive, start in fields:
+        digits = chars[:, start:start + FIXED_WIDTH_FIELDS[directive]].astype(np.int64) - ord('0')
+        valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+        parts[directive] = digits @ (10 ** np.arange(digits.shape[1] - 1, -1, -1))
+
+    months = (parts['Y'] - 1970) * 12 + parts['m'] - 1
+    # Months and years outside what datetime64[ns] can hold are not read either
+    valid &= (parts['m'] >= 1) & (parts['m'] <= 12) & (parts['d'] >= 1) & (parts['Y'] >= 1678) & (parts['Y'] <= 2261)
+    month_start = np.where(valid, months, 0).astype('datetime64[M]')
+    month_days = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    valid &= parts['d'] <= month_days
+    valid &= (parts.get('H', 0) <= 23) & (parts.get('M', 0) <= 59) & (parts.get('S', 0) <= 59)
+
+    seconds = parts.get('H', 0) * 3600 + parts.get('M', 0) * 60 + parts.get('S', 0)
+    dates = (month_start.astype('datetime64[D]') + (parts['d'] - 1)).astype('datetime64[s]') + seconds
+    result[valid] = dates[valid].astype('datetime64[ns]')
+    return result
+
+
+def infer_date_format(values: Sequence[str]) -> Optional[str]:
+    """
+    Find the strptime format that parses most of a sample of date strings.
+
+    Candidates are guessed from the first GUESS_LIMIT distinct values,
+    both month-first and day-first, so '03/04/2024' next to '25/04/2024'
+    is read day-first. Ties go to the month-first reading.
+
+    Args:
+        values: Sample of non-empty date strings
+
+    Returns:
+        The best format, or None if no guess parses any value
+    """
+    sample = pd.Series(values, dtype=object)
+    candidates = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for value in pd.unique(sample)[:GUESS_LIMIT]:
+            for dayfirst in (False, True):
+                date_format = guess_datetime_format(str(value).strip(), dayfirst=dayfirst)
+                if date_format and date_format not in candidates:
+                    candidates.append(date_format)
+
+    best_format, best_count = None, 0
+    for date_format in candidates:
+        count = int(pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum())
+        if count > best_count:
+            best_format, best_count = date_format, count
+    return best_format
+
+
+class DateParser:
+    """
+    Parses date columns without per-value inference.
+
+    Text is parsed with formats inferred from a sample: the format that
+    reads most of the sample is applied to the whole column in one
+    vectorized pass, and values it cannot read get formats inferred from
+    what is left, up to MAX_FORMATS. Only values no format reads are parsed
+    one distinct value at a time. Formats are cached per column name, so
+    later operations, sheets and chunks of a stream reuse them, and numbers
+    are read as Excel serial dates.
+
+    The last parsed columns are kept too, so several operations reading the
+    same unchanged column (e.g. Extract Year and Extract Month into new
+    columns) parse it once. A cached column is matched by the memory of its
+    values array, which this parser keeps alive; columns are replaced, not
+    written in place, when operations change them.
+
+    Attributes:
+        formats (dict): Column name -> formats found so far, in order of use
+    """
+
+    def __init__(self):
+        """Initialize an empty DateParser."""
+        self.formats = {}
+        self._parsed = []
+
+    def parse(self, series: pd.Series) -> pd.Series:
+        """
+        Convert a column to datetime64, like pd.to_datetime(errors='coerce').
+
+        Args:
+            series: Column of datetimes, date strings, Excel serial numbers
+                or a mix of them
+
+        Returns:
+            pd.Series: datetime64 values with the index of series (NaT where
+                a value is missing or unreadable)
+        """
+        if is_datetime64_any_dtype(series.dtype):
+            return series
+
+        values = series.to_numpy()
+        key = self._cache_key(values)
+        for cached_key, _, parsed in self._parsed:
+            if cached_key == key:
+                return parsed.set_axis(series.index)
+
+        parsed = self._parse(series)
+        self._parsed = [(key, values, parsed)] + self._parsed[:PARSED_CACHE_SIZE - 1]
+        return parsed
+
+    @staticmethod
+    def _cache_key(values: np.ndarray) -> Tuple[int, Tuple[int, ...], Any, str]:
+        """Identify an array by its memory, shape and type."""
+        interface = values.__array_interface__
+        return interface['data'][0], interface['shape'], interface['strides'], interface['typestr']
+
+    def _parse(self, series: pd.Series) -> pd.Series:
+        """Parse a column that is not datetime64 yet."""
+        if is_numeric_dtype(series.dtype) and not is_bool_dtype(series.dtype):
+            return excel_serial_to_datetime(series.to_numpy(dtype='float64', na_value=np.nan)).set_axis(series.index)
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Parse every category once
+            categories = self._parse(pd.Series(series.cat.categories, name=series.name, dtype=object))
+            codes = series.cat.codes.to_numpy()
+            parsed = categories.to_numpy(dtype='datetime64[ns]')
+            result = parsed[codes] if len(parsed) else np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+            result[codes < 0] = np.datetime64('NaT')
+            return pd.Series(result, index=series.index)
+
+        values = series.to_numpy(dtype=object)
+        kind = infer_dtype(values, skipna=True)
+        if kind == 'string':
+            return pd.Series(self._parse_text(values, series.name), index=series.index)
+        if kind in ('datetime', 'datetime64', 'date', 'empty'):
+            return pd.to_datetime(series, errors='coerce')
+
+        # Mixed cells, as openpyxl returns them: datetimes, serial numbers and text
+        result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+        is_number = np.fromiter((isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+                                 for value in values), dtype=bool, count=len(values))
+        others = ~is_text & ~is_number & ~pd.isna(values)
+        if is_text.any():
+            result[is_text] = self._parse_text(values[is_text], series.name)
+        if is_number.any():
+            result[is_number] = excel_serial_to_datetime(values[is_number].astype('float64')).to_numpy()
+        if others.any():
+            result[others] = pd.to_datetime(pd.Series(values[others]), errors='coerce').to_numpy(dtype='datetime64[ns]')
+        return pd.Series(result, index=series.index)
+
+    def _parse_text(self, values: np.ndarray, column: Any) -> np.ndarray:
+        """Parse date strings with the cached and newly inferred formats of a column."""
+        # Dates repeat a lot; every distinct string is parsed once
+        codes, uniques = pd.factorize(values)
+        text = pd.Series(uniques, dtype=object)
+        parsed = np.full(len(text), np.datetime64('NaT'), dtype='datetime64[ns]')
+        pending = np.ones(len(text), dtype=bool)
+        formats = self.formats.setdefault(column, [])
+
+        tried = []
+        while pending.any() and len(tried) < MAX_FORMATS:
+            date_format = next((known for known in formats if known not in tried), None)
+            if date_format is None:
+                candidates = text[pending]
+                # Spread the sample over the column; its first rows often share a day or month
+                sample = candidates.iloc[np.linspace(0, len(candidates) - 1, min(SAMPLE_SIZE, len(candidates))).astype(int)]
+                date_format = infer_date_format(sample.tolist())
+                if date_format is None or date_format in tried:
+                    break
+                formats.append(date_format)
+                logger.info(f"Inferred date format '{date_format}' for column '{column}'")
+            tried.append(date_format)
+            attempt = self._parse_format(text[pending], date_format)
+            readable = ~np.isnat(attempt)
+            positions = np.flatnonzero(pending)[readable]
+            parsed[positions] = attempt[readable]
+            pending[positions] = False
+
+        if pending.any():
+            # No format fits these; let pandas work each one out
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                parsed[pending] = pd.to_datetime(text[pending], format='mixed',
+                                                 errors='coerce').to_numpy(dtype='datetime64[ns]')
+
+        result = parsed[codes] if len(parsed) else np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+        result[codes < 0] = np.datetime64('NaT')
+        return result
+
+    @staticmethod
+    def _parse_format(text: pd.Series, date_format: str) -> np.ndarray:
+        """Parse strings with one format, reading fixed-width values without strptime."""
+        attempt = parse_fixed_width(text.to_numpy(), date_format)
+        if attempt is None:
+            return pd.to_datetime(text, format=date_format, errors='coerce').to_numpy(dtype='datetime64[ns]')
+        # strptime also reads unpadded numbers ('1/2/2024'), and is left what the fast path did not read
+        unread = np.isnat(attempt)
+        if unread.any():
+            attempt[unread] = pd.to_datetime(text[unread], format=date_format,
+                                             errors='coerce').to_numpy(dtype='datetime64[ns]')
+        return attempt
+
+    def format_dates(self, parsed: pd.Series, output_format: str) -> pd.Series:
+        """
+        Format datetimes as text, formatting every distinct date once.
+
+        Args:
+            parsed: datetime64 column
+            output_format: strftime format
+
+        Returns:
+            pd.Series: Formatted strings, NaN where parsed is NaT
+        """
+        codes, uniques = pd.factorize(parsed)
+        formatted = np.asarray(pd.DatetimeIndex(uniques).strftime(output_format), dtype=object)
+        result = np.where(codes >= 0, formatted[codes] if len(formatted) else None, np.nan)
+        return pd.Series(result, index=parsed.index, dtype=object)
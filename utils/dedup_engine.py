@@ -0,0 +1,332 @@
+"""
+Dedup Engine Module
+Hash-based duplicate removal for single frames, chunk streams and many files.
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (is_bool_dtype, is_datetime64_any_dtype, is_integer_dtype, is_numeric_dtype,
+                              is_timedelta64_dtype)
+
+logger = logging.getLogger(__name__)
+
+# Fingerprint of a missing value (None, NaN, NaT, pd.NA) in any column
+MISSING_HASH = np.uint64(0x9E3779B97F4A7C15)
+# Salt for integers too large to be represented exactly as float64
+LARGE_INT_SALT = np.uint64(0xD6E8FEB86659FD93)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """Scramble uint64 hashes (splitmix64 finalizer) so structured inputs spread over all bits."""
+    values = values ^ (values >> np.uint64(30))
+    values *= np.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(0x94D049BB133111EB)
+    values ^= values >> np.uint64(31)
+    return values
+
+
+class FingerprintSet:
+    """
+    Set of uint64 fingerprints stored as a few sorted arrays.
+
+    Takes 8 bytes per fingerprint instead of a Python int in a set. New
+    fingerprints are added as a sorted run, and runs of similar length are
+    merged, so there are only O(log n) runs to binary-search per lookup.
+    """
+
+    def __init__(self):
+        """Initialize an empty FingerprintSet."""
+        self._runs = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    def contains(self, fingerprints: np.ndarray) -> np.ndarray:
+        """Return a boolean mask of the fingerprints that are in the set."""
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run in self._runs:
+            positions = np.searchsorted(run, fingerprints)
+            positions[positions == len(run)] = 0
+            found |= run[positions] == fingerprints
+        return found
+
+    def add(self, fingerprints: np.ndarray):
+        """Add fingerprints that are unique and not in the set yet."""
+        if not len(fingerprints):
+            return
+        run = np.sort(fingerprints)
+        while self._runs and len(self._runs[-1]) <= 2 * len(run):
+            # Both runs are sorted, so the stable sort only merges them
+            run = np.sort(np.concatenate([self._runs.pop(), run]), kind='stable')
+        self._runs.append(run)
+
+
+class DedupEngine:
+    """
+    Removes duplicate rows by comparing 64-bit row fingerprints.
+
+    Every subset column is hashed to one uint64 per row and the columns are
+    combined into a row fingerprint; duplicates are then found with a single
+    hash table lookup on those integers. Unlike drop_duplicates, no column
+    is factorized, and fingerprints of earlier chunks or files can be kept
+    to dedup against them later.
+
+    Two different rows get the same fingerprint with a probability of about
+    n² / 2⁶⁵ (below one in a million for 5 million rows); such a row would
+    be removed as a duplicate.
+    """
+
+    def fingerprints(self, df: pd.DataFrame, columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Hash the given columns of every row into a uint64 fingerprint.
+
+        Numeric columns are hashed as float64 so equal values hash the same
+        even when chunks or files were inferred with different dtypes (int
+        vs float); integers beyond float64 precision (above 2^53) hash
+        their integer bits instead, so large IDs stay distinct. Other columns use Python's hash of each value, which is
+        cached on string objects and follows Python equality (1 == 1.0,
+        1 != '1'), like drop_duplicates. Categorical columns hash their
+        categories once. Missing values of any kind are equal.
+
+        Python salts string hashes per process, so only compare
+        fingerprints computed in the same process.
+
+        Args:
+            df: Frame to hash
+            columns: Columns to compare, defaults to all columns
+
+        Returns:
+            np.ndarray: One uint64 per row
+        """
+        subset = df[list(columns)] if columns else df
+        fingerprint = np.full(len(subset), 0x345678, dtype=np.uint64)
+        for _, series in subset.items():
+            fingerprint = _mix(fingerprint ^ self._column_hashes(series))
+        return fingerprint
+
+    def _column_hashes(self, series: pd.Series) -> np.ndarray:
+        """Hash every value of one column into a uint64."""
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            categories = self._object_hashes(np.asarray(series.cat.categories, dtype=object))
+            # Code -1 (missing) picks the sentinel appended last
+            return np.append(categories, MISSING_HASH)[series.cat.codes.to_numpy()]
+        if is_integer_dtype(dtype):
+            return self._integer_hashes(series)
+        if is_numeric_dtype(dtype) or is_bool_dtype(dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            # Fold -0.0 into 0.0 and every NaN into the missing hash
+            hashes = _mix((values + 0.0).view(np.uint64))
+            hashes[np.isnan(values)] = MISSING_HASH
+            return hashes
+        if is_datetime64_any_dtype(dtype) or is_timedelta64_dtype(dtype):
+            hashes = _mix(series.to_numpy().view(np.int64).astype(np.uint64))
+            hashes[series.isna().to_numpy()] = MISSING_HASH
+            return hashes
+        return self._object_hashes(series.to_numpy(dtype=object))
+
+    @staticmethod
+    def _integer_hashes(series: pd.Series) -> np.ndarray:
+        """Hash integers like the equal float64 where one exists, else by their integer bits."""
+        target = np.uint64 if series.dtype.kind == 'u' else np.int64
+        ints = series.to_numpy(dtype=target, na_value=0)
+        floats = ints.astype(np.float64)
+        with np.errstate(invalid='ignore'):
+            inexact = floats.astype(target) != ints
+        hashes = _mix((floats + 0.0).view(np.uint64))
+        hashes[inexact] = _mix(ints[inexact].view(np.uint64) ^ LARGE_INT_SALT)
+        hashes[series.isna().to_numpy()] = MISSING_HASH
+        return hashes
+
+    @staticmethod
+    def _object_hashes(values: np.ndarray) -> np.ndarray:
+        """Hash Python objects with hash(), mapping missing values to MISSING_HASH."""
+        hashes = np.fromiter(map(hash, values), dtype=np.int64, count=len(values)).view(np.uint64)
+        hashes = _mix(hashes)
+        hashes[pd.isna(values)] = MISSING_HASH
+        return hashes
+
+    @staticmethod
+    def keep_mask(fingerprints: np.ndarray, keep: Any = 'first') -> np.ndarray:
+        """
+        Return a boolean mask of the rows to keep.
+
+        Args:
+            fingerprints: Row fingerprints
+            keep: 'first' or 'last' occurrence to keep, or False to drop
+                every row that has a duplicate
+
+        Returns:
+            np.ndarray: True for rows that are kept
+        """
+        return ~pd.Series(fingerprints).duplicated(keep=keep).to_numpy()
+
+    def drop_duplicates(self, df: pd.DataFrame, columns: Optional[Sequence[str]] = None,
+                        keep: Any = 'first') -> Tuple[pd.DataFrame, int]:
+        """
+        Remove duplicate rows from a frame.
+
+        Args:
+            df: Input frame (not modified)
+            columns: Columns to compare, defaults to all columns
+            keep: 'first', 'last' or False (see keep_mask)
+
+        Returns:
+            Tuple of the deduplicated frame (a new frame, rows in their
+            original order) and the number of rows removed
+        """
+        mask = self.keep_mask(self.fingerprints(df, columns), keep)
+        result = df.take(np.flatnonzero(mask))
+        return result, len(df) - len(result)
+
+    def drop_duplicates_across(self, frames: List[pd.DataFrame], columns: Optional[Sequence[str]] = None,
+                               keep: Any = 'first') -> Tuple[List[pd.DataFrame], List[int]]:
+        """
+        Remove duplicate rows across several frames, e.g. the same sheet of many files.
+
+        The frames are treated as one table in list order, so with
+        keep='first' a row survives only in the first frame it appears in.
+        Only fingerprints are combined; the frames are never concatenated.
+
+        Args:
+            frames: Frames with the compared columns
+            columns: Columns to compare, defaults to all columns of each frame
+            keep: 'first', 'last' or False (see keep_mask)
+
+        Returns:
+            Tuple of the deduplicated frames and the rows removed from each
+        """
+        fingerprints = [self.fingerprints(df, columns) for df in frames]
+        if not fingerprints:
+            return [], []
+        mask = self.keep_mask(np.concatenate(fingerprints), keep)
+        results, removed = [], []
+        offset = 0
+        for df in frames:
+            frame_mask = mask[offset:offset + len(df)]
+            offset += len(df)
+            results.append(df.take(np.flatnonzero(frame_mask)))
+            removed.append(len(df) - int(frame_mask.sum()))
+        return results, removed
+
+
+class StreamingDeduplicator:
+    """
+    Removes duplicate rows from a stream of chunks, keeping first occurrences.
+
+    Fingerprints of every kept row are remembered in a FingerprintSet, so
+    memory grows by 8 bytes per distinct row rather than with the chunks.
+
+    Attributes:
+        columns (list): Columns to compare, None for all columns
+        removed (int): Rows removed so far
+    """
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, engine: Optional[DedupEngine] = None):
+        """
+        Initialize StreamingDeduplicator.
+
+        Args:
+            columns: Columns to compare, defaults to all columns
+            engine: DedupEngine used for hashing
+        """
+        self.columns = list(columns) if columns else None
+        self.removed = 0
+        self._engine = engine or DedupEngine()
+        self._seen = FingerprintSet()
+
+    def process(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return the rows of chunk not seen in this or an earlier chunk.
+
+        Args:
+            chunk: Next chunk of the stream
+
+        Returns:
+            pd.DataFrame: New rows, in their original order
+        """
+        fingerprints = self._engine.fingerprints(chunk, self.columns)
+        mask = self._engine.keep_mask(fingerprints, 'first') & ~self._seen.contains(fingerprints)
+        self._seen.add(fingerprints[mask])
+        kept = int(mask.sum())
+        self.removed += len(chunk) - kept
+        return chunk if kept == len(chunk) else chunk.take(np.flatnonzero(mask))
+
+
+def _collapse(keys: np.ndarray, last: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sort fingerprints and merge equal ones, keeping the latest position and the total count."""
+    order = np.argsort(keys, kind='stable')
+    keys, last, counts = keys[order], last[order], counts[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    if len(starts) == len(keys):
+        return keys, last, counts
+    return keys[starts], np.maximum.reduceat(last, starts), np.add.reduceat(counts, starts)
+
+
+class DuplicateScan:
+    """
+    First pass of streaming duplicate removal that keeps the last or no occurrence.
+
+    Neither can decide on a row before the rest of the stream is known, so
+    the stream is read twice: add() records how often every fingerprint
+    occurs and the last row position it occurs at, then keep_mask() selects
+    rows while the same stream is read again. Like FingerprintSet, the
+    records are kept in sorted runs that are merged as they grow, taking
+    24 bytes per distinct row.
+
+    Attributes:
+        columns (list): Columns to compare, None for all columns
+        rows (int): Rows scanned
+    """
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, engine: Optional[DedupEngine] = None):
+        """
+        Initialize DuplicateScan.
+
+        Args:
+            columns: Columns to compare, defaults to all columns
+            engine: DedupEngine used for hashing
+        """
+        self.columns = list(columns) if columns else None
+        self.rows = 0
+        self._engine = engine or DedupEngine()
+        self._runs = []
+
+    def add(self, chunk: pd.DataFrame):
+        """Record the rows of the next chunk of the stream."""
+        fingerprints = self._engine.fingerprints(chunk, self.columns)
+        positions = np.arange(self.rows, self.rows + len(chunk), dtype=np.int64)
+        self.rows += len(chunk)
+        run = _collapse(fingerprints, positions, np.ones(len(chunk), dtype=np.int64))
+        while self._runs and len(self._runs[-1][0]) <= 2 * len(run[0]):
+            previous = self._runs.pop()
+            run = _collapse(*(np.concatenate([old, new]) for old, new in zip(previous, run)))
+        self._runs.append(run)
+
+    def keep_mask(self, chunk: pd.DataFrame, start: int, keep: Any = 'last') -> np.ndarray:
+        """
+        Return a boolean mask of the rows of a chunk to keep on the second pass.
+
+        Args:
+            chunk: Chunk of the stream, as passed to add() before
+            start: Position of its first row in the stream
+            keep: 'last', or False to drop every row that has a duplicate
+
+        Returns:
+            np.ndarray: True for rows that are kept
+        """
+        while len(self._runs) > 1:
+            run = self._runs.pop()
+            self._runs.append(_collapse(*(np.concatenate([old, new]) for old, new in zip(self._runs.pop(), run))))
+        keys, last, counts = self._runs[0] if self._runs else (np.empty(0, dtype=np.uint64),) * 3
+        fingerprints = self._engine.fingerprints(chunk, self.columns)
+        slots = np.searchsorted(keys, fingerprints)
+        if len(fingerprints) and ((slots >= len(keys)).any() or (keys[slots] != fingerprints).any()):
+            raise ValueError("The stream changed between the duplicate scan and the second pass")
+        if keep == 'last':
+            return last[slots] == np.arange(start, start + len(chunk))
+        return counts[slots] == 1
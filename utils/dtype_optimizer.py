@@ -0,0 +1,148 @@
+"""
+Dtype Optimizer Module
+Shrinks loaded sheets by choosing compact dtypes per column.
+"""
+
+from typing import Any, Dict, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from utils.memory import frame_nbytes
+
+logger = logging.getLogger(__name__)
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORICAL_RATIO = 0.5
+
+NULLABLE_INTEGER_DTYPES = ['Int8', 'Int16', 'Int32', 'Int64']
+
+
+def arrow_strings_available() -> bool:
+    """Return True if pyarrow can be imported for Arrow-backed string columns."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class DtypeOptimizer:
+    """
+    Converts DataFrame columns to the smallest dtype that holds their values.
+
+    - Text columns with few distinct values become categoricals
+    - Other text columns become Arrow-backed strings (when pyarrow is installed)
+    - Integers are downcast to the smallest integer type that fits
+    - Whole-number floats become integers; with gaps, nullable integers
+    - Other floats become float32 only if that loses no precision
+
+    Mixed-type object columns, booleans and dates are left unchanged.
+
+    Attributes:
+        categorical_ratio (float): Maximum share of distinct values for categoricals
+        use_arrow_strings (bool): Store high-cardinality text as Arrow strings
+    """
+
+    def __init__(self, categorical_ratio: float = CATEGORICAL_RATIO,
+                 use_arrow_strings: bool = True):
+        """
+        Initialize DtypeOptimizer.
+
+        Args:
+            categorical_ratio: Maximum share of distinct values for categoricals
+            use_arrow_strings: Store high-cardinality text as Arrow strings,
+                ignored if pyarrow is not installed
+        """
+        self.categorical_ratio = categorical_ratio
+        self.use_arrow_strings = use_arrow_strings and arrow_strings_available()
+
+    def optimize(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Return an optimized copy of df and a report of the memory saved.
+
+        Args:
+            df: DataFrame to optimize (not modified)
+
+        Returns:
+            Tuple of the optimized DataFrame and a report dict with
+            'bytes_before', 'bytes_after', 'bytes_saved' and 'columns'
+            (column -> {'from': dtype, 'to': dtype} for converted columns)
+        """
+        bytes_before = frame_nbytes(df)
+        columns = {}
+        changes = {}
+
+        for column in df.columns:
+            series = df[column]
+            optimized = self.optimize_column(series)
+            columns[column] = optimized
+            if optimized.dtype != series.dtype:
+                changes[column] = {'from': str(series.dtype), 'to': str(optimized.dtype)}
+
+        result = pd.DataFrame(columns, index=df.index)
+        bytes_after = frame_nbytes(result)
+        report = {
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'bytes_saved': bytes_before - bytes_after,
+            'columns': changes
+        }
+        return result, report
+
+    def optimize_column(self, series: pd.Series) -> pd.Series:
+        """
+        Return series converted to a more compact dtype, or series itself.
+
+        Args:
+            series: Column to optimize
+
+        Returns:
+            pd.Series: Converted column, or the input if nothing fits better
+        """
+        if series.dtype == object:
+            return self._optimize_text(series)
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind == 'i':
+            return pd.to_numeric(series, downcast='integer')
+        if series.dtype == np.float64:
+            return self._optimize_float(series)
+        return series
+
+    def _optimize_text(self, series: pd.Series) -> pd.Series:
+        """Convert an all-text object column to a categorical or Arrow strings."""
+        if pd.api.types.infer_dtype(series, skipna=True) != 'string':
+            return series
+
+        if series.nunique(dropna=True) <= self.categorical_ratio * len(series):
+            return series.astype('category')
+        if self.use_arrow_strings:
+            return series.astype('string[pyarrow]')
+        return series
+
+    @staticmethod
+    def _optimize_float(series: pd.Series) -> pd.Series:
+        """Convert whole-number floats to integers, others to float32 if lossless."""
+        values = series.to_numpy()
+        valid = values[~np.isnan(values)]
+        if len(valid) == 0 or not np.isfinite(valid).all():
+            return series
+
+        if (np.mod(valid, 1) == 0).all():
+            # Python floats compare exactly with the integer bounds
+            low, high = float(valid.min()), float(valid.max())
+            if len(valid) == len(values):
+                if np.iinfo(np.int64).min <= low and high <= np.iinfo(np.int64).max:
+                    return pd.to_numeric(series.astype(np.int64), downcast='integer')
+                return series
+            # Integers with gaps: nullable integers instead of float64
+            for dtype in NULLABLE_INTEGER_DTYPES:
+                info = np.iinfo(dtype.lower())
+                if info.min <= low and high <= info.max:
+                    return series.astype(dtype)
+            return series
+
+        narrowed = values.astype(np.float32)
+        if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+            return series.astype(np.float32)
+        return series
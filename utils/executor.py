@@ -0,0 +1,355 @@
+"""
+Executor Module
+Runs the per-sheet operation chains of many files in parallel.
+"""
+
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+import traceback
+
+import pandas as pd
+
+from utils.data_transformer import DataTransformer
+from utils.dedup_engine import DedupEngine
+from utils.lazy_workbook import LazyWorkbook
+from utils.merge_engine import JoinIndexCache, source_refs
+from utils.query_planner import QueryPlanner
+from utils.result_cache import OperationCache
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionCancelled(Exception):
+    """Raised inside a sheet's operation chain when its run was cancelled."""
+
+
+def resolve_sources(dataframes: Dict[str, Dict[str, pd.DataFrame]],
+                    operations: List[Dict[str, Any]]) -> Dict[Tuple[str, str], pd.DataFrame]:
+    """
+    Collect the sheets that merge operations read from.
+
+    Sources are the sheets as uploaded, before their own operations run.
+    Sheets of a LazyWorkbook are parsed here. Missing sources are left out,
+    so the operation that needs one fails with a clear error.
+
+    Args:
+        dataframes: File name -> sheet name -> DataFrame (or LazyWorkbook)
+        operations: Operations of one or more sheets
+
+    Returns:
+        Dict mapping (file, sheet) to the source DataFrame
+    """
+    sources = {}
+    for operation in operations:
+        for file_name, sheet_name in source_refs(operation):
+            if file_name in dataframes and sheet_name in dataframes[file_name]:
+                sources[(file_name, sheet_name)] = dataframes[file_name][sheet_name]
+    return sources
+
+
+def run_sheet(df: pd.DataFrame, operations: List[Dict[str, Any]], optimize: bool = True,
+              track_memory: bool = False, cache: Optional[OperationCache] = None,
+              input_key: Optional[str] = None,
+              progress_callback: Optional[Callable[[int, int], None]] = None,
+              profile: bool = False, sources: Optional[Dict[Tuple[str, str], pd.DataFrame]] = None,
+              index_cache: Optional[JoinIndexCache] = None) -> Dict[str, Any]:
+    """
+    Run the operation chain of a single sheet.
+
+    Defined at module level so it can be sent to a process pool.
+
+    Args:
+        df: Sheet to transform (not modified)
+        operations: Operations for this sheet, in queue order
+        optimize: Rewrite the chain with QueryPlanner first
+        track_memory: Measure peak memory of the run
+        cache: Optional OperationCache for incremental re-runs
+        input_key: Fingerprint of df for the cache
+        progress_callback: Called as progress_callback(completed, total)
+            between operations of the (planned) chain; may raise
+            ExecutionCancelled to stop
+        profile: Record per-operation measurements in stats['profile']
+        sources: Sheets read by merge operations (see resolve_sources)
+        index_cache: Join indexes shared with the other sheets of a run
+
+    Returns:
+        Dict with the result 'dataframe', run 'stats' and wall time 'seconds'
+    """
+    start = time.perf_counter()
+    if optimize:
+        operations = QueryPlanner().plan(operations)
+
+    transformer = DataTransformer(sources=sources, index_cache=index_cache)
+    result_df = transformer.apply_operations(df, operations, track_memory=track_memory,
+                                             cache=cache, input_key=input_key,
+                                             progress_callback=progress_callback, profile=profile)
+
+    return {
+        'dataframe': result_df,
+        'stats': transformer.last_run_stats,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def stream_sheet(open_chunks: Callable[[], Iterable[pd.DataFrame]], operations: List[Dict[str, Any]],
+                 optimize: bool = True, sources: Optional[Dict[Tuple[str, str], pd.DataFrame]] = None,
+                 index_cache: Optional[JoinIndexCache] = None) -> Tuple[Iterator[pd.DataFrame], DataTransformer]:
+    """
+    Run the operation chain of a sheet chunk by chunk, for sheets larger than memory.
+
+    Nothing runs until the returned chunks are consumed, so passing them to
+    FileHandler.write_excel transforms and writes the sheet incrementally.
+    Operations that need the whole column read the input once more each
+    (see DataTransformer.apply_operations_chunked).
+
+    Args:
+        open_chunks: Function returning a new iterable of the sheet's row
+            chunks on every call, e.g. over FileHandler.iter_excel_chunks
+        operations: Operations for this sheet, in queue order
+        optimize: Rewrite the chain with QueryPlanner first
+        sources: Sheets read by merge operations (see resolve_sources)
+        index_cache: Join indexes shared with the other sheets of a run
+
+    Returns:
+        Tuple of the transformed chunks and the DataTransformer running
+        them, whose last_run_stats are set once the chunks are exhausted
+    """
+    if optimize:
+        operations = QueryPlanner().plan(operations)
+    transformer = DataTransformer(sources=sources, index_cache=index_cache)
+    return transformer.apply_operations_chunked(open_chunks, operations), transformer
+
+
+class ParallelExecutor:
+    """
+    Fans per-sheet operation chains out to a thread or process pool.
+
+    Sheets are independent, so every (file, sheet) pair with operations is
+    one task. A failing sheet is reported in its result instead of aborting
+    the whole run.
+
+    Attributes:
+        max_workers (int): Number of worker threads/processes
+        use_processes (bool): Use a process pool instead of threads
+        optimize (bool): Plan each chain with QueryPlanner before running it
+        track_memory (bool): Measure peak memory per sheet (process-wide when
+            using threads, so concurrent sheets inflate each other's numbers)
+        cache (OperationCache): Memoized operation results, thread pools only
+        profile (bool): Record per-operation measurements in each sheet's stats
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, use_processes: bool = False,
+                 optimize: bool = True, track_memory: bool = False,
+                 cache: Optional[OperationCache] = None, profile: bool = False):
+        """
+        Initialize ParallelExecutor.
+
+        Args:
+            max_workers: Number of workers, defaults to the CPU count
+            use_processes: Use processes (true parallelism, but sheets are pickled)
+            optimize: Plan each chain with QueryPlanner before running it
+            track_memory: Measure peak memory per sheet
+            cache: Optional OperationCache for incremental re-runs. Ignored
+                with processes, which cannot share it.
+            profile: Record per-operation measurements in each sheet's stats
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.optimize = optimize
+        self.track_memory = track_memory
+        self.cache = None if use_processes else cache
+        self.profile = profile
+
+    def run(self, dataframes: Dict[str, Dict[str, pd.DataFrame]], operations: List[Dict[str, Any]],
+            progress_callback: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+            input_keys: Optional[Dict[Tuple[str, str], str]] = None,
+            operation_callback: Optional[Callable[[str, str, int, int], None]] = None,
+            cancel_event: Optional[threading.Event] = None
+            ) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Run the queued operations on every file and sheet.
+
+        Merge operations read their source sheets as uploaded; join indexes
+        are built once per run and shared by all sheets (threads only).
+        Sheets without operations are passed through unchanged without
+        being sent to a worker. Once every sheet has run, Remove Duplicates
+        operations marked 'across_files' also remove rows that duplicate a
+        row of the same sheet in another file (see _dedup_across_files).
+        Sheets of a LazyWorkbook are only loaded if they have operations;
+        the others are returned as LazySheet handles that
+        FileHandler.export_excel copies without parsing.
+
+        Args:
+            dataframes: File name -> sheet name -> DataFrame (or LazyWorkbook)
+            operations: Queued operations, each with 'file' and 'sheet' keys
+            progress_callback: Called in the calling thread as
+                progress_callback(completed, total, result) after each sheet
+            input_keys: (file, sheet) -> fingerprint of the sheet, needed
+                to use the operation cache
+            operation_callback: Called from the worker threads as
+                operation_callback(file, sheet, completed, total) between
+                operations. Not available with processes.
+            cancel_event: Once set, sheets that have not started are
+                skipped and, with threads, running chains stop before their
+                next operation. Their results have status 'cancelled'.
+
+        Returns:
+            Dict mapping (file, sheet) to a result dict with 'file', 'sheet',
+            'status' ('done', 'failed' or 'cancelled'), 'dataframe' (a LazySheet for
+            unloaded pass-through sheets), 'stats', 'seconds', 'error' and
+            'traceback'
+        """
+        results = {}
+        tasks = []
+        input_keys = input_keys or {}
+
+        for file_name, sheets in dataframes.items():
+            for sheet_name in sheets:
+                sheet_ops = [op for op in operations
+                             if op['file'] == file_name and op['sheet'] == sheet_name]
+                if sheet_ops:
+                    tasks.append((file_name, sheet_name, sheets[sheet_name],
+                                  *self._with_source_keys(sheet_ops, input_keys),
+                                  resolve_sources(dataframes, sheet_ops)))
+                else:
+                    untouched = (sheets.sheet(sheet_name) if isinstance(sheets, LazyWorkbook)
+                                 else sheets[sheet_name])
+                    results[(file_name, sheet_name)] = self._make_result(
+                        file_name, sheet_name, status='done', dataframe=untouched)
+
+        total = len(tasks)
+        if not tasks:
+            return results
+
+        index_cache = None if self.use_processes else JoinIndexCache()
+        pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        workers = min(self.max_workers, total)
+        logger.info(f"Running {total} sheet(s) on {workers} {pool_class.__name__} worker(s)")
+
+        with pool_class(max_workers=workers) as pool:
+            futures = {
+                pool.submit(run_sheet, df, sheet_ops, self.optimize, self.track_memory,
+                            self.cache if cacheable else None, input_keys.get((file_name, sheet_name)),
+                            self._sheet_hook(file_name, sheet_name, operation_callback, cancel_event),
+                            self.profile, sources, index_cache): (file_name, sheet_name)
+                for file_name, sheet_name, df, sheet_ops, cacheable, sources in tasks
+            }
+
+            for completed, future in enumerate(as_completed(futures), start=1):
+                file_name, sheet_name = futures[future]
+                if cancel_event is not None and cancel_event.is_set():
+                    # Drop queued sheets; running ones stop at their next operation
+                    for pending in futures:
+                        pending.cancel()
+                try:
+                    output = future.result()
+                    result = self._make_result(file_name, sheet_name, status='done', **output)
+                except (ExecutionCancelled, CancelledError):
+                    result = self._make_result(file_name, sheet_name, status='cancelled')
+                except Exception as e:
+                    logger.error(f"Error processing {file_name}/{sheet_name}: {str(e)}")
+                    result = self._make_result(file_name, sheet_name, status='failed', error=str(e),
+                                               trace=''.join(traceback.format_exception(e)))
+
+                results[(file_name, sheet_name)] = result
+                if progress_callback:
+                    progress_callback(completed, total, result)
+
+        if cancel_event is None or not cancel_event.is_set():
+            self._dedup_across_files(list(dataframes), operations, results)
+        return results
+
+    @staticmethod
+    def _dedup_across_files(file_order: List[str], operations: List[Dict[str, Any]],
+                            results: Dict[Tuple[str, str], Dict[str, Any]]):
+        """
+        Remove rows duplicated across files, after every sheet's chain has run.
+
+        Sheets with the same name whose queues hold the same cross-file
+        Remove Duplicates (same columns and keep) are deduplicated together
+        on their final rows, in upload order, so keep='first' leaves a row in
+        the first file it appears in. Sheets lacking a compared column are
+        left out. Removed rows are added to each sheet's
+        stats['duplicates_removed'].
+        """
+        groups = {}
+        for op in operations:
+            if op.get('across_files') and DataTransformer._is_dedup(op):
+                group = (op['sheet'], tuple(op.get('columns') or ()), op.get('keep', 'first'))
+                members = groups.setdefault(group, [])
+                if op['file'] not in members:
+                    members.append(op['file'])
+
+        engine = DedupEngine()
+        for (sheet_name, columns, keep), members in groups.items():
+            done = [results[(file_name, sheet_name)] for file_name in file_order
+                    if file_name in members and results.get((file_name, sheet_name), {}).get('status') == 'done']
+            if len(done) < 2:
+                continue
+            compared = list(columns) or list(done[0]['dataframe'].columns)
+            done = [result for result in done if set(compared) <= set(result['dataframe'].columns)]
+            frames, removed = engine.drop_duplicates_across([result['dataframe'] for result in done],
+                                                            compared, keep)
+            for result, frame, count in zip(done, frames, removed):
+                result['dataframe'] = frame
+                result['stats']['duplicates_removed'] += count
+                result['stats']['rows_out'] = len(frame)
+            logger.info(f"Removed {sum(removed)} duplicate row(s) across {len(done)} '{sheet_name}' sheet(s)")
+
+    @staticmethod
+    def _with_source_keys(sheet_ops: List[Dict[str, Any]],
+                          input_keys: Dict[Tuple[str, str], str]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Add the fingerprints of merge sources to their operations.
+
+        The operation cache keys a result by its input and the operations
+        before it, so a merge result must also change with its sources.
+
+        Returns:
+            Tuple of the operations and whether the chain can be cached
+            (False if a source has no known fingerprint)
+        """
+        operations = []
+        cacheable = True
+        for op in sheet_ops:
+            refs = source_refs(op)
+            if refs:
+                keys = [input_keys.get(ref) for ref in refs]
+                cacheable = cacheable and all(keys)
+                op = {**op, 'source_keys': keys}
+            operations.append(op)
+        return operations, cacheable
+
+    def _sheet_hook(self, file_name: str, sheet_name: str,
+                    operation_callback: Optional[Callable[[str, str, int, int], None]],
+                    cancel_event: Optional[threading.Event]) -> Optional[Callable[[int, int], None]]:
+        """Build the per-operation progress hook of one sheet (threads only)."""
+        if self.use_processes or (operation_callback is None and cancel_event is None):
+            return None
+
+        def hook(completed: int, total: int):
+            if cancel_event is not None and cancel_event.is_set() and completed < total:
+                raise ExecutionCancelled(f"{file_name}/{sheet_name} was cancelled")
+            if operation_callback:
+                operation_callback(file_name, sheet_name, completed, total)
+        return hook
+
+    @staticmethod
+    def _make_result(file_name: str, sheet_name: str, status: str, dataframe: pd.DataFrame = None,
+                     stats: Dict[str, Any] = None, seconds: float = 0.0, error: str = None,
+                     trace: str = None) -> Dict[str, Any]:
+        """Build a per-sheet result dictionary."""
+        return {
+            'file': file_name,
+            'sheet': sheet_name,
+            'status': status,
+            'dataframe': dataframe,
+            'stats': stats,
+            'seconds': seconds,
+            'error': error,
+            'traceback': trace
+        }
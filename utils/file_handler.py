@@ -4,13 +4,24 @@ Handles file upload, validation, and loading operations.
 """
 
 import pandas as pd
-from typing import Dict, Optional
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional
+import itertools
 import logging
+import tempfile
+import openpyxl
+
+from utils.dtype_optimizer import DtypeOptimizer
+from utils.lazy_workbook import LazySheet, LazyWorkbook
+from utils.memory import frame_nbytes
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Data rows that fit on one .xlsx sheet (1,048,576 rows including the header)
+EXCEL_MAX_ROWS = 1048575
+
 
 class FileHandler:
     """
@@ -41,12 +52,18 @@ class FileHandler:
             logger.error(f"File validation error: {str(e)}")
             return False
     
-    def load_excel(self, file) -> Optional[Dict[str, pd.DataFrame]]:
+    def load_excel(self, file, optimize_dtypes: bool = False) -> Optional[Dict[str, pd.DataFrame]]:
         """
         Load Excel file and return dictionary of DataFrames (one per sheet).
         
+        With optimize_dtypes, every sheet is passed through DtypeOptimizer
+        right after loading and its memory report is stored in
+        df.attrs['dtype_optimization'].
+        
         Args:
             file: Uploaded Excel file object
+            optimize_dtypes: Convert columns to compact dtypes (categoricals,
+                Arrow strings, downcast numerics)
             
         Returns:
             Dict[str, pd.DataFrame]: Dictionary with sheet names as keys and DataFrames as values
@@ -59,14 +76,22 @@ class FileHandler:
             if not self.validate_file(file):
                 raise ValueError(f"Unsupported file format. Supported formats: {self.supported_formats}")
             
-            # Read all sheets
-            excel_file = pd.ExcelFile(file)
+            # Parse the workbook once and read every sheet from that parse,
+            # instead of re-opening the file for each sheet
             dataframes = {}
+            optimizer = DtypeOptimizer() if optimize_dtypes else None
             
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file, sheet_name=sheet_name)
-                dataframes[sheet_name] = df
-                logger.info(f"Loaded sheet '{sheet_name}' with {len(df)} rows and {len(df.columns)} columns")
+            with pd.ExcelFile(file) as excel_file:
+                for sheet_name in excel_file.sheet_names:
+                    df = excel_file.parse(sheet_name)
+                    logger.info(f"Loaded sheet '{sheet_name}' with {len(df)} rows and {len(df.columns)} columns")
+                    
+                    if optimizer is not None:
+                        df, report = optimizer.optimize(df)
+                        df.attrs['dtype_optimization'] = report
+                        logger.info(f"Optimized dtypes of sheet '{sheet_name}': "
+                                    f"{report['bytes_before']} -> {report['bytes_after']} bytes")
+                    dataframes[sheet_name] = df
             
             return dataframes
             
@@ -74,6 +99,302 @@ class FileHandler:
             logger.error(f"Error loading Excel file: {str(e)}")
             raise
     
+    def open_excel(self, file, optimize_dtypes: bool = False) -> LazyWorkbook:
+        """
+        Open an Excel file without parsing its sheets.
+        
+        Only the sheet names are read. Each sheet is parsed the first time
+        it is looked up, so sheets that are never configured or transformed
+        cost nothing beyond the raw file bytes.
+        
+        Args:
+            file: Uploaded Excel file object
+            optimize_dtypes: Convert columns of loaded sheets to compact dtypes
+            
+        Returns:
+            LazyWorkbook: Mapping of sheet name to DataFrame, loaded on demand
+            
+        Raises:
+            ValueError: If file format is not supported
+        """
+        if not self.validate_file(file):
+            raise ValueError(f"Unsupported file format. Supported formats: {self.supported_formats}")
+        
+        try:
+            workbook = LazyWorkbook(file.read(), file.name, optimize_dtypes=optimize_dtypes)
+            logger.info(f"Opened '{file.name}' with {len(workbook)} sheet(s)")
+            return workbook
+        except Exception as e:
+            logger.error(f"Error opening Excel file: {str(e)}")
+            raise
+    
+    def probe_excel(self, file, sample_rows: int = 200) -> Dict[str, Dict[str, Any]]:
+        """
+        Read sheet names, dimensions, headers and a small sample of every sheet.
+        
+        Meant for configuration screens: only the header and the first
+        sample_rows rows of each sheet are parsed, and the row count comes
+        from the sheet's stored dimensions, so the cost does not grow with
+        the file size. Dtypes are inferred from the sample and may be
+        narrower than those of the fully loaded sheet.
+        
+        Args:
+            file: Uploaded Excel file object
+            sample_rows: Number of data rows to read per sheet
+            
+        Returns:
+            Dict mapping sheet name to a metadata dict with 'rows' (None if
+            the workbook does not record it), 'columns', 'column_names',
+            'dtypes', 'numeric_columns', 'text_columns' and the 'sample'
+            DataFrame
+            
+        Raises:
+            ValueError: If file format is not supported
+        """
+        if not self.validate_file(file):
+            raise ValueError(f"Unsupported file format. Supported formats: {self.supported_formats}")
+        
+        metadata = {}
+        if file.name.lower().endswith('.xls'):
+            with pd.ExcelFile(file) as excel_file:
+                for sheet_name in excel_file.sheet_names:
+                    sample = excel_file.parse(sheet_name, nrows=sample_rows)
+                    rows = excel_file.book.sheet_by_name(sheet_name).nrows - 1
+                    metadata[sheet_name] = self._sheet_metadata(sample, max(rows, 0))
+            return metadata
+        
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            for sheet_name in workbook.sheetnames:
+                worksheet = workbook[sheet_name]
+                rows = worksheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    sample = pd.DataFrame()
+                else:
+                    columns = self._make_column_names(header)
+                    width = len(columns)
+                    records = [tuple(row[:width]) + (None,) * (width - len(row))
+                               for row in itertools.islice(rows, sample_rows)]
+                    sample = self._rows_to_frame(records, columns, 0)
+                
+                # max_row comes from the <dimension> tag and is None when it is missing
+                max_row = worksheet.max_row
+                metadata[sheet_name] = self._sheet_metadata(sample, None if max_row is None else max(max_row - 1, 0))
+        finally:
+            workbook.close()
+        
+        logger.info(f"Probed {len(metadata)} sheet(s) of '{file.name}'")
+        return metadata
+    
+    @staticmethod
+    def _sheet_metadata(sample: pd.DataFrame, rows: Optional[int]) -> Dict[str, Any]:
+        """Build the probe result of one sheet from its sample."""
+        return {
+            'rows': rows,
+            'columns': len(sample.columns),
+            'column_names': sample.columns.tolist(),
+            'dtypes': sample.dtypes.to_dict(),
+            'numeric_columns': sample.select_dtypes(include=['number']).columns.tolist(),
+            'text_columns': sample.select_dtypes(include=['object']).columns.tolist(),
+            'sample': sample
+        }
+    
+    def iter_excel_chunks(self, file, sheet_name: Optional[str] = None,
+                          chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+        """
+        Stream one sheet as DataFrame chunks of at most chunk_size rows.
+        
+        Uses openpyxl's read-only row iterator, so only one chunk of rows is
+        held in memory at a time regardless of the file size. The first row
+        is used as the header, like load_excel. Blank rows inside the data
+        are kept and trailing blank rows are dropped.
+        
+        Args:
+            file: Excel file object (.xlsx only)
+            sheet_name: Sheet to read, defaults to the first sheet
+            chunk_size: Maximum number of rows per chunk
+            
+        Yields:
+            pd.DataFrame: Consecutive row chunks with a continuous RangeIndex
+            
+        Raises:
+            ValueError: If the file format or sheet name is not supported
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if not self.validate_file(file) or file.name.lower().endswith('.xls'):
+            raise ValueError("Streaming is only supported for .xlsx files")
+        
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            if sheet_name is None:
+                sheet_name = workbook.sheetnames[0]
+            if sheet_name not in workbook.sheetnames:
+                raise ValueError(f"Sheet '{sheet_name}' not found")
+            
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = self._make_column_names(header)
+            width = len(columns)
+            
+            buffer = []
+            blank_rows = []
+            start = 0
+            total = 0
+            for row in rows:
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+                if all(value is None for value in row):
+                    # Only keep blank rows once a non-blank row follows them
+                    blank_rows.append(row)
+                    continue
+                if blank_rows:
+                    buffer.extend(blank_rows)
+                    blank_rows = []
+                buffer.append(row)
+                
+                while len(buffer) >= chunk_size:
+                    chunk = self._rows_to_frame(buffer[:chunk_size], columns, start)
+                    buffer = buffer[chunk_size:]
+                    start += len(chunk)
+                    yield chunk
+            
+            if buffer:
+                chunk = self._rows_to_frame(buffer, columns, start)
+                start += len(chunk)
+                yield chunk
+            
+            logger.info(f"Streamed sheet '{sheet_name}' with {start} rows and {width} columns")
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def _make_column_names(header) -> List[str]:
+        """Build column names from a header row the way pandas does."""
+        columns = []
+        seen = {}
+        for idx, value in enumerate(header):
+            name = f"Unnamed: {idx}" if value is None else value
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+        return columns
+    
+    @staticmethod
+    def _rows_to_frame(rows: List[tuple], columns: List[str], start: int) -> pd.DataFrame:
+        """Convert raw cell values to a DataFrame with inferred dtypes."""
+        df = pd.DataFrame.from_records(rows, columns=columns).infer_objects()
+        df.index = pd.RangeIndex(start, start + len(df))
+        
+        # Empty cells come back as None, pd.read_excel gives NaN
+        text_cols = df.select_dtypes(include=['object']).columns
+        if len(text_cols):
+            df[text_cols] = df[text_cols].where(df[text_cols].notna(), np.nan)
+        return df
+    
+    def export_excel(self, sheets: Dict[str, Any], batch_size: int = 10000,
+                     max_memory_size: int = 32 * 1024 * 1024) -> tempfile.SpooledTemporaryFile:
+        """
+        Write sheets to an .xlsx file using openpyxl's write-only mode.
+        
+        Rows are converted and appended in batches, so the full openpyxl cell
+        graph is never built. The workbook goes to a spooled temporary file
+        that stays in memory up to max_memory_size bytes and moves to disk
+        beyond that.
+        
+        A LazySheet is copied row by row from its source workbook, without
+        being parsed into a DataFrame.
+        
+        Args:
+            sheets: Sheet names mapped to a DataFrame, a LazySheet, or an
+                iterable of DataFrame chunks that share the same columns
+            batch_size: Number of rows converted per batch
+            max_memory_size: Size in bytes above which the output spills to disk
+            
+        Returns:
+            SpooledTemporaryFile: The written workbook, positioned at the start
+            
+        Raises:
+            ValueError: If a sheet has more than EXCEL_MAX_ROWS rows
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=max_memory_size, suffix='.xlsx')
+        self._write_workbook(sheets, batch_size).save(output)
+        output.seek(0)
+        return output
+    
+    def write_excel(self, sheets: Dict[str, Any], path: str, batch_size: int = 10000):
+        """
+        Write sheets straight to an .xlsx file on disk.
+        
+        Same input as export_excel, without the temporary copy. With chunk
+        iterables, memory stays bounded by one chunk however large the
+        workbook gets, since write-only worksheets keep their rows on disk.
+        
+        Args:
+            sheets: Sheet names mapped to a DataFrame, a LazySheet, or an
+                iterable of DataFrame chunks that share the same columns
+            path: Output file path
+            batch_size: Number of rows converted per batch
+            
+        Raises:
+            ValueError: If a sheet has more than EXCEL_MAX_ROWS rows
+        """
+        self._write_workbook(sheets, batch_size).save(path)
+    
+    def _write_workbook(self, sheets: Dict[str, Any], batch_size: int) -> openpyxl.Workbook:
+        """Append all sheets to a new write-only workbook."""
+        workbook = openpyxl.Workbook(write_only=True)
+        
+        for sheet_name, data in sheets.items():
+            worksheet = workbook.create_sheet(title=sheet_name)
+            if isinstance(data, LazySheet):
+                rows_written = self._copy_rows(worksheet, data)
+                logger.info(f"Copied unchanged sheet '{sheet_name}' with {rows_written} rows")
+                continue
+            
+            chunks = [data] if isinstance(data, pd.DataFrame) else data
+            
+            header_written = False
+            rows_written = 0
+            for chunk in chunks:
+                if not header_written:
+                    worksheet.append([str(col) for col in chunk.columns])
+                    header_written = True
+                rows_written += self._append_rows(worksheet, chunk, batch_size, sheet_name, rows_written)
+            
+            logger.info(f"Exported sheet '{sheet_name}' with {rows_written} rows")
+        
+        return workbook
+    
+    @staticmethod
+    def _append_rows(worksheet, df: pd.DataFrame, batch_size: int, sheet_name: str, rows_written: int) -> int:
+        """Append the rows of df to a write-only worksheet in batches, after rows_written rows."""
+        # Checked before writing, so a chunk stream fails without writing rows Excel cannot open
+        if rows_written + len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(f"Sheet '{sheet_name}' has more than {EXCEL_MAX_ROWS} rows, "
+                             f"the most an Excel sheet can hold")
+        for start in range(0, len(df), batch_size):
+            batch = df.iloc[start:start + batch_size].astype(object)
+            # Missing values (NaN, NaT, None, pd.NA) become empty cells
+            batch = batch.where(batch.notna(), None)
+            for row in batch.itertuples(index=False, name=None):
+                worksheet.append(row)
+        return len(df)
+    
+    @staticmethod
+    def _copy_rows(worksheet, sheet: LazySheet) -> int:
+        """Copy the raw rows of a sheet (header included) and return the data row count."""
+        rows = 0
+        for row in sheet.iter_rows():
+            worksheet.append(row)
+            rows += 1
+        return max(rows - 1, 0)
+    
     def get_file_info(self, dataframes: Dict[str, pd.DataFrame]) -> Dict[str, any]:
         """
         Get summary information about loaded Excel file.
@@ -82,7 +403,9 @@ class FileHandler:
             dataframes: Dictionary of DataFrames
             
         Returns:
-            Dict containing file statistics
+            Dict containing file statistics. 'memory_bytes' is the current
+            size of each sheet; 'memory_bytes_before' is its size before
+            dtype optimization, or None if it was not optimized.
         """
         info = {
             'total_sheets': len(dataframes),
@@ -90,11 +413,14 @@ class FileHandler:
         }
         
         for sheet_name, df in dataframes.items():
+            report = df.attrs.get('dtype_optimization')
             info['sheets'][sheet_name] = {
                 'rows': len(df),
                 'columns': len(df.columns),
                 'column_names': df.columns.tolist(),
-                'dtypes': df.dtypes.to_dict()
+                'dtypes': df.dtypes.to_dict(),
+                'memory_bytes': frame_nbytes(df),
+                'memory_bytes_before': report['bytes_before'] if report else None
             }
         
         return info
@@ -0,0 +1,251 @@
+"""
+Filter Engine Module
+Vectorized, type-stable evaluation of filter conditions.
+"""
+
+from typing import Any, Dict, Set
+import logging
+import operator as op
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import (is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype,
+                              CategoricalDtype)
+
+logger = logging.getLogger(__name__)
+
+COMPARISONS = {
+    "==": op.eq,
+    "!=": op.ne,
+    ">": op.gt,
+    "<": op.lt,
+    ">=": op.ge,
+    "<=": op.le
+}
+TEXT_OPERATORS = {"contains", "not contains"}
+
+# Text columns whose sampled share of distinct values is below this are
+# dictionary encoded for 'contains', so the pattern runs once per distinct value
+LOW_CARDINALITY_RATIO = 0.5
+CARDINALITY_SAMPLE_SIZE = 1000
+
+
+def condition_columns(condition: Dict[str, Any]) -> Set[str]:
+    """
+    Return every column referenced by a condition or condition group.
+
+    Args:
+        condition: Single condition or group with nested 'conditions'
+
+    Returns:
+        Set of column names
+    """
+    if condition.get('conditions'):
+        columns = set()
+        for child in condition['conditions']:
+            columns |= condition_columns(child)
+        return columns
+    return {condition.get('column')}
+
+
+class FilterEngine:
+    """
+    Builds boolean row masks for filter conditions.
+
+    The literal of every condition is coerced to the column's dtype once
+    before a single vectorized comparison, instead of guessing a float and
+    falling back silently. Categorical columns are filtered through their
+    category codes and low-cardinality text columns are dictionary encoded
+    for 'contains', so the predicate runs once per distinct value. Groups of
+    conditions combine with AND/OR and can be nested; the whole group is
+    evaluated into one mask.
+
+    A condition is {'column', 'operator', 'value'}; a group is
+    {'conditions': [...], 'logic': 'AND' | 'OR'}.
+    """
+
+    def mask(self, df: pd.DataFrame, condition: Dict[str, Any]) -> np.ndarray:
+        """
+        Evaluate a condition or condition group against a DataFrame.
+
+        Args:
+            df: DataFrame to filter
+            condition: Single condition or group with nested 'conditions'
+
+        Returns:
+            np.ndarray: Boolean mask with one entry per row
+
+        Raises:
+            ValueError: For unknown operators/logic or literals that cannot be
+                compared with the column's dtype
+        """
+        if condition.get('conditions'):
+            logic = str(condition.get('logic', 'AND')).upper()
+            if logic not in ("AND", "OR"):
+                raise ValueError(f"Unknown filter logic: {logic}")
+
+            result = None
+            for child in condition['conditions']:
+                child_mask = self.mask(df, child)
+                if result is None:
+                    result = child_mask
+                elif logic == "AND":
+                    np.logical_and(result, child_mask, out=result)
+                else:
+                    np.logical_or(result, child_mask, out=result)
+            return result
+
+        return self.condition_mask(df[condition.get('column')], condition.get('operator'),
+                                   condition.get('value'))
+
+    def condition_mask(self, series: pd.Series, operator: str, value: Any) -> np.ndarray:
+        """
+        Evaluate one comparison against a column.
+
+        Args:
+            series: Column to test
+            operator: One of ==, !=, >, <, >=, <=, contains, not contains
+            value: Literal to compare with (usually a string from the UI)
+
+        Returns:
+            np.ndarray: Boolean mask (a fresh array the caller may modify)
+        """
+        if operator not in COMPARISONS and operator not in TEXT_OPERATORS:
+            raise ValueError(f"Unknown filter operator: {operator}")
+
+        if isinstance(series.dtype, CategoricalDtype):
+            return self._categorical_mask(series, operator, value)
+
+        if operator in TEXT_OPERATORS:
+            return self._contains_mask(series, operator, value)
+
+        compare = COMPARISONS[operator]
+
+        if is_bool_dtype(series.dtype):
+            literal = self._to_bool(value)
+            if literal is None:
+                return self._constant_mask(series, operator, value)
+            return self._to_numpy(compare(series, literal), operator)
+
+        if is_numeric_dtype(series.dtype):
+            literal = self._to_number(value)
+            if literal is None:
+                return self._constant_mask(series, operator, value)
+            return self._to_numpy(compare(series, literal), operator)
+
+        if is_datetime64_any_dtype(series.dtype):
+            try:
+                literal = pd.Timestamp(value)
+            except (ValueError, TypeError):
+                return self._constant_mask(series, operator, value)
+            return self._to_numpy(compare(series, literal), operator)
+
+        return self._text_compare_mask(series, operator, value)
+
+    def _text_compare_mask(self, series: pd.Series, operator: str, value: Any) -> np.ndarray:
+        """Compare an object/string column that may hold mixed text and numbers."""
+        text = str(value)
+        number = self._to_number(value)
+
+        if operator in ("==", "!="):
+            if self._is_low_cardinality(series):
+                # Compare each distinct value once and map the result through the codes
+                codes, uniques = pd.factorize(series)
+                # Code -1 marks missing values, which are never equal
+                lookup = np.append(self._equal_mask(pd.Series(uniques), text, number), False)
+                matches = lookup[codes]
+            else:
+                matches = self._equal_mask(series, text, number)
+            return ~matches if operator == "!=" else matches
+
+        compare = COMPARISONS[operator]
+        if number is not None:
+            numeric = pd.to_numeric(series, errors='coerce')
+            return self._to_numpy(compare(numeric, number), operator)
+
+        strings = series.astype('string')
+        return self._to_numpy(compare(strings, text), operator)
+
+    def _equal_mask(self, series: pd.Series, text: str, number: Any) -> np.ndarray:
+        """Equality test that matches either the text or, in object columns, the number form."""
+        # Excel text columns often mix numbers and text: match either form
+        matches = self._to_numpy(series == text, "==")
+        if number is not None and series.dtype == object:
+            matches |= self._to_numpy(series == number, "==")
+        return matches
+
+    def _contains_mask(self, series: pd.Series, operator: str, value: Any) -> np.ndarray:
+        """Regex 'contains' test, dictionary encoded for low-cardinality columns."""
+        pattern = str(value)
+
+        if self._is_low_cardinality(series):
+            codes, uniques = pd.factorize(series)
+            matches = pd.Series(uniques).astype(str).str.contains(pattern, na=False).to_numpy()
+            # Code -1 marks missing values, which never match
+            lookup = np.append(matches, False)
+            result = lookup[codes]
+        elif isinstance(series.dtype, pd.StringDtype) or pd.api.types.infer_dtype(series, skipna=True) == 'string':
+            result = series.str.contains(pattern, na=False).to_numpy(dtype=bool)
+        else:
+            # Mixed object columns: numbers and dates match their text form
+            result = series.astype(str).str.contains(pattern, na=False).to_numpy(dtype=bool)
+            result &= series.notna().to_numpy()
+
+        return ~result if operator == "not contains" else result
+
+    def _categorical_mask(self, series: pd.Series, operator: str, value: Any) -> np.ndarray:
+        """Evaluate the predicate once per category and map it through the codes."""
+        categories = pd.Series(series.cat.categories)
+        category_mask = self.condition_mask(categories, operator, value)
+
+        # Missing values (code -1) behave like NaN: only != and 'not contains' keep them
+        missing = operator in ("!=", "not contains")
+        lookup = np.append(category_mask, missing)
+        return lookup[series.cat.codes.to_numpy()]
+
+    def _is_low_cardinality(self, series: pd.Series) -> bool:
+        """Estimate from a sample whether a column has few distinct values."""
+        if len(series) <= CARDINALITY_SAMPLE_SIZE:
+            return True
+        sample = series.iloc[:: max(1, len(series) // CARDINALITY_SAMPLE_SIZE)]
+        return sample.nunique(dropna=True) / len(sample) < LOW_CARDINALITY_RATIO
+
+    @staticmethod
+    def _constant_mask(series: pd.Series, operator: str, value: Any) -> np.ndarray:
+        """Result for a literal that cannot be converted to the column's dtype."""
+        if operator == "==":
+            return np.zeros(len(series), dtype=bool)
+        if operator == "!=":
+            return np.ones(len(series), dtype=bool)
+        raise ValueError(f"Cannot compare column '{series.name}' ({series.dtype}) "
+                         f"with {value!r} using '{operator}'")
+
+    @staticmethod
+    def _to_numpy(mask, operator: str) -> np.ndarray:
+        """Convert a (possibly nullable) boolean result to a plain numpy mask."""
+        if isinstance(mask, pd.Series) and mask.dtype != bool:
+            # Nullable results: missing compares unequal, like NaN does
+            mask = mask.fillna(operator == "!=")
+        return np.asarray(mask, dtype=bool).copy()
+
+    @staticmethod
+    def _to_number(value: Any):
+        """Return value as a float, or None if it is not numeric."""
+        if isinstance(value, bool):
+            return None
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _to_bool(value: Any):
+        """Return value as a bool, or None if it does not look like one."""
+        if isinstance(value, (bool, np.bool_)):
+            return bool(value)
+        text = str(value).strip().lower()
+        if text in ("true", "1", "yes"):
+            return True
+        if text in ("false", "0", "no"):
+            return False
+        return None
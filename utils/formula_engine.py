@@ -0,0 +1,597 @@
+"""
+Formula Engine Module
+Compiles spreadsheet-style formulas once and evaluates them as vectorized column expressions.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+import ast
+import difflib
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+try:
+    import numexpr
+except ImportError:  # Optional: without it formulas are evaluated with numpy
+    numexpr = None
+
+logger = logging.getLogger(__name__)
+
+# Kinds of values a formula works with
+NUMBER = 'number'
+BOOL = 'bool'
+TEXT = 'text'
+DATE = 'date'
+
+# Function name -> (min args, max args or None for any number)
+FUNCTIONS = {
+    'if': (3, 3),
+    'abs': (1, 1),
+    'round': (1, 2),
+    'sqrt': (1, 1),
+    'log': (1, 1),
+    'exp': (1, 1),
+    'min': (2, None),
+    'max': (2, None),
+    'isnull': (1, 1),
+    'coalesce': (2, None),
+}
+
+# Functions numexpr evaluates itself; the others become inputs of the fused expression
+NUMEXPR_FUNCTIONS = {'abs', 'sqrt', 'log', 'exp'}
+
+ARITHMETIC = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Mod: '%', ast.Pow: '**'}
+COMPARISONS = {ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<=', ast.Eq: '==', ast.NotEq: '!='}
+COMMUTATIVE = {'+', '*', '==', '!='}
+ARITHMETIC_SYMBOLS = set(ARITHMETIC.values())
+
+NUMPY_OPERATORS = {
+    '+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide, '%': np.mod, '**': np.power,
+    '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+PANDAS_COMPARISONS = {'>': 'gt', '>=': 'ge', '<': 'lt', '<=': 'le', '==': 'eq', '!=': 'ne'}
+
+# [Column Name] references, string literals and identifiers, in source order
+_TOKEN = re.compile(r"""\[(?P<column>[^\]]*)\]|(?P<string>"[^"]*"|'[^']*')|(?P<name>[A-Za-z_]\w*)|(?P<ne><>)""")
+
+
+class FormulaError(ValueError):
+    """Raised when a formula cannot be parsed or does not fit the sheet's columns."""
+
+
+def column_kinds(dtypes: Mapping[str, Any]) -> Dict[str, str]:
+    """
+    Map column dtypes to the kinds formulas check against.
+
+    Args:
+        dtypes: Column name -> dtype (e.g. df.dtypes or probed metadata)
+
+    Returns:
+        Dict mapping column name to NUMBER, BOOL, DATE or TEXT
+    """
+    kinds = {}
+    for column, dtype in dtypes.items():
+        if is_bool_dtype(dtype):
+            kinds[column] = BOOL
+        elif is_numeric_dtype(dtype):
+            kinds[column] = NUMBER
+        elif is_datetime64_any_dtype(dtype):
+            kinds[column] = DATE
+        else:
+            kinds[column] = TEXT
+    return kinds
+
+
+def _prepare(expression: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Rewrite a formula into Python expression syntax.
+
+    [Column Name] becomes a placeholder identifier, if( becomes if_( and <>
+    becomes !=. String literals are left alone.
+
+    Returns:
+        Tuple of the rewritten source and placeholder -> column name
+    """
+    columns = {}
+    parts = []
+    position = 0
+    for match in _TOKEN.finditer(expression):
+        parts.append(expression[position:match.start()])
+        position = match.end()
+        if match.group('column') is not None:
+            placeholder = f"_col{len(columns)}_"
+            columns[placeholder] = match.group('column').strip()
+            parts.append(f" {placeholder} ")
+        elif match.group('name') in ('if', 'IF'):
+            parts.append('if_')
+        elif match.group('ne'):
+            parts.append('!=')
+        else:
+            parts.append(match.group())
+    parts.append(expression[position:])
+    return ''.join(parts), columns
+
+
+@lru_cache(maxsize=512)
+def parse_formula(expression: str) -> tuple:
+    """
+    Parse a formula into a tree of tuples, once per distinct expression.
+
+    Nodes are ('const', value, type name), ('col', name), ('neg', a),
+    ('not', a), ('op', symbol, a, b), ('and', args), ('or', args) and
+    ('call', name, args). The type name keeps True and 1 apart, which
+    compare equal as tuple items. Operands of commutative operators are ordered,
+    so 'a + b' and 'b + a' give the same node and are computed once.
+
+    Args:
+        expression: Formula text, e.g. "(Sales - Cost) / Sales * 100"
+
+    Returns:
+        tuple: Root node
+
+    Raises:
+        FormulaError: If the text is not a valid formula
+    """
+    source, placeholders = _prepare(expression)
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid formula '{expression}': {e.msg}") from None
+    return _build(tree.body, placeholders, expression)
+
+
+def _build(node: ast.AST, placeholders: Dict[str, str], expression: str) -> tuple:
+    """Convert a Python AST node into a formula node."""
+    def build(child):
+        return _build(child, placeholders, expression)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float, str)):
+        return _constant(node.value)
+    if isinstance(node, ast.Name):
+        if node.id in placeholders:
+            return ('col', placeholders[node.id])
+        if node.id in ('True', 'TRUE', 'true', 'False', 'FALSE', 'false'):
+            return _constant(node.id.lower() == 'true')
+        return ('col', node.id)
+    if isinstance(node, ast.UnaryOp):
+        operand = build(node.operand)
+        if isinstance(node.op, ast.Not):
+            return ('not', operand)
+        if isinstance(node.op, ast.USub):
+            if operand[0] == 'const' and isinstance(operand[1], (int, float)) and not isinstance(operand[1], bool):
+                return _constant(-operand[1])
+            return ('neg', operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+    if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+        return _binary(ARITHMETIC[type(node.op)], build(node.left), build(node.right))
+    if isinstance(node, ast.Compare) and all(type(op) in COMPARISONS for op in node.ops):
+        operands = [build(node.left)] + [build(comparator) for comparator in node.comparators]
+        pairs = [_binary(COMPARISONS[type(op)], left, right)
+                 for op, left, right in zip(node.ops, operands, operands[1:])]
+        return pairs[0] if len(pairs) == 1 else ('and', tuple(sorted(pairs, key=repr)))
+    if isinstance(node, ast.BoolOp):
+        name = 'and' if isinstance(node.op, ast.And) else 'or'
+        return (name, tuple(sorted((build(value) for value in node.values), key=repr)))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        name = node.func.id.lower().rstrip('_')
+        if name not in FUNCTIONS:
+            raise FormulaError(f"Unknown function '{node.func.id}' in '{expression}'. "
+                               f"Supported: {', '.join(FUNCTIONS)}")
+        low, high = FUNCTIONS[name]
+        if len(node.args) < low or (high is not None and len(node.args) > high):
+            expected = str(low) if low == high else f"{low}+" if high is None else f"{low}-{high}"
+            raise FormulaError(f"{name}() takes {expected} argument(s), got {len(node.args)} in '{expression}'")
+        return ('call', name, tuple(build(arg) for arg in node.args))
+    raise FormulaError(f"Unsupported syntax '{ast.unparse(node)}' in '{expression}'")
+
+
+def _constant(value: Any) -> tuple:
+    """Build a constant node."""
+    return ('const', value, type(value).__name__)
+
+
+def _binary(symbol: str, left: tuple, right: tuple) -> tuple:
+    """Build an operator node, ordering the operands of commutative operators."""
+    if symbol in COMMUTATIVE and repr(right) < repr(left):
+        left, right = right, left
+    return ('op', symbol, left, right)
+
+
+def _children(node: tuple) -> Sequence[tuple]:
+    """Return the operand nodes of a node."""
+    kind = node[0]
+    if kind in ('neg', 'not'):
+        return (node[1],)
+    if kind == 'op':
+        return node[2:]
+    if kind in ('and', 'or'):
+        return node[1]
+    if kind == 'call':
+        return node[2]
+    return ()
+
+
+class FormulaProgram:
+    """
+    A compiled set of formulas that write one column each.
+
+    Formulas run in order and a formula may use the columns written by the
+    ones before it. Those references are replaced by the earlier formula
+    itself, so the whole set is one expression graph in which repeated
+    subexpressions (within or across formulas) are computed only once.
+    Only the input columns the graph reads are converted to arrays.
+
+    With numexpr installed, every numeric formula is evaluated as one fused
+    expression without per-operator temporaries; otherwise with numpy.
+
+    Attributes:
+        outputs (list): (column, root node) of every formula, in order
+        columns (set): Input columns the formulas read
+    """
+
+    def __init__(self, formulas: Sequence[Tuple[str, str]]):
+        """
+        Compile formulas.
+
+        Args:
+            formulas: (output column, expression) pairs, in order
+
+        Raises:
+            FormulaError: If a formula cannot be parsed or has no output column
+        """
+        written = {}
+        self.outputs = []
+        self._expressions = []
+        for column, expression in formulas:
+            if not column:
+                raise FormulaError(f"Formula '{expression}' has no result column")
+            root = self._substitute(parse_formula(str(expression)), written)
+            written[column] = root
+            self.outputs.append((column, root))
+            self._expressions.append(expression)
+        self.columns = set()
+        self.shared = self._shared_nodes()
+
+    def _substitute(self, node: tuple, written: Dict[str, tuple]) -> tuple:
+        """Replace references to earlier outputs by their formulas."""
+        if node[0] == 'col':
+            return written.get(node[1], node)
+        if node[0] in ('neg', 'not'):
+            return (node[0], self._substitute(node[1], written))
+        if node[0] == 'op':
+            return _binary(node[1], self._substitute(node[2], written), self._substitute(node[3], written))
+        if node[0] in ('and', 'or'):
+            return (node[0], tuple(sorted((self._substitute(child, written) for child in node[1]), key=repr)))
+        if node[0] == 'call':
+            return ('call', node[1], tuple(self._substitute(child, written) for child in node[2]))
+        return node
+
+    def _shared_nodes(self) -> Set[tuple]:
+        """Find the compound nodes used more than once, collecting input columns on the way."""
+        uses = {}
+        stack = [root for _, root in self.outputs]
+        while stack:
+            node = stack.pop()
+            uses[node] = uses.get(node, 0) + 1
+            if node[0] == 'col':
+                self.columns.add(node[1])
+            if uses[node] == 1:
+                stack.extend(_children(node))
+        return {node for node, count in uses.items() if count > 1 and node[0] not in ('col', 'const')}
+
+    def validate(self, kinds: Mapping[str, str]) -> Dict[str, str]:
+        """
+        Check the formulas against a sheet's columns.
+
+        Args:
+            kinds: Column name -> kind (see column_kinds)
+
+        Returns:
+            Dict mapping every output column to the kind of its values
+
+        Raises:
+            FormulaError: On unknown columns or operators applied to the
+                wrong kind of value (e.g. arithmetic on a text column)
+        """
+        checked = {}
+        return {column: self._kind(root, kinds, checked, expression)
+                for (column, root), expression in zip(self.outputs, self._expressions)}
+
+    def _kind(self, node: tuple, kinds: Mapping[str, str], checked: Dict[tuple, str], expression: str) -> str:
+        """Return the kind of a node's values, raising FormulaError if the node is invalid."""
+        if node in checked:
+            return checked[node]
+        kind = node[0]
+        children = [self._kind(child, kinds, checked, expression) for child in _children(node)]
+
+        def require(allowed, what):
+            for child, child_kind in zip(_children(node), children):
+                if child_kind not in allowed:
+                    raise FormulaError(f"{what} needs numbers, but {_describe(child)} is {child_kind} "
+                                       f"in '{expression}'")
+
+        if kind == 'const':
+            value = node[1]
+            result = BOOL if isinstance(value, bool) else TEXT if isinstance(value, str) else NUMBER
+        elif kind == 'col':
+            if node[1] not in kinds:
+                close = difflib.get_close_matches(str(node[1]), [str(column) for column in kinds], n=1)
+                hint = f" (did you mean '{close[0]}'?)" if close else ""
+                raise FormulaError(f"Unknown column '{node[1]}' in '{expression}'{hint}. "
+                                   f"Use [Column Name] for names with spaces or symbols")
+            result = kinds[node[1]]
+        elif kind == 'neg':
+            require((NUMBER, BOOL), "Negation")
+            result = NUMBER
+        elif kind in ('not', 'and', 'or'):
+            require((NUMBER, BOOL), f"'{kind}'")
+            result = BOOL
+        elif kind == 'op' and node[1] in ARITHMETIC_SYMBOLS:
+            require((NUMBER, BOOL), f"'{node[1]}'")
+            result = NUMBER
+        elif kind == 'op':
+            families = {NUMBER if child_kind == BOOL else child_kind for child_kind in children}
+            # Dates compare with dates or date text such as "2024-01-31"
+            if node[1] not in ('==', '!=') and len(families) > 1 and families != {DATE, TEXT}:
+                raise FormulaError(f"Cannot compare {children[0]} with {children[1]} in '{expression}'")
+            result = BOOL
+        else:
+            name = node[1]
+            if name == 'if':
+                if children[0] not in (NUMBER, BOOL):
+                    raise FormulaError(f"if() condition must be true/false, not {children[0]} "
+                                       f"in '{expression}'")
+                branches = set(children[1:])
+                result = branches.pop() if len(branches) == 1 else TEXT if branches != {NUMBER, BOOL} else NUMBER
+            elif name == 'isnull':
+                result = BOOL
+            elif name == 'coalesce':
+                result = children[0] if len(set(children)) == 1 else TEXT
+            else:
+                require((NUMBER, BOOL), f"{name}()")
+                result = NUMBER
+        checked[node] = result
+        return result
+
+    def evaluate(self, df: pd.DataFrame, kinds: Optional[Mapping[str, str]] = None) -> Dict[str, Any]:
+        """
+        Compute every output column.
+
+        Args:
+            df: Input frame (not modified)
+            kinds: Column kinds of df, computed from its dtypes if omitted
+
+        Returns:
+            Dict mapping output column to an array (or scalar for constant
+            formulas) with one value per row
+
+        Raises:
+            FormulaError: If the formulas do not fit df's columns
+        """
+        kinds = kinds if kinds is not None else column_kinds(df.dtypes)
+        node_kinds = {}
+        for (_, root), expression in zip(self.outputs, self._expressions):
+            self._kind(root, kinds, node_kinds, expression)
+        evaluator = _Evaluator(df, node_kinds, self.shared)
+        return {column: evaluator.evaluate(root) for column, root in self.outputs}
+
+
+def _describe(node: tuple) -> str:
+    """Return a short readable name of a node for error messages."""
+    if node[0] == 'col':
+        return f"column '{node[1]}'"
+    if node[0] == 'const':
+        return repr(node[1])
+    return "a sub-expression"
+
+
+class _Evaluator:
+    """Evaluates formula nodes on one frame, computing shared nodes once."""
+
+    def __init__(self, df: pd.DataFrame, kinds: Dict[tuple, str], shared: Set[tuple]):
+        self.df = df
+        self.kinds = kinds
+        self.shared = shared
+        self.values = {}
+
+    def evaluate(self, node: tuple) -> Any:
+        """Return the values of a node: an array with one value per row, or a scalar."""
+        if node in self.values:
+            return self.values[node]
+        if numexpr is not None and self._fusable(node):
+            variables = {}
+            source = self._numexpr_source(node, variables, root=True)
+            value = numexpr.evaluate(source, local_dict=variables)
+            if not value.ndim:
+                # Only constants: keep a scalar like the numpy path
+                value = value.item()
+        else:
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                value = self._compute(node)
+        if node in self.shared or node[0] == 'col':
+            self.values[node] = value
+        return value
+
+    def _column(self, name: str) -> np.ndarray:
+        """Convert a column to an array: float64 for numbers, object (None for missing) for text."""
+        series = self.df[name]
+        kind = self.kinds[('col', name)]
+        if kind == NUMBER:
+            return series.to_numpy(dtype=np.float64, na_value=np.nan)
+        if kind == BOOL:
+            return series.to_numpy(dtype=bool, na_value=False)
+        if kind == DATE:
+            return series.to_numpy()
+        return series.to_numpy(dtype=object, na_value=None)
+
+    def _compute(self, node: tuple) -> Any:
+        """Evaluate one node with numpy."""
+        kind = node[0]
+        if kind == 'const':
+            return node[1]
+        if kind == 'col':
+            return self._column(node[1])
+        if kind == 'neg':
+            return -self._number(node[1])
+        if kind == 'not':
+            return np.logical_not(self._truth(node[1]))
+        if kind == 'and':
+            return _reduce(np.logical_and, [self._truth(child) for child in node[1]])
+        if kind == 'or':
+            return _reduce(np.logical_or, [self._truth(child) for child in node[1]])
+        if kind == 'op':
+            return self._operator(node)
+        return self._call(node[1], node[2])
+
+    def _number(self, node: tuple) -> Any:
+        """Values of a numeric or true/false node as numbers."""
+        value = self.evaluate(node)
+        return np.asarray(value, dtype=np.float64) if self.kinds[node] == BOOL else value
+
+    def _truth(self, node: tuple) -> Any:
+        """Values of a node as true/false; numbers are true when non-zero, missing is false."""
+        value = self.evaluate(node)
+        if self.kinds[node] == BOOL:
+            return np.asarray(value, dtype=bool)
+        return (value != 0) & ~np.isnan(value)
+
+    def _operator(self, node: tuple) -> Any:
+        """Evaluate an arithmetic or comparison node."""
+        symbol, left, right = node[1:]
+        if symbol in PANDAS_COMPARISONS and {self.kinds[left], self.kinds[right]} & {TEXT, DATE}:
+            # Text and dates compare through pandas, where missing values compare as False
+            left_values, right_values = self.evaluate(left), self.evaluate(right)
+            if not np.ndim(left_values):
+                # Only the left operand can be turned into a Series
+                left_values, right_values = right_values, left_values
+                symbol = {'>': '<', '>=': '<=', '<': '>', '<=': '>='}.get(symbol, symbol)
+            if not np.ndim(left_values):
+                return NUMPY_OPERATORS[symbol](left_values, right_values)
+            if np.ndim(right_values):
+                right_values = pd.Series(right_values)
+            result = getattr(pd.Series(left_values), PANDAS_COMPARISONS[symbol])(right_values)
+            return result.to_numpy(dtype=bool, na_value=False)
+        return NUMPY_OPERATORS[symbol](self._number(left), self._number(right))
+
+    def _call(self, name: str, args: Tuple[tuple, ...]) -> Any:
+        """Evaluate a function call."""
+        kind = self.kinds[('call', name, args)]
+        if name == 'if':
+            condition = self._truth(args[0])
+            if kind == NUMBER:
+                return np.where(condition, self._number(args[1]), self._number(args[2]))
+            if kind == TEXT:
+                return np.where(condition, _objects(self.evaluate(args[1])), _objects(self.evaluate(args[2])))
+            return np.where(condition, self.evaluate(args[1]), self.evaluate(args[2]))
+        if name == 'isnull':
+            value = self.evaluate(args[0])
+            return pd.isna(value) if np.ndim(value) else np.full(len(self.df), pd.isna(value))
+        if name == 'coalesce':
+            result = _objects(self.evaluate(args[0])) if kind == TEXT else self.evaluate(args[0])
+            for arg in args[1:]:
+                missing = pd.isna(result)
+                if not np.any(missing):
+                    break
+                result = np.where(missing, self.evaluate(arg), result)
+            return result
+        values = [self._number(arg) for arg in args]
+        if name == 'round':
+            digits = int(values[1]) if len(values) > 1 else 0
+            return np.round(values[0], digits)
+        if name == 'min':
+            return _reduce(np.fmin, values)
+        if name == 'max':
+            return _reduce(np.fmax, values)
+        return getattr(np, name)(values[0])
+
+    def _fusable(self, node: tuple) -> bool:
+        """Whether numexpr can evaluate the node itself: an operator on numbers or true/false values."""
+        kind = node[0]
+        if kind == 'call':
+            supported = node[1] in NUMEXPR_FUNCTIONS or node[1] == 'if'
+        else:
+            supported = kind in ('neg', 'not', 'and', 'or', 'op')
+        return supported and self.kinds[node] in (NUMBER, BOOL) and all(
+            self.kinds[child] in (NUMBER, BOOL) for child in _children(node))
+
+    def _numexpr_source(self, node: tuple, variables: Dict[str, Any], root: bool = False) -> str:
+        """
+        Translate a node into a numexpr expression.
+
+        Columns, shared subexpressions and nodes numexpr cannot evaluate
+        become input variables, evaluated (once) by this evaluator.
+        """
+        kind = node[0]
+        if kind == 'const' and not isinstance(node[1], str):
+            return repr(node[1])
+        if not self._fusable(node) or (node in self.shared and not root):
+            name = f"v{len(variables)}"
+            variables[name] = self.evaluate(node)
+            return name
+
+        def source(child):
+            return self._numexpr_source(child, variables)
+
+        def truth(child):
+            if self.kinds[child] == BOOL:
+                return source(child)
+            value = source(child)
+            return f"(({value} != 0) & ({value} == {value}))"
+
+        if kind == 'neg':
+            return f"(-{source(node[1])})"
+        if kind == 'not':
+            return f"(~{truth(node[1])})"
+        if kind in ('and', 'or'):
+            joiner = ' & ' if kind == 'and' else ' | '
+            return f"({joiner.join(truth(child) for child in node[1])})"
+        if kind == 'op':
+            left, right = node[2:]
+            as_number = (lambda child: f"where({source(child)}, 1.0, 0.0)" if self.kinds[child] == BOOL
+                         else source(child))
+            return f"({as_number(left)} {node[1]} {as_number(right)})"
+        if node[1] == 'if':
+            condition, yes, no = node[2]
+            branch = (lambda child: f"where({source(child)}, 1.0, 0.0)" if self.kinds[child] == BOOL
+                      and self.kinds[node] == NUMBER else source(child))
+            return f"where({truth(condition)}, {branch(yes)}, {branch(no)})"
+        return f"{node[1]}({source(node[2][0])})"
+
+
+def _objects(value: Any) -> Any:
+    """Return array values as an object array so numbers and text can mix."""
+    return np.asarray(value, dtype=object) if np.ndim(value) else value
+
+
+def _reduce(function, values: List[Any]) -> Any:
+    """Combine several arrays pairwise with a numpy ufunc."""
+    result = values[0]
+    for value in values[1:]:
+        result = function(result, value)
+    return result
+
+
+@lru_cache(maxsize=256)
+def compile_formulas(formulas: Tuple[Tuple[str, str], ...]) -> FormulaProgram:
+    """
+    Compile a set of formulas, reusing the program for repeated calls.
+
+    Args:
+        formulas: Tuple of (output column, expression) pairs
+
+    Returns:
+        FormulaProgram: Shared compiled program (read-only)
+    """
+    return FormulaProgram(formulas)
+
+
+def formula_pairs(operation: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    """Return the (column, expression) pairs of a Formula operation."""
+    return tuple((formula.get('column'), formula.get('expression', ''))
+                 for formula in operation.get('formulas', []))
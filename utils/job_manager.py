@@ -0,0 +1,275 @@
+"""
+Job Manager Module
+Runs executions as background jobs that outlive Streamlit reruns.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+import traceback
+import uuid
+
+import pandas as pd
+
+from utils.executor import ParallelExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+
+class Job:
+    """
+    One execution of an operation queue, run by a JobManager.
+
+    Progress is tracked per sheet (operations completed out of total) and
+    updated from the worker threads; read it with progress(). Cancelling
+    sets an event that the executor checks before every operation.
+
+    Attributes:
+        job_id (str): Unique id of the job
+        status (str): queued, running, done, failed or cancelled
+        results (dict): ParallelExecutor results once the job has finished
+        error (str): Error message if the job failed
+        traceback (str): Formatted traceback if the job failed
+        submitted_at (float): time.time() of submission
+        started_at (float): time.time() the job started running, or None
+        finished_at (float): time.time() the job finished, or None
+    """
+
+    def __init__(self, dataframes: Dict[str, Dict[str, pd.DataFrame]], operations: List[Dict[str, Any]],
+                 executor_options: Dict[str, Any], input_keys: Optional[Dict[Tuple[str, str], str]] = None):
+        """
+        Initialize Job.
+
+        Args:
+            dataframes: File name -> sheet name -> DataFrame (or LazyWorkbook)
+            operations: Queued operations, each with 'file' and 'sheet' keys
+            executor_options: Keyword arguments for ParallelExecutor
+            input_keys: (file, sheet) -> fingerprint, for the operation cache
+        """
+        self.job_id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.results = None
+        self.error = None
+        self.traceback = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._dataframes = dataframes
+        self._operations = operations
+        self._executor_options = executor_options
+        self._input_keys = input_keys
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._sheets = {}
+        for op in operations:
+            sheet = self._sheets.setdefault((op['file'], op['sheet']), {'completed': 0, 'total': 0,
+                                                                       'status': QUEUED})
+            sheet['total'] += 1
+
+    @property
+    def is_finished(self) -> bool:
+        """Whether the job is done, failed or cancelled."""
+        return self.status in FINISHED_STATES
+
+    @property
+    def is_cancelled(self) -> bool:
+        """Whether cancel() has been called."""
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Ask the job to stop. Queued jobs never start; running sheets stop before their next operation."""
+        self._cancel_event.set()
+
+    def progress(self) -> Dict[str, Any]:
+        """
+        Return a snapshot of the job's progress.
+
+        Returns:
+            Dict with the job 'status', overall 'fraction' (0 to 1) of
+            operations completed and per-sheet progress in 'sheets', keyed
+            by (file, sheet) with 'completed', 'total' and 'status'
+        """
+        with self._lock:
+            sheets = {key: dict(value) for key, value in self._sheets.items()}
+        completed = sum(sheet['completed'] for sheet in sheets.values())
+        total = sum(sheet['total'] for sheet in sheets.values())
+        return {
+            'status': self.status,
+            'fraction': completed / total if total else 1.0,
+            'sheets': sheets
+        }
+
+    def run(self):
+        """Run the job in the calling thread (used by JobManager)."""
+        if self.is_cancelled:
+            self._finish(CANCELLED)
+            return
+
+        self.status = RUNNING
+        self.started_at = time.time()
+        try:
+            executor = ParallelExecutor(**self._executor_options)
+            self.results = executor.run(self._dataframes, self._operations,
+                                        progress_callback=self._on_sheet_done,
+                                        input_keys=self._input_keys,
+                                        operation_callback=self._on_operation,
+                                        cancel_event=self._cancel_event)
+            cancelled = any(result['status'] == CANCELLED for result in self.results.values())
+            self._finish(CANCELLED if cancelled else DONE)
+        except Exception as e:
+            logger.error(f"Job {self.job_id[:8]} failed: {str(e)}")
+            self.error = str(e)
+            self.traceback = traceback.format_exc()
+            self._finish(FAILED)
+
+    def _on_operation(self, file_name: str, sheet_name: str, completed: int, total: int):
+        """Record per-operation progress of a sheet (called from worker threads)."""
+        with self._lock:
+            sheet = self._sheets[(file_name, sheet_name)]
+            # The planned chain can be shorter than the queue, scale to the queued count
+            sheet['completed'] = round(sheet['total'] * completed / total) if total else sheet['total']
+            sheet['status'] = RUNNING
+
+    def _on_sheet_done(self, completed: int, total: int, result: Dict[str, Any]):
+        """Record the final state of a sheet."""
+        with self._lock:
+            sheet = self._sheets[(result['file'], result['sheet'])]
+            sheet['status'] = result['status']
+            if result['status'] == DONE:
+                sheet['completed'] = sheet['total']
+
+    def _finish(self, status: str):
+        """Mark the job finished and release its inputs."""
+        self.status = status
+        self.finished_at = time.time()
+        self._dataframes = None
+        with self._lock:
+            for sheet in self._sheets.values():
+                if sheet['status'] in (QUEUED, RUNNING):
+                    sheet['status'] = CANCELLED if status == CANCELLED else status
+        logger.info(f"Job {self.job_id[:8]} finished with status '{status}'")
+
+
+class JobManager:
+    """
+    Queues execution jobs and runs at most max_concurrent_jobs at a time.
+
+    Jobs run on the manager's own threads, so they keep going while the
+    Streamlit script reruns, and several sessions can share one manager.
+    Jobs beyond the cap wait in submission order. Finished jobs are kept
+    until their session collects them with forget(), or until they have
+    been finished for finished_job_ttl seconds, so the results of
+    abandoned sessions do not pile up.
+
+    Attributes:
+        max_concurrent_jobs (int): Number of jobs that may run at once
+        finished_job_ttl (float): Seconds a finished job is kept, or None to keep it until forgotten
+    """
+
+    def __init__(self, max_concurrent_jobs: int = 2, finished_job_ttl: Optional[float] = 3600):
+        """
+        Initialize JobManager.
+
+        Args:
+            max_concurrent_jobs: Number of jobs that may run at once
+            finished_job_ttl: Seconds a finished job is kept, or None to keep it until forgotten
+        """
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.finished_job_ttl = finished_job_ttl
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, dataframes: Dict[str, Dict[str, pd.DataFrame]], operations: List[Dict[str, Any]],
+               input_keys: Optional[Dict[Tuple[str, str], str]] = None, **executor_options) -> Job:
+        """
+        Queue an execution of the operations.
+
+        Args:
+            dataframes: File name -> sheet name -> DataFrame (or LazyWorkbook)
+            operations: Queued operations, each with 'file' and 'sheet' keys
+            input_keys: (file, sheet) -> fingerprint, for the operation cache
+            **executor_options: Keyword arguments for ParallelExecutor
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(dataframes, operations, executor_options, input_keys=input_keys)
+        with self._lock:
+            self._expire()
+            self._jobs[job.job_id] = job
+        self._pool.submit(job.run)
+        logger.info(f"Queued job {job.job_id[:8]} ({self.queued_count} waiting)")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return the job with the given id, or None."""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job. Returns False if it does not exist or has finished."""
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return False
+        job.cancel()
+        return True
+
+    def forget(self, job_id: str):
+        """Drop a finished job and its results."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.is_finished:
+                del self._jobs[job_id]
+
+    def _expire(self):
+        """Drop jobs finished more than finished_job_ttl seconds ago (lock held)."""
+        if self.finished_job_ttl is None:
+            return
+        cutoff = time.time() - self.finished_job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.is_finished and job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            logger.info(f"Dropped job {job_id[:8]}, its results were not collected in time")
+
+    @property
+    def queued_count(self) -> int:
+        """Number of jobs waiting for a free slot."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == QUEUED)
+
+    @property
+    def running_count(self) -> int:
+        """Number of jobs currently running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == RUNNING)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Return how many queued jobs were submitted before this one, or None if it is not queued."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return None
+            return sum(1 for other in self._jobs.values()
+                       if other.status == QUEUED and other.submitted_at < job.submitted_at)
+
+    def shutdown(self, cancel: bool = True):
+        """Stop accepting jobs, optionally cancelling the ones not finished yet."""
+        if cancel:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,220 @@
+"""
+Lazy Workbook Module
+Workbooks whose sheets are parsed only when they are first used.
+"""
+
+from collections.abc import Mapping
+from typing import Callable, Iterator, List, Optional
+import io
+import logging
+import threading
+
+import openpyxl
+import pandas as pd
+
+from utils.dtype_optimizer import DtypeOptimizer
+from utils.memory import frame_nbytes
+
+logger = logging.getLogger(__name__)
+
+
+class LazySheet:
+    """
+    Handle to one sheet of a LazyWorkbook.
+
+    The sheet is parsed into a DataFrame by load(). Until then (and for
+    sheets that are never transformed) iter_rows() streams the raw cell
+    values straight from the workbook, so an untouched sheet can be
+    exported without a DataFrame round trip.
+
+    Attributes:
+        workbook (LazyWorkbook): Workbook the sheet belongs to
+        name (str): Sheet name
+    """
+
+    def __init__(self, workbook: 'LazyWorkbook', name: str):
+        """
+        Initialize LazySheet.
+
+        Args:
+            workbook: Workbook the sheet belongs to
+            name: Sheet name
+        """
+        self.workbook = workbook
+        self.name = name
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the sheet has already been parsed into a DataFrame."""
+        return self.workbook.is_loaded(self.name)
+
+    def load(self) -> pd.DataFrame:
+        """Return the sheet as a DataFrame, parsing it on first use."""
+        return self.workbook[self.name]
+
+    def iter_rows(self) -> Iterator[tuple]:
+        """
+        Yield the raw cell values of the sheet, header row included.
+
+        .xlsx sheets are read with openpyxl's read-only iterator. Other
+        formats fall back to the parsed DataFrame.
+        """
+        if not self.workbook.supports_raw_rows:
+            df = self.load()
+            yield tuple(str(col) for col in df.columns)
+            for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+                yield row
+            return
+
+        workbook = openpyxl.load_workbook(io.BytesIO(self.workbook.data), read_only=True, data_only=True)
+        try:
+            yield from workbook[self.name].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"LazySheet({self.name!r}, {state})"
+
+
+class LazyWorkbook(Mapping):
+    """
+    Read-only mapping of sheet name to DataFrame that parses sheets on demand.
+
+    Only the sheet names are read when the workbook is opened. Looking up a
+    sheet parses it once and keeps the DataFrame, so iterating over the
+    names (or checking membership) stays cheap while items() and values()
+    load every sheet. Use sheet() to get a LazySheet handle without
+    loading anything.
+
+    Attributes:
+        name (str): File name of the workbook
+        data (bytes): Raw file contents
+        optimize_dtypes (bool): Run DtypeOptimizer on every loaded sheet
+        sheet_names (list): Sheet names in workbook order
+        on_load (callable): Called with the workbook and the sheet name
+            after a sheet is loaded, or None
+    """
+
+    def __init__(self, data: bytes, name: str, optimize_dtypes: bool = False):
+        """
+        Initialize LazyWorkbook.
+
+        Args:
+            data: Raw file contents
+            name: File name, used to pick the parser
+            optimize_dtypes: Convert columns of loaded sheets to compact dtypes
+        """
+        self.name = name
+        self.data = data
+        self.optimize_dtypes = optimize_dtypes
+        self.on_load: Optional[Callable[['LazyWorkbook', str], None]] = None
+        self._frames = {}
+        self._lock = threading.Lock()
+        self._excel_file = pd.ExcelFile(io.BytesIO(data))
+        self.sheet_names: List[str] = list(self._excel_file.sheet_names)
+
+    @property
+    def supports_raw_rows(self) -> bool:
+        """Whether sheets can be streamed as raw rows (.xlsx only)."""
+        return not self.name.lower().endswith('.xls')
+
+    @property
+    def loaded_sheets(self) -> List[str]:
+        """Names of the sheets parsed so far."""
+        return [name for name in self.sheet_names if name in self._frames]
+
+    @property
+    def nbytes(self) -> int:
+        """Raw file size plus the memory of every loaded sheet."""
+        return len(self.data) + sum(frame_nbytes(df) for df in list(self._frames.values()))
+
+    def is_loaded(self, sheet_name: str) -> bool:
+        """Return True if the sheet has been parsed."""
+        return sheet_name in self._frames
+
+    def sheet(self, sheet_name: str) -> LazySheet:
+        """
+        Return a handle to a sheet without loading it.
+
+        Raises:
+            KeyError: If the workbook has no such sheet
+        """
+        if sheet_name not in self.sheet_names:
+            raise KeyError(sheet_name)
+        return LazySheet(self, sheet_name)
+
+    def preload(self, sheet_name: str, df: pd.DataFrame):
+        """
+        Use an already parsed DataFrame for a sheet (e.g. read back from a cache).
+
+        on_load is not called.
+
+        Raises:
+            KeyError: If the workbook has no such sheet
+        """
+        if sheet_name not in self.sheet_names:
+            raise KeyError(sheet_name)
+        with self._lock:
+            self._frames.setdefault(sheet_name, df)
+
+    def head(self, sheet_name: str, rows: int) -> pd.DataFrame:
+        """
+        Return the first rows of a sheet without loading all of it.
+
+        Uses the loaded sheet if there is one. Otherwise only the first
+        rows are parsed, and the result is not kept.
+
+        Raises:
+            KeyError: If the workbook has no such sheet
+        """
+        if sheet_name not in self.sheet_names:
+            raise KeyError(sheet_name)
+        if sheet_name in self._frames:
+            return self._frames[sheet_name].iloc[:rows]
+        with self._lock:
+            return self._parse(sheet_name, nrows=rows)
+
+    def __getitem__(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name not in self.sheet_names:
+            raise KeyError(sheet_name)
+
+        df = self._frames.get(sheet_name)
+        if df is not None:
+            return df
+
+        # The parser is shared, so sheets are loaded one at a time
+        with self._lock:
+            loaded = sheet_name not in self._frames
+            if loaded:
+                self._frames[sheet_name] = self._parse(sheet_name)
+            df = self._frames[sheet_name]
+        if loaded and self.on_load is not None:
+            self.on_load(self, sheet_name)
+        return df
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.sheet_names)
+
+    def __len__(self) -> int:
+        return len(self.sheet_names)
+
+    def __contains__(self, sheet_name) -> bool:
+        return sheet_name in self.sheet_names
+
+    def _parse(self, sheet_name: str, nrows: Optional[int] = None) -> pd.DataFrame:
+        """Parse one sheet (or its first nrows rows), optimizing its dtypes if requested."""
+        df = self._excel_file.parse(sheet_name, nrows=nrows)
+        logger.info(f"Loaded sheet '{sheet_name}' of '{self.name}' with {len(df)} rows "
+                    f"and {len(df.columns)} columns")
+
+        if self.optimize_dtypes:
+            df, report = DtypeOptimizer().optimize(df)
+            df.attrs['dtype_optimization'] = report
+            logger.info(f"Optimized dtypes of sheet '{sheet_name}': "
+                        f"{report['bytes_before']} -> {report['bytes_after']} bytes")
+        return df
+
+    def __repr__(self) -> str:
+        return (f"LazyWorkbook({self.name!r}, {len(self.loaded_sheets)}/{len(self.sheet_names)} "
+                f"sheet(s) loaded)")
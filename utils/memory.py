@@ -0,0 +1,110 @@
+"""
+Memory Module
+Helpers for measuring memory usage of operation runs.
+"""
+
+import threading
+import tracemalloc
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Trackers currently inside their block, outermost first
+_active_trackers = []
+_trackers_lock = threading.Lock()
+# Whether the trackers started tracemalloc (and stop it when the last one exits)
+_tracing_started = False
+
+
+class PeakMemoryTracker:
+    """
+    Context manager that measures the peak memory allocated inside a block.
+
+    Uses tracemalloc, which also sees numpy/pandas buffers. Tracing is only
+    started if it is not already running, and stopped again once the last
+    active tracker exits. Trackers can be nested or run in several threads
+    at once: the tracemalloc peak is global, so before a tracker resets it,
+    the peak so far is saved in every other active tracker.
+
+    Attributes:
+        enabled (bool): Whether memory is tracked at all
+        peak_bytes (int): Peak allocation above the starting point, or None
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+        Initialize PeakMemoryTracker.
+
+        Args:
+            enabled: Set to False to turn the tracker into a no-op
+        """
+        self.enabled = enabled
+        self.peak_bytes = None
+        self._baseline = 0
+        self._saved_peak = 0
+
+    def __enter__(self):
+        global _tracing_started
+        if self.enabled:
+            with _trackers_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracing_started = True
+                current, peak = tracemalloc.get_traced_memory()
+                for tracker in _active_trackers:
+                    tracker._saved_peak = max(tracker._saved_peak, peak)
+                self._baseline = current
+                self._saved_peak = current
+                tracemalloc.reset_peak()
+                _active_trackers.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        global _tracing_started
+        if self.enabled:
+            with _trackers_lock:
+                peak = max(tracemalloc.get_traced_memory()[1], self._saved_peak)
+                self.peak_bytes = max(0, peak - self._baseline)
+                _active_trackers.remove(self)
+                for tracker in _active_trackers:
+                    tracker._saved_peak = max(tracker._saved_peak, peak)
+                if not _active_trackers and _tracing_started:
+                    tracemalloc.stop()
+                    _tracing_started = False
+        return False
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """
+    Return the memory used by a DataFrame, including Python string objects.
+
+    Args:
+        df: DataFrame to measure
+
+    Returns:
+        int: Size in bytes
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def format_bytes(num_bytes) -> str:
+    """
+    Format a byte count as a human readable string.
+
+    Args:
+        num_bytes: Number of bytes
+
+    Returns:
+        str: Formatted size such as '12.3 MB'
+    """
+    if num_bytes is None:
+        return "n/a"
+
+    size = float(num_bytes)
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
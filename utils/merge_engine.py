@@ -0,0 +1,251 @@
+"""
+Merge Engine Module
+Stacks sheets across files and joins them on key columns through reusable hash indexes.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.dedup_engine import DedupEngine
+
+logger = logging.getLogger(__name__)
+
+MERGE_OPERATIONS = ["Stack Sheets", "Lookup Values", "Join Sheet"]
+JOIN_TYPES = ["left", "inner"]
+
+
+def source_refs(operation: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Return the (file, sheet) pairs a merge operation reads from.
+
+    Args:
+        operation: Operation dictionary
+
+    Returns:
+        List of (file, sheet) pairs, empty for other operation types
+    """
+    if operation.get('type') != "Merge Operations":
+        return []
+    if operation.get('operation') == "Stack Sheets":
+        return [(source.get('file'), source.get('sheet')) for source in operation.get('sources', [])]
+    source = operation.get('source') or {}
+    return [(source.get('file'), source.get('sheet'))]
+
+
+class JoinIndex:
+    """
+    Hash index over the key columns of a sheet.
+
+    Key rows are fingerprinted with DedupEngine and the distinct
+    fingerprints are put in a hash table once, so one index serves any
+    number of lookups into the same sheet and every probe is a single
+    vectorized hash lookup. Rows with a missing key never match. As with
+    DedupEngine, two different keys share a fingerprint with negligible
+    probability and would then match.
+
+    Attributes:
+        columns (list): Key columns of the indexed sheet
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Sequence[str], engine: Optional[DedupEngine] = None):
+        """
+        Build the index.
+
+        Args:
+            df: Indexed sheet
+            columns: Key columns
+            engine: DedupEngine used for fingerprints
+        """
+        self.columns = list(columns)
+        self._engine = engine or DedupEngine()
+        fingerprints = self._engine.fingerprints(df, self.columns)
+        present = np.flatnonzero(df[self.columns].notna().all(axis=1).to_numpy())
+        order = np.argsort(fingerprints[present], kind='stable')
+        # Rows grouped by key, in sheet order within a key
+        self._positions = present[order]
+        keys, starts, counts = np.unique(fingerprints[self._positions], return_index=True, return_counts=True)
+        self._keys = pd.Index(keys)
+        self._starts = starts
+        self._counts = counts
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _ranges(self, df: pd.DataFrame, columns: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return where each row's matches start in the grouped positions and how many there are."""
+        # A probe key with a missing value hashes to a fingerprint no indexed row has
+        slots = self._keys.get_indexer(self._engine.fingerprints(df, list(columns)))
+        found = slots >= 0
+        starts = np.where(found, self._starts[slots], 0) if len(self._keys) else np.zeros(len(df), dtype=np.int64)
+        counts = np.where(found, self._counts[slots], 0) if len(self._keys) else np.zeros(len(df), dtype=np.int64)
+        return starts, counts
+
+    def lookup(self, df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+        """
+        Find the first matching indexed row of every row of df.
+
+        Args:
+            df: Probing frame
+            columns: Its key columns, in the order of the index columns
+
+        Returns:
+            np.ndarray: Row position in the indexed sheet, -1 where nothing matches
+        """
+        starts, counts = self._ranges(df, columns)
+        matches = np.full(len(df), -1, dtype=np.int64)
+        found = counts > 0
+        matches[found] = self._positions[starts[found]]
+        return matches
+
+    def join(self, df: pd.DataFrame, columns: Sequence[str], how: str = 'left') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pair every row of df with all matching indexed rows.
+
+        Args:
+            df: Probing frame
+            columns: Its key columns, in the order of the index columns
+            how: 'inner' drops rows without a match; 'left' keeps them once,
+                paired with -1
+
+        Returns:
+            Tuple of row positions into df and into the indexed sheet, in
+            the row order of df
+        """
+        starts, counts = self._ranges(df, columns)
+        unmatched = counts == 0
+        if how == 'left':
+            counts = np.where(unmatched, 1, counts)
+        left = np.repeat(np.arange(len(df)), counts)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+        right = np.full(len(left), -1, dtype=np.int64)
+        matched = ~np.repeat(unmatched, counts)
+        right[matched] = self._positions[(np.repeat(starts, counts) + offsets)[matched]]
+        return left, right
+
+
+class JoinIndexCache:
+    """
+    Thread-safe store of JoinIndex objects for one execution.
+
+    Indexes are keyed by source sheet and key columns, so operations that
+    join the same sheet on the same keys (e.g. a lookup table used by every
+    monthly file) build the index once.
+    """
+
+    def __init__(self):
+        """Initialize an empty JoinIndexCache."""
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, source: Tuple[str, str], df: pd.DataFrame, columns: Sequence[str]) -> JoinIndex:
+        """
+        Return the index of a source sheet on the given columns, building it on first use.
+
+        Args:
+            source: (file, sheet) of the indexed sheet
+            df: The source sheet
+            columns: Key columns
+
+        Returns:
+            JoinIndex: Shared index (read-only)
+        """
+        key = (source, tuple(columns))
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = JoinIndex(df, columns)
+                self._indexes[key] = index
+                self.builds += 1
+                logger.info(f"Built join index on {source[0]}/{source[1]} [{', '.join(map(str, columns))}]")
+            return index
+
+
+def _take_rows(df: pd.DataFrame, positions: np.ndarray, index: pd.Index) -> pd.DataFrame:
+    """Gather rows by position, with all-missing rows where the position is -1."""
+    return df.reset_index(drop=True).reindex(positions).set_axis(index, axis=0)
+
+
+def stack_labels(refs: List[Tuple[str, str]]) -> List[str]:
+    """Label stacked sheets by file name, or by 'file / sheet' if a file appears twice."""
+    files = [file_name for file_name, _ in refs]
+    return files if len(set(files)) == len(files) else [f"{file_name} / {sheet}" for file_name, sheet in refs]
+
+
+def stack_sheets(df: pd.DataFrame, parts: List[Tuple[Tuple[str, str], pd.DataFrame]],
+                 own_ref: Tuple[str, str], source_column: Optional[str] = None) -> pd.DataFrame:
+    """
+    Append the rows of other sheets below df.
+
+    Columns are aligned by name; columns missing from a part are left empty.
+
+    Args:
+        df: Current sheet
+        parts: ((file, sheet), frame) of each appended sheet, in order
+        own_ref: (file, sheet) of the current sheet, for source_column
+        source_column: If given, a column recording where each row came
+            from: the file name, or 'file / sheet' if a file appears twice
+
+    Returns:
+        pd.DataFrame: Stacked rows with a new RangeIndex
+    """
+    frames = [df] + [frame for _, frame in parts]
+    if source_column:
+        labels = stack_labels([own_ref] + [ref for ref, _ in parts])
+        frames = [frame.assign(**{source_column: label}) for frame, label in zip(frames, labels)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def lookup_values(df: pd.DataFrame, source: pd.DataFrame, index: JoinIndex, left_on: Sequence[str],
+                  columns: Sequence[str], inplace: bool = False) -> pd.DataFrame:
+    """
+    Add columns of the first matching source row to every row (many-to-one lookup).
+
+    Args:
+        df: Current sheet
+        source: Looked-up sheet
+        index: JoinIndex of source on its key columns
+        left_on: Key columns of df, matching the index columns in order
+        columns: Source columns to bring in; existing columns of df with
+            the same name are replaced
+        inplace: Add the columns to df itself
+
+    Returns:
+        pd.DataFrame: df with the looked-up columns (missing where no row matched)
+    """
+    result_df = df if inplace else df.copy()
+    matches = index.lookup(result_df, left_on)
+    looked_up = _take_rows(source[list(columns)], matches, result_df.index)
+    for column in columns:
+        result_df[column] = looked_up[column]
+    return result_df
+
+
+def join_sheet(df: pd.DataFrame, source: pd.DataFrame, index: JoinIndex, left_on: Sequence[str],
+               how: str = 'left', suffix: str = '_right') -> pd.DataFrame:
+    """
+    Join df with every matching source row (one-to-many allowed).
+
+    Args:
+        df: Current sheet
+        source: Joined sheet
+        index: JoinIndex of source on its key columns
+        left_on: Key columns of df, matching the index columns in order
+        how: 'left' or 'inner'
+        suffix: Appended to source column names that already exist in df
+
+    Returns:
+        pd.DataFrame: Joined rows in the order of df, with a new RangeIndex
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unknown join type '{how}'. Supported: {JOIN_TYPES}")
+    left, right = index.join(df, left_on, how)
+    result_df = df.take(left).reset_index(drop=True)
+    extra = [column for column in source.columns if column not in index.columns]
+    joined = _take_rows(source[extra], right, result_df.index)
+    joined.columns = [f"{column}{suffix}" if column in result_df.columns else column for column in extra]
+    return pd.concat([result_df, joined], axis=1)
@@ -0,0 +1,156 @@
+"""
+Profiler Module
+Per-operation run reports and OpenMetrics counters.
+"""
+
+from typing import Any, Dict, List, Optional
+import logging
+import threading
+
+import pandas as pd
+
+from utils.memory import format_bytes, frame_nbytes
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'excel_tool_operation'
+
+
+def operation_record(index: int, operation: Dict[str, Any], seconds: Optional[float] = None,
+                     rows_in: Optional[int] = None, result_df: Optional[pd.DataFrame] = None,
+                     peak_memory_bytes: Optional[int] = None, cached: bool = False) -> Dict[str, Any]:
+    """
+    Build the profile record of one operation in a chain.
+
+    Args:
+        index: Position of the operation in the (planned) chain
+        operation: Operation dictionary
+        seconds: Wall time of the operation
+        rows_in: Rows before the operation
+        result_df: Output of the operation, measured for rows and bytes
+        peak_memory_bytes: Peak memory allocated while it ran
+        cached: The result came from the operation cache, nothing ran
+
+    Returns:
+        Dict with 'index', 'type', 'operation', 'cached', 'seconds',
+        'rows_in', 'rows_out', 'peak_memory_bytes' and 'output_bytes'
+        (measurements are None for cached operations)
+    """
+    return {
+        'index': index,
+        'type': operation.get('type'),
+        'operation': operation.get('operation'),
+        'cached': cached,
+        'seconds': seconds,
+        'rows_in': rows_in,
+        'rows_out': None if result_df is None else len(result_df),
+        'peak_memory_bytes': peak_memory_bytes,
+        'output_bytes': None if result_df is None else frame_nbytes(result_df)
+    }
+
+
+def _escape_label(value: Any) -> str:
+    """Escape a label value for the OpenMetrics text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class OperationMetrics:
+    """
+    Cumulative per-operation counters, rendered in the OpenMetrics text format.
+
+    Counters are kept per (type, operation) label pair: number of runs,
+    seconds, rows in and out and output bytes, plus the largest peak
+    memory seen as a gauge. Cached operations only count as cache hits.
+    Thread-safe, so one instance can collect from every job on a server.
+    """
+
+    COUNTERS = [
+        ('runs', 'Operations executed'),
+        ('cache_hits', 'Operations served from the operation cache'),
+        ('seconds', 'Wall time spent in operations'),
+        ('rows_in', 'Rows passed into operations'),
+        ('rows_out', 'Rows produced by operations'),
+        ('output_bytes', 'Memory of operation outputs')
+    ]
+
+    def __init__(self):
+        """Initialize OperationMetrics with empty counters."""
+        self._counters = {}
+        self._peaks = {}
+        self._lock = threading.Lock()
+
+    def record(self, records: List[Dict[str, Any]]):
+        """
+        Add the profile records of one sheet run.
+
+        Args:
+            records: Records from operation_record (last_run_stats['profile'])
+        """
+        with self._lock:
+            for record in records:
+                labels = (record['type'] or '', record['operation'] or '')
+                counters = self._counters.setdefault(labels, {name: 0 for name, _ in self.COUNTERS})
+                if record['cached']:
+                    counters['cache_hits'] += 1
+                    continue
+                counters['runs'] += 1
+                for name in ('seconds', 'rows_in', 'rows_out', 'output_bytes'):
+                    counters[name] += record[name] or 0
+                if record['peak_memory_bytes'] is not None:
+                    self._peaks[labels] = max(self._peaks.get(labels, 0), record['peak_memory_bytes'])
+
+    def render(self) -> str:
+        """Return all metrics in the OpenMetrics text exposition format."""
+        with self._lock:
+            counters = {labels: dict(values) for labels, values in self._counters.items()}
+            peaks = dict(self._peaks)
+
+        lines = []
+        for name, help_text in self.COUNTERS:
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"# HELP {metric} {help_text}.")
+            for labels, values in counters.items():
+                lines.append(f"{metric}_total{self._format_labels(labels)} {values[name]}")
+
+        metric = f"{METRIC_PREFIX}_peak_memory_bytes"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"# HELP {metric} Largest peak memory of a single operation run.")
+        for labels, peak in peaks.items():
+            lines.append(f"{metric}{self._format_labels(labels)} {peak}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write the metrics to a file, e.g. for a node_exporter textfile collector."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        """Format a (type, operation) pair as an OpenMetrics label set."""
+        op_type, op_name = labels
+        return f'{{type="{_escape_label(op_type)}",operation="{_escape_label(op_name)}"}}'
+
+
+def format_profile(records: List[Dict[str, Any]]) -> List[str]:
+    """
+    Format profile records as text lines, one per operation.
+
+    Args:
+        records: Records from operation_record
+
+    Returns:
+        List of lines such as '1. Filtering - Filter Rows: 0.012s, 1000 -> 420 rows, ...'
+    """
+    lines = []
+    for record in records:
+        name = f"{record['index'] + 1}. {record['type']} - {record['operation']}"
+        if record['cached']:
+            lines.append(f"{name}: cached")
+            continue
+        lines.append(f"{name}: {record['seconds']:.3f}s, {record['rows_in']} -> {record['rows_out']} rows, "
+                     f"peak {format_bytes(record['peak_memory_bytes'])}, "
+                     f"output {format_bytes(record['output_bytes'])}")
+    return lines
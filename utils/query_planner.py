@@ -0,0 +1,337 @@
+"""
+Query Planner Module
+Rewrites an operation queue into an equivalent but cheaper execution plan.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+import logging
+
+from utils.filter_engine import condition_columns
+from utils.formula_engine import FormulaError, compile_formulas, formula_pairs
+
+logger = logging.getLogger(__name__)
+
+# Kinds of operations, as far as reordering is concerned
+MAP = 'map'          # Row-local: each output row depends only on the same input row
+ROWS = 'rows'        # Row selection: drops rows, leaves values untouched
+BARRIER = 'barrier'  # Depends on the whole frame (or is unknown): nothing moves across it
+
+MAP_TEXT_OPERATIONS = {"Lowercase", "Uppercase", "Title Case", "Trim Spaces", "Replace Text", "Extract Pattern"}
+MAP_MATH_OPERATIONS = {"Add Columns", "Subtract Columns", "Multiply Columns", "Divide Columns",
+                       "Percentage Change", "Sum", "Mean", "Median", "Min", "Max",
+                       "Conditional Calculation"}
+
+
+def operation_effects(operation: Dict[str, Any]) -> Tuple[str, Optional[Set[str]], Optional[Set[str]]]:
+    """
+    Describe how an operation interacts with rows and columns.
+
+    Args:
+        operation: Operation dictionary
+
+    Returns:
+        Tuple of (kind, reads, writes). reads/writes are sets of column
+        names, or None when the operation may touch every column.
+    """
+    op_type = operation.get('type')
+    op_name = operation.get('operation')
+
+    if op_type == "Filtering":
+        return ROWS, condition_columns(operation), set()
+
+    if op_type == "Data Cleaning":
+        if op_name == "Remove Duplicates":
+            columns = operation.get('columns')
+            return ROWS, (set(columns) if columns else None), set()
+        if op_name == "Remove Empty Rows":
+            return ROWS, None, set()
+        if op_name == "Fill Missing Values" and operation.get('method') == "Custom Value":
+            column = operation.get('column')
+            return MAP, {column}, {column}
+
+    elif op_type == "Column Operations":
+        if op_name == "Merge Columns":
+            return MAP, set(operation.get('columns', [])), {operation.get('new_column')}
+        if op_name == "Rename Column":
+            names = {operation.get('old_name'), operation.get('new_name')}
+            return MAP, names, names
+        if op_name == "Delete Column":
+            return MAP, set(), set(operation.get('columns', []))
+
+    elif op_type == "Mathematical Operations" and op_name == "Formula":
+        try:
+            program = compile_formulas(formula_pairs(operation))
+        except FormulaError:
+            return BARRIER, None, None
+        return MAP, set(program.columns), {column for column, _ in program.outputs}
+
+    elif op_type == "Mathematical Operations" and op_name in MAP_MATH_OPERATIONS:
+        if op_name == "Conditional Calculation":
+            reads = {operation.get('condition_col')}
+        elif operation.get('columns') is not None:
+            reads = set(operation.get('columns'))
+        else:
+            reads = {operation.get('col1'), operation.get('col2')}
+        return MAP, reads, {operation.get('result_column')}
+
+    elif op_type == "Text Operations" and (op_name in MAP_TEXT_OPERATIONS or operation.get('steps')):
+        column = operation.get('column')
+        return MAP, {column}, {operation.get('result_column') or column}
+
+    elif op_type == "Date Operations" and op_name == "Convert to Date":
+        # Only an explicit format is row-local; inferred formats depend on a sample of the rows
+        column = operation.get('column')
+        return MAP, {column}, {operation.get('result_column') or column}
+
+    elif op_type == "Merge Operations" and op_name == "Lookup Values" and operation.get('columns'):
+        # One looked-up row per input row; stacking and joining change the rows
+        return MAP, set(operation.get('left_on', [])), set(operation['columns'])
+
+    return BARRIER, None, None
+
+
+def describe_condition(condition: Dict[str, Any]) -> str:
+    """Return a filter condition or nested group as readable text."""
+    if condition.get('conditions'):
+        logic = f" {condition.get('logic', 'AND')} "
+        parts = [describe_condition(child) for child in condition['conditions']]
+        parts = [f"({part})" if child.get('conditions') else part
+                 for part, child in zip(parts, condition['conditions'])]
+        return logic.join(parts)
+    return f"{condition.get('column')} {condition.get('operator')} {condition.get('value')!r}"
+
+
+def describe_operation(operation: Dict[str, Any]) -> str:
+    """Return a one-line description of an operation for plan output."""
+    if operation.get('type') == "Filtering":
+        return f"Filtering - Filter Rows [{describe_condition(operation)}]"
+
+    description = f"{operation.get('type')} - {operation.get('operation', '')}"
+    if operation.get('steps'):
+        description = f"{operation.get('type')} - {' > '.join(step.get('operation') for step in operation['steps'])}"
+    column = operation.get('column') or operation.get('result_column') or operation.get('new_column')
+    if column:
+        description += f" [{column}]"
+    elif operation.get('columns'):
+        description += f" [{', '.join(map(str, operation['columns']))}]"
+    elif operation.get('formulas'):
+        description += f" [{', '.join(str(formula.get('column')) for formula in operation['formulas'])}]"
+    elif operation.get('type') == "Aggregation":
+        keys = list(operation.get('keys', operation.get('index', [])))
+        if operation.get('pivot_column'):
+            keys.append(f"columns: {operation['pivot_column']}")
+        description += f" [by {', '.join(map(str, keys)) or 'all rows'}]"
+    if operation.get('across_files'):
+        description += " (across files)"
+    sources = operation.get('sources') or ([operation['source']] if operation.get('source') else [])
+    if sources:
+        description += " <- " + ", ".join(f"{source.get('file')}/{source.get('sheet')}" for source in sources)
+    return description
+
+
+class QueryPlanner:
+    """
+    Rewrites an operation queue into an equivalent, cheaper plan.
+
+    The planner removes operations whose output columns are deleted before
+    anything reads them, moves row filters and duplicate removal ahead of
+    row-local operations they do not depend on, fuses adjacent filters
+    into one boolean mask and fuses text operations on the same column
+    into one pass. Operations it does not understand are barriers that
+    nothing is moved across.
+
+    Attributes:
+        notes (list): Human readable list of rewrites made by the last plan() call
+    """
+
+    def __init__(self):
+        """Initialize QueryPlanner."""
+        self.notes = []
+
+    def plan(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Build an optimized execution plan for a list of operations.
+
+        The input list and its operation dictionaries are not modified.
+
+        Args:
+            operations: Operations in the order the user added them
+
+        Returns:
+            List of operation dictionaries to execute instead
+        """
+        self.notes = []
+        steps = [([idx + 1], operation) for idx, operation in enumerate(operations)]
+
+        steps = self._eliminate_dead_columns(steps)
+        steps = self._push_down_row_operations(steps)
+        steps = self._fuse_filters(steps)
+        steps = self._fuse_text_operations(steps)
+
+        return [operation for _, operation in steps]
+
+    def explain(self, operations: List[Dict[str, Any]]) -> str:
+        """
+        Dry run: describe the plan chosen for a list of operations.
+
+        Args:
+            operations: Operations in the order the user added them
+
+        Returns:
+            str: Original order, rewrites made and the final plan
+        """
+        planned = self.plan(operations)
+
+        lines = ["Original order:"]
+        lines += [f"  {idx + 1}. {describe_operation(op)}" for idx, op in enumerate(operations)]
+        lines.append("Rewrites:")
+        lines += [f"  - {note}" for note in self.notes] or ["  (none)"]
+        lines.append("Execution plan:")
+        lines += [f"  {idx + 1}. {describe_operation(op)}" for idx, op in enumerate(planned)]
+        return "\n".join(lines)
+
+    def _eliminate_dead_columns(self, steps):
+        """Drop row-local operations whose outputs are deleted before being read."""
+        changed = True
+        while changed:
+            changed = False
+            for idx, (positions, operation) in enumerate(steps):
+                kind, _, writes = operation_effects(operation)
+                if kind != MAP or not writes or self._is_delete(operation):
+                    continue
+                if all(self._is_dead(column, steps[idx + 1:]) for column in writes):
+                    self.notes.append(f"Removed op {positions[0]} ({describe_operation(operation)}): "
+                                      f"its output is deleted before it is used")
+                    steps = steps[:idx] + steps[idx + 1:]
+                    changed = True
+                    break
+        return steps
+
+    def _is_dead(self, column: str, later_steps) -> bool:
+        """Return True if column is deleted later without being read first."""
+        for _, operation in later_steps:
+            kind, reads, writes = operation_effects(operation)
+            if kind == BARRIER or reads is None or column in reads:
+                return False
+            if self._is_delete(operation) and column in writes:
+                return True
+            if writes and column in writes:
+                return False
+        return False
+
+    def _push_down_row_operations(self, steps):
+        """Move filters and duplicate removal ahead of independent row-local operations."""
+        result = []
+        for positions, operation in steps:
+            kind, reads, _ = operation_effects(operation)
+            insert_at = len(result)
+
+            if kind == ROWS:
+                while insert_at > 0:
+                    prev_operation = result[insert_at - 1][1]
+                    prev_kind, _, prev_writes = operation_effects(prev_operation)
+                    if self._is_row_predicate(operation) and self._is_row_predicate(prev_operation):
+                        # Per-row predicates commute with each other
+                        insert_at -= 1
+                        continue
+                    if prev_kind != MAP:
+                        break
+                    if reads is None or prev_writes is None or reads & prev_writes:
+                        break
+                    insert_at -= 1
+
+                moved = len(result) - insert_at
+                if moved:
+                    self.notes.append(f"Moved op {positions[0]} ({describe_operation(operation)}) "
+                                      f"ahead of {moved} operation(s)")
+
+            result.insert(insert_at, (positions, operation))
+        return result
+
+    def _fuse_filters(self, steps):
+        """Merge runs of adjacent filters into a single AND mask (OR filters become nested groups)."""
+        result = []
+        for positions, operation in steps:
+            if result and self._is_filter(operation) and self._is_filter(result[-1][1]):
+                prev_positions, prev_operation = result[-1]
+                fused = {
+                    'type': "Filtering",
+                    'operation': "Filter Rows",
+                    'conditions': self._conditions(prev_operation) + self._conditions(operation),
+                    'logic': "AND",
+                    'file': operation.get('file'),
+                    'sheet': operation.get('sheet')
+                }
+                self.notes.append(f"Fused filters from ops {', '.join(map(str, prev_positions + positions))} "
+                                  f"into one mask")
+                result[-1] = (prev_positions + positions, fused)
+            else:
+                result.append((positions, operation))
+        return result
+
+    def _fuse_text_operations(self, steps):
+        """Merge text operations on one column, across row-local operations on other columns, into one pass."""
+        result = []
+        for positions, operation in steps:
+            column = operation.get('column')
+            target = None
+            if self._is_text_in_place(operation):
+                for idx in range(len(result) - 1, -1, -1):
+                    prev_operation = result[idx][1]
+                    if self._is_text_in_place(prev_operation) and prev_operation.get('column') == column:
+                        target = idx
+                        break
+                    kind, reads, writes = operation_effects(prev_operation)
+                    if kind != MAP or reads is None or writes is None or column in reads | writes:
+                        break
+            
+            if target is None:
+                result.append((positions, operation))
+                continue
+            
+            prev_positions, prev_operation = result[target]
+            fused = {
+                'type': "Text Operations",
+                'operation': "Text Chain",
+                'column': column,
+                'steps': list(prev_operation.get('steps') or [prev_operation]) + [operation],
+                'file': operation.get('file'),
+                'sheet': operation.get('sheet')
+            }
+            self.notes.append(f"Fused text operations from ops {', '.join(map(str, prev_positions + positions))} "
+                              f"on '{column}' into one pass")
+            result[target] = (prev_positions + positions, fused)
+        return result
+
+    @staticmethod
+    def _is_text_in_place(operation: Dict[str, Any]) -> bool:
+        """Return True for text operations that rewrite their own column."""
+        if operation.get('type') != "Text Operations":
+            return False
+        if operation.get('operation') not in MAP_TEXT_OPERATIONS and not operation.get('steps'):
+            return False
+        return operation.get('result_column') in (None, '', operation.get('column'))
+
+    @staticmethod
+    def _is_delete(operation: Dict[str, Any]) -> bool:
+        return operation.get('type') == "Column Operations" and operation.get('operation') == "Delete Column"
+
+    @staticmethod
+    def _is_row_predicate(operation: Dict[str, Any]) -> bool:
+        """Return True for row operations that keep or drop each row on its own."""
+        return (operation.get('type') == "Filtering"
+                or (operation.get('type') == "Data Cleaning" and operation.get('operation') == "Remove Empty Rows"))
+
+    @staticmethod
+    def _is_filter(operation: Dict[str, Any]) -> bool:
+        return operation.get('type') == "Filtering"
+
+    @staticmethod
+    def _conditions(operation: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return a filter as a list of conditions to AND together."""
+        if operation.get('conditions'):
+            if str(operation.get('logic', 'AND')).upper() == "AND":
+                return list(operation['conditions'])
+            # An OR filter becomes one nested group of the fused AND
+            return [{'conditions': list(operation['conditions']), 'logic': operation.get('logic')}]
+        return [{key: operation.get(key) for key in ('column', 'operator', 'value')}]
@@ -0,0 +1,115 @@
+"""
+Result Cache Module
+Memoizes the output of every operation in a chain for incremental re-runs.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import logging
+import threading
+
+import pandas as pd
+
+from utils.memory import frame_nbytes
+
+logger = logging.getLogger(__name__)
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Return a content fingerprint of a DataFrame.
+
+    Use it as the input key when no cheaper identity (such as the content
+    hash of the uploaded file) is available.
+
+    Args:
+        df: DataFrame to fingerprint
+
+    Returns:
+        str: Hex digest covering columns, dtypes, index and values
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(repr(df.dtypes.astype(str).tolist()).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def chain_key(input_key: str, operation: Dict[str, Any]) -> str:
+    """
+    Return the cache key of an operation's output.
+
+    The key covers the key of the operation's input and the full operation
+    dictionary, so changing any earlier operation changes every later key.
+
+    Args:
+        input_key: Key of the input (a fingerprint or the previous chain key)
+        operation: Operation dictionary
+
+    Returns:
+        str: Hex digest
+    """
+    payload = json.dumps(operation, sort_keys=True, default=str)
+    return hashlib.sha256(f"{input_key}|{payload}".encode()).hexdigest()
+
+
+class OperationCache:
+    """
+    LRU cache of intermediate DataFrames of operation chains.
+
+    Entries are evicted least recently used first once they exceed
+    max_bytes. Cached DataFrames are shared and must not be modified.
+
+    Attributes:
+        max_bytes (int): Memory budget for cached DataFrames
+    """
+
+    def __init__(self, max_bytes: int = 1024 ** 3):
+        """
+        Initialize OperationCache.
+
+        Args:
+            max_bytes: Memory budget for cached DataFrames in bytes
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def current_bytes(self) -> int:
+        """Memory currently used by cached DataFrames."""
+        return sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Return the cached DataFrame for key, or None."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, df: pd.DataFrame):
+        """Cache a DataFrame under key, evicting old entries to stay within budget."""
+        size = frame_nbytes(df)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._entries[key] = df
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            while self.current_bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                del self._sizes[evicted]
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
@@ -0,0 +1,120 @@
+"""
+Sampling Module
+Runs operation chains on a sample of a sheet and extrapolates the full run.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from utils.executor import run_sheet
+from utils.memory import frame_nbytes
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_METHODS = ['head', 'random', 'stratified']
+
+
+def sample_frame(df: pd.DataFrame, sample_rows: int, method: str = 'head',
+                 stratify_column: Optional[str] = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Take a sample of about sample_rows rows, keeping the original row order.
+
+    Args:
+        df: Sheet to sample
+        sample_rows: Number of rows in the sample (stratified samples can
+            be slightly larger, since every group keeps at least one row)
+        method: 'head' (first rows), 'random' (uniform without replacement)
+            or 'stratified' (proportional per value of stratify_column, at
+            least one row per value)
+        stratify_column: Column to stratify by, required for 'stratified'
+        seed: Random seed, so repeated previews show the same rows
+
+    Returns:
+        pd.DataFrame: Sampled rows with their original index
+
+    Raises:
+        ValueError: If the method is unknown or the stratify column is missing
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Unknown sample method '{method}'. Supported: {SAMPLE_METHODS}")
+    if sample_rows >= len(df):
+        return df
+    if method == 'head':
+        return df.iloc[:sample_rows]
+
+    rng = np.random.default_rng(seed)
+    if method == 'random':
+        return df.take(np.sort(rng.choice(len(df), size=sample_rows, replace=False)))
+
+    if stratify_column not in df.columns:
+        raise ValueError(f"Column '{stratify_column}' not found for stratified sampling")
+
+    # Rank rows randomly inside each group (missing values form their own) and keep each group's quota
+    codes = pd.factorize(df[stratify_column], use_na_sentinel=False)[0]
+    quota = np.maximum(1, np.round(np.bincount(codes)[codes] * sample_rows / len(df)))
+    order = pd.Series(rng.random(len(df))).groupby(codes).rank(method='first').to_numpy()
+    return df.take(np.flatnonzero(order <= quota))
+
+
+def estimate_full_run(sample_rows: int, total_rows: int, seconds: float, rows_out: int,
+                      bytes_out: int) -> Dict[str, Any]:
+    """
+    Extrapolate run time and output size from a sample run.
+
+    Assumes cost and output grow linearly with the number of rows. That
+    holds for row-local operations and filters; Remove Duplicates and
+    fills computed from the whole column can deviate.
+
+    Args:
+        sample_rows: Rows in the sample
+        total_rows: Rows in the full sheet
+        seconds: Wall time of the sample run
+        rows_out: Rows produced by the sample run
+        bytes_out: Memory of the sample output
+
+    Returns:
+        Dict with 'seconds', 'rows' and 'bytes' estimates for the full sheet
+    """
+    scale = total_rows / sample_rows if sample_rows else 0.0
+    return {
+        'seconds': seconds * scale,
+        'rows': int(round(rows_out * scale)),
+        'bytes': int(bytes_out * scale)
+    }
+
+
+def preview_sheet(df: pd.DataFrame, operations: List[Dict[str, Any]], total_rows: Optional[int] = None,
+                  optimize: bool = True, sources: Optional[Dict[Tuple[str, str], pd.DataFrame]] = None) -> Dict[str, Any]:
+    """
+    Run an operation chain on a sample and estimate the full run.
+
+    Args:
+        df: Sample of the sheet (see sample_frame)
+        operations: Operations for this sheet, in queue order
+        total_rows: Rows in the full sheet, or None if unknown
+        optimize: Plan the chain with QueryPlanner first
+        sources: Full sheets read by merge operations (see resolve_sources)
+
+    Returns:
+        Dict with the sample result 'dataframe', 'sample_rows', 'total_rows',
+        'seconds' of the sample run and the full-run 'estimate' (None
+        when total_rows is unknown)
+    """
+    result = run_sheet(df, operations, optimize=optimize, sources=sources)
+    result_df = result['dataframe']
+    estimate = None
+    if total_rows is not None:
+        estimate = estimate_full_run(len(df), total_rows, result['seconds'], len(result_df),
+                                     frame_nbytes(result_df))
+    logger.info(f"Previewed {len(operations)} operation(s) on {len(df)} of {total_rows} rows")
+
+    return {
+        'dataframe': result_df,
+        'sample_rows': len(df),
+        'total_rows': total_rows,
+        'seconds': result['seconds'],
+        'estimate': estimate
+    }
@@ -0,0 +1,191 @@
+"""
+Text Engine Module
+Null-preserving string kernels for text operations, with chains fused per column.
+"""
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TEXT_OPERATIONS = ["Lowercase", "Uppercase", "Title Case", "Trim Spaces", "Replace Text", "Extract Pattern"]
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern: str) -> re.Pattern:
+    """
+    Compile an Extract Pattern regex once per pattern.
+
+    Raises:
+        ValueError: If the pattern is not a valid regular expression
+    """
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern '{pattern}': {e}") from e
+
+
+def pattern_group(operation: Dict[str, Any]) -> Any:
+    """
+    Return the group an Extract Pattern operation keeps.
+
+    'group' may be a group number or name; by default the first group if
+    the pattern has one, else the whole match.
+    """
+    regex = compile_pattern(operation.get('pattern', ''))
+    group = operation.get('group')
+    if group in (None, ''):
+        return 1 if regex.groups else 0
+    if isinstance(group, str) and group.isdigit():
+        group = int(group)
+    if isinstance(group, int) and group > regex.groups or isinstance(group, str) and group not in regex.groupindex:
+        raise ValueError(f"Pattern '{regex.pattern}' has no group {group!r}")
+    return group
+
+
+def _string_function(step: Dict[str, Any]) -> Optional[Callable[[str], Optional[str]]]:
+    """Return the function one text operation applies to a single string, or None if unknown."""
+    op_name = step.get('operation')
+
+    if op_name == "Lowercase":
+        return str.lower
+    if op_name == "Uppercase":
+        return str.upper
+    if op_name == "Title Case":
+        return str.title
+    if op_name == "Trim Spaces":
+        return str.strip
+    if op_name == "Replace Text":
+        old_text, new_text = step.get('old_text') or '', step.get('new_text') or ''
+        return lambda value: value.replace(old_text, new_text)
+    if op_name == "Extract Pattern":
+        search = compile_pattern(step.get('pattern', '')).search
+        group = pattern_group(step)
+
+        def extract(value: str) -> Optional[str]:
+            match = search(value)
+            return match.group(group) if match else None
+        return extract
+    return None
+
+
+def _known_steps(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop (and log) operations this engine does not know."""
+    known = []
+    for step in steps:
+        if step.get('operation') in TEXT_OPERATIONS:
+            known.append(step)
+        else:
+            logger.warning(f"Unknown text operation: {step.get('operation')}")
+    return known
+
+
+def transform_text(series: pd.Series, steps: List[Dict[str, Any]]) -> pd.Series:
+    """
+    Apply a chain of text operations to a column in one pass.
+
+    Missing values stay missing; other non-text values are converted with
+    str(). Arrow and pandas string columns are transformed by their native
+    string kernels. Object columns are factorized and the chain, composed
+    into one function, runs once per distinct value. Categorical columns
+    only transform their categories. A column no value of which changes is
+    returned as is.
+
+    Args:
+        series: Column to transform
+        steps: Text operation dictionaries, applied in order
+
+    Returns:
+        pd.Series: Transformed column (series itself if nothing changed)
+
+    Raises:
+        ValueError: If an Extract Pattern regex or group is invalid
+    """
+    steps = _known_steps(steps)
+    if not steps:
+        return series
+
+    if isinstance(series.dtype, pd.StringDtype):
+        return _transform_native(series, steps)
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        transformed = _transform_values(np.asarray(categories, dtype=object), steps)
+        if transformed is None:
+            return series
+        new_codes, new_categories = pd.factorize(transformed)
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, new_codes[codes] if len(new_codes) else -1, -1)
+        return pd.Series(pd.Categorical.from_codes(codes, new_categories), index=series.index, name=series.name)
+
+    values = series.to_numpy(dtype=object)
+    codes, uniques = pd.factorize(values)
+    transformed = _transform_values(uniques, steps)
+    if transformed is None and series.dtype == object:
+        return series
+    if transformed is None:
+        transformed = np.array([str(value) for value in uniques], dtype=object)
+
+    result = transformed[codes] if len(transformed) else np.empty(len(codes), dtype=object)
+    missing = codes < 0
+    result[missing] = values[missing]
+    return pd.Series(result, index=series.index, name=series.name)
+
+
+def _transform_values(values: np.ndarray, steps: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Apply the composed chain to distinct non-missing values; None if none of them change."""
+    functions = [_string_function(step) for step in steps]
+
+    def apply(value):
+        if not isinstance(value, str):
+            value = str(value)
+        for function in functions:
+            value = function(value)
+            if value is None:
+                break
+        return value
+
+    transformed = np.empty(len(values), dtype=object)
+    transformed[:] = [apply(value) for value in values]
+    if all(isinstance(value, str) for value in values) and (transformed == values).all():
+        return None
+    return transformed
+
+
+def _transform_native(series: pd.Series, steps: List[Dict[str, Any]]) -> pd.Series:
+    """Apply text operations to a pandas string column with its own kernels."""
+    result = series
+    for step in steps:
+        op_name = step.get('operation')
+        if op_name == "Lowercase":
+            result = result.str.lower()
+        elif op_name == "Uppercase":
+            result = result.str.upper()
+        elif op_name == "Title Case":
+            result = result.str.title()
+        elif op_name == "Trim Spaces":
+            result = result.str.strip()
+        elif op_name == "Replace Text":
+            result = result.str.replace(step.get('old_text') or '', step.get('new_text') or '', regex=False)
+        elif op_name == "Extract Pattern":
+            regex = compile_pattern(step.get('pattern', ''))
+            group = pattern_group(step)
+            if group == 0:
+                # Wrapping the pattern in a group would break leading inline flags
+                # and backreferences, so the whole match is taken per distinct value
+                codes, uniques = pd.factorize(result)
+                transformed = _transform_values(np.asarray(uniques, dtype=object), [step])
+                if transformed is not None:
+                    values = transformed[codes] if len(transformed) else np.empty(len(codes), dtype=object)
+                    values[codes < 0] = None
+                    result = pd.Series(values, index=result.index, dtype=result.dtype)
+            else:
+                index = regex.groupindex[group] if isinstance(group, str) else group
+                extracted = result.str.extract(regex, expand=True)
+                result = extracted.iloc[:, index - 1]
+    return result.rename(series.name)
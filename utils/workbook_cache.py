@@ -0,0 +1,283 @@
+"""
+Workbook Cache Module
+Caches parsed workbooks by the content hash of the uploaded bytes.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import pandas as pd
+
+from utils.lazy_workbook import LazyWorkbook
+from utils.memory import frame_nbytes
+
+logger = logging.getLogger(__name__)
+
+
+class WorkbookCache:
+    """
+    LRU cache of parsed workbooks keyed by a SHA-256 hash of the file bytes.
+
+    Identical uploads (including Streamlit reruns of the same file) are
+    parsed only once. Entries are evicted least recently used first once
+    the cached DataFrames exceed max_bytes. With a spill_dir, every parsed
+    workbook is also written there as Parquet, so a restarted app starts
+    warm. Spilling needs pyarrow and is disabled with a warning without it.
+
+    A LazyWorkbook is cached as a whole, so sheets it loads later are
+    shared too. Its size (raw bytes plus the sheets loaded so far) is
+    measured again whenever it loads a sheet, which may evict other
+    entries or the workbook itself. With a spill_dir, each sheet it loads
+    is spilled on its own; when load() opens the same content again after
+    a restart, the spilled sheets are handed to the new LazyWorkbook, so
+    only sheets never loaded before are parsed.
+
+    Cached DataFrames are shared between callers and must not be modified.
+
+    Attributes:
+        max_bytes (int): Memory budget for cached DataFrames
+        spill_dir (str): Directory for Parquet copies, or None
+        hits (int): Number of lookups served from memory or disk
+        misses (int): Number of lookups that needed a parse
+    """
+
+    def __init__(self, max_bytes: int = 1024 ** 3, spill_dir: Optional[str] = None):
+        """
+        Initialize WorkbookCache.
+
+        Args:
+            max_bytes: Memory budget for cached DataFrames in bytes
+            spill_dir: Optional directory to persist parsed workbooks as Parquet
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+
+        if spill_dir and not self._parquet_available():
+            logger.warning("pyarrow is not available, workbook cache will not spill to disk")
+            self.spill_dir = None
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    @staticmethod
+    def _parquet_available() -> bool:
+        """Return True if pyarrow can be imported for Parquet I/O."""
+        try:
+            import pyarrow  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        """Return the SHA-256 hex digest of file contents."""
+        return hashlib.sha256(data).hexdigest()
+
+    @property
+    def current_bytes(self) -> int:
+        """Memory currently used by cached DataFrames."""
+        return sum(self._sizes.values())
+
+    def load(self, file, loader: Callable, variant: str = '') -> Tuple[str, Dict[str, pd.DataFrame]]:
+        """
+        Return the parsed sheets of a file, parsing it only on a cache miss.
+
+        Args:
+            file: Uploaded file object (BytesIO-like)
+            loader: Function that parses the file, e.g. FileHandler.load_excel
+            variant: Distinguishes loaders that give different results for
+                the same content (e.g. 'optimized' dtypes)
+
+        Returns:
+            Tuple of (cache key, dictionary of sheet name to DataFrame). The
+            key is the content hash, suffixed with the variant if one is given.
+        """
+        digest = self.content_hash(file.getvalue())
+        if variant:
+            digest = f"{digest}-{variant}"
+        sheets = self.get(digest)
+        if sheets is None:
+            file.seek(0)
+            sheets = loader(file)
+            if isinstance(sheets, LazyWorkbook):
+                self._restore_sheets(digest, sheets)
+            self.put(digest, sheets)
+        return digest, sheets
+
+    def get(self, digest: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Look up a workbook by content hash.
+
+        Args:
+            digest: Content hash from content_hash()
+
+        Returns:
+            Dictionary of sheet name to DataFrame, or None if not cached
+        """
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return self._entries[digest]
+
+        sheets = self._read_spilled(digest)
+        if sheets is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        self._remember(digest, sheets)
+        return sheets
+
+    def put(self, digest: str, sheets: Dict[str, pd.DataFrame]):
+        """
+        Add a parsed workbook to the cache.
+
+        Args:
+            digest: Content hash from content_hash()
+            sheets: Dictionary of sheet name to DataFrame
+        """
+        self._remember(digest, sheets)
+        if self.spill_dir and not isinstance(sheets, LazyWorkbook):
+            self._spill(digest, sheets)
+
+    def clear(self):
+        """Drop all in-memory entries (spilled copies are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def _remember(self, digest: str, sheets: Dict[str, pd.DataFrame]):
+        """Keep sheets in memory and evict old entries to stay within budget."""
+        if isinstance(sheets, LazyWorkbook):
+            size = sheets.nbytes
+        else:
+            size = sum(frame_nbytes(df) for df in sheets.values())
+        if size > self.max_bytes:
+            logger.info(f"Workbook {digest[:12]} ({size} bytes) exceeds the cache budget, not cached in memory")
+            return
+
+        with self._lock:
+            self._entries[digest] = sheets
+            self._entries.move_to_end(digest)
+            self._sizes[digest] = size
+            self._evict()
+        if isinstance(sheets, LazyWorkbook):
+            sheets.on_load = lambda workbook, sheet_name: self._sheet_loaded(digest, workbook, sheet_name)
+
+    def _sheet_loaded(self, digest: str, workbook: LazyWorkbook, sheet_name: str):
+        """Account for (and spill) a sheet a cached LazyWorkbook has just loaded."""
+        self._resize(digest, workbook)
+        if self.spill_dir:
+            self._spill_sheet(digest, workbook, sheet_name)
+
+    def _resize(self, digest: str, workbook: LazyWorkbook):
+        """Re-measure a cached LazyWorkbook after it loaded a sheet."""
+        with self._lock:
+            if self._entries.get(digest) is not workbook:
+                return
+            self._sizes[digest] = workbook.nbytes
+            self._entries.move_to_end(digest)
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits its budget (lock held)."""
+        while self._entries and self.current_bytes > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            del self._sizes[evicted]
+            logger.info(f"Evicted workbook {evicted[:12]} from cache")
+
+    def _spill(self, digest: str, sheets: Dict[str, pd.DataFrame]):
+        """Write a workbook to the spill directory as one Parquet file per sheet."""
+        target = os.path.join(self.spill_dir, digest)
+        if os.path.exists(os.path.join(target, 'manifest.json')):
+            return
+
+        try:
+            os.makedirs(target, exist_ok=True)
+            manifest = []
+            for idx, (sheet_name, df) in enumerate(sheets.items()):
+                file_name = f"sheet_{idx}.parquet"
+                df.to_parquet(os.path.join(target, file_name))
+                manifest.append({'sheet': sheet_name, 'file': file_name})
+
+            # The manifest is written last, so a partial spill is never read back
+            with open(os.path.join(target, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+        except Exception as e:
+            logger.warning(f"Could not spill workbook {digest[:12]} to disk: {str(e)}")
+            shutil.rmtree(target, ignore_errors=True)
+
+    def _spill_sheet(self, digest: str, workbook: LazyWorkbook, sheet_name: str):
+        """Write one loaded sheet of a LazyWorkbook to the spill directory."""
+        target = os.path.join(self.spill_dir, digest)
+        file_name = f"sheet_{workbook.sheet_names.index(sheet_name)}.parquet"
+
+        try:
+            os.makedirs(target, exist_ok=True)
+            workbook[sheet_name].to_parquet(os.path.join(target, file_name))
+            with self._spill_lock:
+                manifest = self._sheet_manifest(digest)
+                if all(entry['sheet'] != sheet_name for entry in manifest):
+                    manifest.append({'sheet': sheet_name, 'file': file_name})
+                # Replaced atomically, so a reader never sees a sheet that is only partly written
+                with open(os.path.join(target, 'sheets.json.tmp'), 'w') as f:
+                    json.dump(manifest, f)
+                os.replace(os.path.join(target, 'sheets.json.tmp'), os.path.join(target, 'sheets.json'))
+        except Exception as e:
+            logger.warning(f"Could not spill sheet '{sheet_name}' of workbook {digest[:12]} to disk: {str(e)}")
+
+    def _sheet_manifest(self, digest: str) -> list:
+        """Return the sheets spilled one at a time for a workbook."""
+        manifest_path = os.path.join(self.spill_dir, digest, 'sheets.json')
+        if not os.path.exists(manifest_path):
+            return []
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _restore_sheets(self, digest: str, workbook: LazyWorkbook):
+        """Hand the spilled sheets of a workbook to a freshly opened LazyWorkbook."""
+        if not self.spill_dir:
+            return
+
+        try:
+            for entry in self._sheet_manifest(digest):
+                if entry['sheet'] in workbook:
+                    workbook.preload(entry['sheet'],
+                                     pd.read_parquet(os.path.join(self.spill_dir, digest, entry['file'])))
+        except Exception as e:
+            logger.warning(f"Could not read spilled sheets of workbook {digest[:12]}: {str(e)}")
+            return
+        if workbook.loaded_sheets:
+            logger.info(f"Restored {len(workbook.loaded_sheets)} spilled sheet(s) of workbook {digest[:12]}")
+
+    def _read_spilled(self, digest: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """Read a workbook back from the spill directory, if present."""
+        if not self.spill_dir:
+            return None
+
+        manifest_path = os.path.join(self.spill_dir, digest, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return None
+
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            return {entry['sheet']: pd.read_parquet(os.path.join(self.spill_dir, digest, entry['file']))
+                    for entry in manifest}
+        except Exception as e:
+            logger.warning(f"Could not read spilled workbook {digest[:12]}: {str(e)}")
+            return None